@@ -0,0 +1,265 @@
+import asyncio
+import threading
+import time
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+
+from pymonad.either import Left, Right
+
+from scrape_set_f45 import ScrapeSetF45
+from run_metrics import RunMetrics
+from f45_store import bulk_upsert_latest, bulk_upsert_versions, bulk_touch_latest
+
+
+# Marks the end of the fetched pages on the queue
+PAGES_DONE = object()
+# Seconds the fetching thread waits for room on the queue before checking whether the run was stopped
+PUT_TIMEOUT = 1.0
+
+
+class AsyncScrapeSetF45:
+    # Runs the stages of a ScrapeSetF45 on an event loop so independent I/O overlaps: the news list and the
+    # Mongo connection start together, pages are parsed and written while later ones are still being fetched,
+    # and the browser, Mongo client and history close together. Blocking stages run in threads and still
+    # return Left/Right, the first Left ends the run as it does in main()
+
+    def __init__(self, scraper: ScrapeSetF45, parse_workers: int = 2, parse_executor: str = 'thread',
+                 db_writers: int = 2, queue_size: int = 64) -> None:
+        self.scraper = scraper
+        # Pages parsed at the same time, in threads or, for big texts, in processes ('process')
+        self.parse_workers = max(1, parse_workers)
+        self.parse_executor = parse_executor
+        # Upserts in flight at the same time, each of scraper.stream_batch_size records
+        self.db_writers = max(1, db_writers)
+        # Fetched pages waiting to be parsed, fetching pauses when it is full
+        self.queue_size = max(1, queue_size)
+
+    @property
+    def metrics(self) -> RunMetrics:
+        return self.scraper.metrics
+
+    async def in_thread(self, stage, data: dict)->[Left, Right]:    # type: ignore
+        return await asyncio.to_thread(self.scraper.metrics.stage(stage), data)
+
+    async def open_session(self, data: dict)->[Left, Right]:    # type: ignore
+        # News list and Mongo connection at the same time, they share nothing until compare_period_in_db
+        scraper = self.scraper
+        get_f45s = scraper.get_f45s_with_http if scraper.backend == 'http' else scraper.get_f45s_with_selenium
+        listed, connected = await asyncio.gather(
+            asyncio.to_thread(get_f45s, data),
+            self.in_thread(scraper.connect_mongo_db, data),
+        )
+        return listed.then(lambda _: connected)
+
+    async def select_f45s(self, data: dict)->[Left, Right]:    # type: ignore
+        scraper = self.scraper
+        result = await self.in_thread(scraper.covert_date_time, data)
+        if result.is_left():
+            return result
+        return await self.in_thread(scraper.compare_period_in_db, data)
+
+    def produce_pages(self, data: dict, loop, pages: asyncio.Queue, stopped: threading.Event) -> None:
+        # Fetches in a thread and hands each page to the loop as it arrives, waiting while the queue is full.
+        # Once nothing consumes any more (stopped) it gives up instead of waiting for room for good
+        def put(item) -> bool:
+            while not stopped.is_set():
+                try:
+                    asyncio.run_coroutine_threadsafe(asyncio.wait_for(pages.put(item), PUT_TIMEOUT), loop).result()
+                    return True
+                except (asyncio.TimeoutError, TimeoutError):
+                    continue
+            return False
+
+        try:
+            for page in self.scraper.iter_f45_texts(data):
+                if not put(page):
+                    return
+        except Exception as e:
+            put(e)
+        finally:
+            put(PAGES_DONE)
+
+    async def parse_page(self, executor, f45: dict, text: str)->[Left, Right]:    # type: ignore
+        # parse_f45 with the form's parser in the executor, so the loop keeps feeding fetches and writes
+        scraper = self.scraper
+        start = time.perf_counter()
+        try:
+            fields = await asyncio.get_running_loop().run_in_executor(executor, scraper.form.parse, text)
+            return Right(scraper.f45_record(dict(f45, text=text), fields))
+
+        except Exception as e:
+            return Left(f'Error in parsing F45 Text for {f45.get("symbol")}: {str(e)}')
+
+        finally:
+            scraper.metrics.observe('parse_f45', time.perf_counter() - start)
+
+    def write_batch(self, data: dict, batch: list, unchanged: list) -> dict:
+        scraper = self.scraper
+        collection = data['mongo'].collection
+        report = {'touched': bulk_touch_latest(collection, unchanged, newer_only=True)}
+        if batch:
+            # newer_only, batches of one run can land in any order
+            report.update(bulk_upsert_latest(collection, batch, newer_only=True, fields=scraper.form.fields))
+            report.update(bulk_upsert_versions(data['versions'], batch, scraper.form.version_key, scraper.form.fields))
+            scraper.metrics.mark('first_db_write')
+            print(f'> Updated DB for {", ".join(f45["symbol"] for f45 in batch)}')
+        return report
+
+    async def fetch_parse_write(self, data: dict)->[Left, Right]:    # type: ignore
+        # Fetch, parse and upsert as three overlapping steps joined by a queue and a set of write tasks
+        scraper = self.scraper
+        loop = asyncio.get_running_loop()
+        pages = asyncio.Queue(self.queue_size)
+        stopped = threading.Event()
+        writers = asyncio.Semaphore(self.db_writers)
+        writes = []
+        batch = []
+        unchanged = []
+        errors = []
+        db_report = data.setdefault('db_report', {})
+        data['f45_cleaned_data'] = []
+        data['f45_unchanged'] = []
+
+        async def write(records: list, touched: list) -> None:
+            async with writers:
+                report = await asyncio.to_thread(self.write_batch, data, records, touched)
+            for key, value in report.items():
+                db_report[key] = db_report.get(key, 0) + value
+
+        async def fetch() -> None:
+            await asyncio.to_thread(self.produce_pages, data, loop, pages, stopped)
+            # The browser is not needed once the last page is read, close it while parsing goes on
+            await self.in_thread(scraper.close_web_browser, data)
+
+        def flush() -> None:
+            if batch or unchanged:
+                writes.append(asyncio.create_task(write(list(batch), list(unchanged))))
+                batch.clear()
+                unchanged.clear()
+
+        async def consume_page(executor, page) -> None:
+            if isinstance(page, Exception):
+                errors.append(f'Error in fetching F45 Pages: {str(page)}')
+                return
+
+            f45, text, error = page
+            if error is not None:
+                scraper.dead_letter(data, 'open_f45_page_get_text', f45, error)
+                return
+
+            # Same steps as stream_f45_to_db
+            print(f'> Parsing F45 for {f45["symbol"]}')
+            scraper.metrics.incr('text_bytes', len(text.encode('utf-8')))
+            if scraper.cache is not None:
+                scraper.cache_f45_page(f45, text)
+            if scraper.is_unchanged_f45(f45, text):
+                print(f'> Same F45 content as stored for {f45["symbol"]}')
+                scraper.metrics.incr('parses_avoided')
+                scraper.metrics.incr('writes_avoided')
+                data['f45_unchanged'].append(f45)
+                unchanged.append(f45)
+                return
+            result = await self.parse_page(executor, f45, text)
+            if result.is_left():
+                scraper.dead_letter(data, 'parse_f45', f45, result.monoid[0], text)
+                return
+
+            batch.append(result.value)
+            data['f45_cleaned_data'].append(result.value)
+            if len(batch) >= scraper.stream_batch_size:
+                flush()
+
+        async def consume(executor) -> None:
+            while True:
+                page = await pages.get()
+                if page is PAGES_DONE:
+                    # Every consumer has to see the end
+                    await pages.put(PAGES_DONE)
+                    return
+
+                # A page that breaks any step only loses itself, a consumer that died would leave the fetching
+                # thread waiting for room on the queue
+                try:
+                    await consume_page(executor, page)
+                except Exception as e:
+                    try:
+                        scraper.dead_letter(data, 'stream_f45_to_db', page[0], str(e), page[1])
+                    except Exception:
+                        print(f'> Error in consuming F45 Page: {str(e)}')
+
+        executor_class = ProcessPoolExecutor if self.parse_executor == 'process' else ThreadPoolExecutor
+        try:
+            with executor_class(max_workers=self.parse_workers) as executor:
+                await asyncio.gather(fetch(), *(consume(executor) for _ in range(self.parse_workers)))
+            flush()
+            await asyncio.gather(*writes)
+
+        except Exception as e:
+            return Left(f'Error in streaming F45 Pages to DB: {str(e)}')
+
+        finally:
+            # Lets the fetching thread out if the run ended before it did
+            stopped.set()
+            if scraper.cache is not None:
+                scraper.cache.save()
+
+        if errors:
+            return Left(errors[0])
+        return Right(data)
+
+    async def shut_down(self, data: dict, result)->[Left, Right]:    # type: ignore
+        # Browser, Mongo client and history append in parallel, a failed run only releases what it opened
+        scraper = self.scraper
+        if result.is_left():
+            await asyncio.gather(
+                asyncio.to_thread(scraper.close_web_browser, data),
+                asyncio.to_thread(scraper.close_mongo_db, data) if data.get('mongo') is not None else asyncio.sleep(0),
+            )
+            return result
+
+        closed = await asyncio.gather(
+            self.in_thread(scraper.close_web_browser, data),
+            self.in_thread(scraper.close_mongo_db, data),
+            self.in_thread(scraper.append_history, data),
+        )
+        for step in closed:
+            if step.is_left():
+                return step
+        return Right(data)
+
+    async def run(self, from_date: str = None, to_date: str = None, backfill: bool = False):
+        scraper = self.scraper
+        data = {}
+        data['webdriver'] = None
+        data['from_date'] = from_date
+        data['to_date'] = to_date
+        data['backfill'] = backfill
+        scraper.metrics = RunMetrics(scraper.profile)
+        scraper.metrics.start()
+        timed = scraper.metrics.async_stage
+
+        result = (
+            scraper.metrics.stage(scraper.set_url)(data)
+            .then (scraper.metrics.stage(scraper.set_xpath))
+            .then (scraper.metrics.stage(scraper.set_class_name))
+        )
+        for stage in (self.open_session, self.select_f45s, self.fetch_parse_write):
+            if result.is_left():
+                break
+            result = await timed(stage)(data)
+
+        result = await self.shut_down(data, result)
+        if result.is_left():
+            print(result.monoid[0])
+
+        scraper.count_records(data, result)
+        scraper.metrics.update_counters({f'db_{key}': value for key, value in data.get('db_report', {}).items()})
+        scraper.metrics.finish(result)
+        if scraper.report_path:
+            scraper.metrics.write(scraper.report_path, scraper.report_format)
+            print(f'Run report written to {scraper.report_path}')
+
+        return result.is_right()
+
+    def main(self, from_date: str = None, to_date: str = None, backfill: bool = False):
+        # Same call as ScrapeSetF45.main, so backfill and the CLI can use either
+        return asyncio.run(self.run(from_date, to_date, backfill))
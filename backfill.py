@@ -0,0 +1,79 @@
+
+import json
+import os
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from datetime import date, timedelta
+
+
+DEFAULT_CHECKPOINT_PATH = os.path.abspath(os.path.join(os.path.dirname(__file__), './report/backfill_checkpoint.json'))
+
+
+def split_date_range(start: str, end: str, window_days: int) -> list:
+    # Inclusive (fromDate, toDate) windows covering start..end, as YYYY-MM-DD strings
+    first = date.fromisoformat(start)
+    last = date.fromisoformat(end)
+    if first > last:
+        raise ValueError(f'Start date {start} is after end date {end}')
+    
+    windows = []
+    while first <= last:
+        window_end = min(first + timedelta(days=window_days - 1), last)
+        windows.append((first.isoformat(), window_end.isoformat()))
+        first = window_end + timedelta(days=1)
+    return windows
+
+
+class BackfillCheckpoint:
+    # Completed windows, persisted after each one so an interrupted backfill resumes
+
+    def __init__(self, path: str = DEFAULT_CHECKPOINT_PATH) -> None:
+        self.path = path
+        self.lock = threading.Lock()
+        self.completed = set()
+        if os.path.exists(path):
+            with open(path) as f:
+                self.completed = {tuple(window) for window in json.load(f).get('completed', [])}
+
+    def is_done(self, window: tuple) -> bool:
+        return tuple(window) in self.completed
+
+    def mark_done(self, window: tuple) -> None:
+        with self.lock:
+            self.completed.add(tuple(window))
+            os.makedirs(os.path.dirname(self.path), exist_ok=True)
+            
+            # Write then rename so a crash never leaves a truncated checkpoint
+            tmp_path = f'{self.path}.tmp'
+            with open(tmp_path, 'w') as f:
+                json.dump({'completed': sorted(self.completed)}, f, indent=4)
+            os.replace(tmp_path, self.path)
+
+
+def run_backfill(start: str, end: str, scraper_factory, window_days: int = 30, concurrency: int = 2,
+                 checkpoint_path: str = DEFAULT_CHECKPOINT_PATH) -> dict:
+    windows = split_date_range(start, end, window_days)
+    checkpoint = BackfillCheckpoint(checkpoint_path)
+    pending = [window for window in windows if not checkpoint.is_done(window)]
+    print(f'Backfilling {start} to {end}: {len(windows)} windows, {len(windows) - len(pending)} already done')
+    
+    def scrape_window(window: tuple) -> bool:
+        from_date, to_date = window
+        print(f'> Backfilling {from_date} to {to_date}')
+        if scraper_factory().main(from_date=from_date, to_date=to_date, backfill=True):
+            checkpoint.mark_done(window)
+            return True
+        print(f'> Backfill of {from_date} to {to_date} failed, it will be retried on the next run')
+        return False
+    
+    with ThreadPoolExecutor(max_workers=max(1, concurrency)) as executor:
+        results = list(executor.map(scrape_window, pending))
+    
+    summary = {
+        'windows': len(windows),
+        'skipped': len(windows) - len(pending),
+        'completed': sum(results),
+        'failed': len(results) - sum(results),
+    }
+    print(f'Backfill finished: {summary}')
+    return summary
@@ -0,0 +1,72 @@
+
+import argparse
+import json
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '../')))
+from scrape_set_f45 import ScrapeSetF45
+from detail_pool import DetailPagePool
+
+
+def list_f45_urls(scraper: ScrapeSetF45, limit: int) -> list:
+    data = {'webdriver': None}
+    try:
+        result = (
+            scraper.set_url(data)
+            .then (scraper.set_xpath)
+            .then (scraper.set_class_name)
+            .then (scraper.open_web_browser)
+            .then (scraper.maximize_window)
+            .then (scraper.go_url)
+            .then (scraper.click_search_button)
+            .then (scraper.get_card_quote_news_elements)
+            .then (scraper.extract_quote_news_elements)
+        )
+        if result.is_left():
+            raise RuntimeError(result.monoid[0])
+        
+        urls = [f45['url'] for f45 in data['f45s'] if f45.get('url')]
+        return urls[:limit]
+    
+    finally:
+        # The browser is opened before the list can fail, close it either way
+        scraper.release_resources(data)
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description='Throughput of F45 detail-page fetching per pool size')
+    parser.add_argument('--workers', type=int, nargs='+', default=[1, 2, 4, 8])
+    parser.add_argument('--limit', type=int, default=40, help='Number of detail pages fetched per run')
+    args = parser.parse_args()
+    
+    scraper = ScrapeSetF45()
+    urls = list_f45_urls(scraper, args.limit)
+    print(f'Benchmarking {len(urls)} F45 detail pages')
+    
+    report = []
+    for workers in args.workers:
+        with DetailPagePool(workers, 'raw-html-new') as pool:
+            # Browser startup is not part of the throughput
+            pool.open(len(urls))
+            start = time.perf_counter()
+            results = pool.fetch_all(urls)
+            elapsed = time.perf_counter() - start
+        
+        failed = sum(1 for _, error in results if error is not None)
+        row = {
+            'workers': workers,
+            'pages': len(urls),
+            'failed': failed,
+            'seconds': round(elapsed, 3),
+            'pages_per_second': round(len(urls) / elapsed, 3) if elapsed else None,
+        }
+        print(f'> {workers} workers: {row["seconds"]}s, {row["pages_per_second"]} pages/s, {failed} failed')
+        report.append(row)
+    
+    print(json.dumps(report, indent=4))
+
+
+if __name__ == '__main__':
+    main()
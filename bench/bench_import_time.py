@@ -0,0 +1,89 @@
+
+import argparse
+import json
+import os
+import subprocess
+import sys
+
+
+REPO_DIR = os.path.abspath(os.path.join(os.path.dirname(__file__), '../'))
+DEFAULT_BUDGET_PATH = os.path.abspath(os.path.join(os.path.dirname(__file__), './import_budget.json'))
+
+# Module -> cold import budget in milliseconds and the packages it must not pull in.
+# cli has to start any command without a browser client, scrape_set_f45 has to replay and export without one
+DEFAULT_BUDGET = {
+    'cli': {'max_ms': 100, 'forbidden': ['pandas', 'numpy', 'selenium', 'requests', 'pymongo', 'mongo']},
+    'scrape_set_f45': {'max_ms': 300, 'forbidden': ['pandas', 'numpy', 'selenium', 'requests', 'mongo']},
+}
+
+
+def import_time(module: str, python: str = sys.executable) -> dict:
+    # One cold interpreter, returns the cumulative import time of module and every package it loaded
+    result = subprocess.run([python, '-X', 'importtime', '-c', f'import {module}'], cwd=REPO_DIR, capture_output=True, text=True)
+    if result.returncode != 0:
+        raise RuntimeError(f'import {module} failed: {result.stderr.strip().splitlines()[-1]}')
+
+    cumulative = None
+    imported = set()
+    for line in result.stderr.splitlines():
+        # import time: self [us] | cumulative | imported package
+        if not line.startswith('import time:') or '|' not in line or 'cumulative' in line:
+            continue
+        _, total, name = line.split('|', 2)
+        name = name.strip()
+        imported.add(name)
+        if name == module:
+            cumulative = int(total) / 1000
+    return {'ms': cumulative, 'imported': imported}
+
+
+def check(module: str, budget: dict, repeat: int) -> dict:
+    runs = [import_time(module) for _ in range(repeat)]
+    imported = set().union(*(run['imported'] for run in runs))
+    pulled_in = sorted(package for package in budget.get('forbidden', [])
+                       if any(name == package or name.startswith(f'{package}.') for name in imported))
+    ms = round(min(run['ms'] for run in runs), 1)
+    return {
+        'module': module,
+        'ms': ms,
+        'max_ms': budget['max_ms'],
+        'modules': len(imported),
+        'forbidden': pulled_in,
+        'ok': ms <= budget['max_ms'] and not pulled_in,
+    }
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description='Cold import time of the entry points, checked against a budget')
+    parser.add_argument('--budget', default=DEFAULT_BUDGET_PATH)
+    parser.add_argument('--repeat', type=int, default=5, help='Fresh interpreters per module, the fastest is kept')
+    parser.add_argument('--update-budget', action='store_true', help='Store the measured times plus --headroom as the budget')
+    parser.add_argument('--headroom', type=float, default=0.5)
+    args = parser.parse_args()
+
+    budgets = DEFAULT_BUDGET
+    if os.path.exists(args.budget):
+        with open(args.budget) as f:
+            budgets = json.load(f)
+
+    results = [check(module, budget, args.repeat) for module, budget in budgets.items()]
+    for result in results:
+        print(f'> {result["module"]}: {result["ms"]}ms of {result["max_ms"]}ms, {result["modules"]} modules'
+              + (f', pulls in {", ".join(result["forbidden"])}' if result['forbidden'] else ''))
+
+    if args.update_budget:
+        for result in results:
+            budgets[result['module']]['max_ms'] = round(result['ms'] * (1 + args.headroom))
+        with open(args.budget, 'w') as f:
+            json.dump(budgets, f, indent=4)
+        print(f'Budget written to {args.budget}')
+        return
+
+    failed = [result['module'] for result in results if not result['ok']]
+    for module in failed:
+        print(f'Over budget: {module}')
+    sys.exit(1 if failed else 0)
+
+
+if __name__ == '__main__':
+    main()
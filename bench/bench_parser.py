@@ -0,0 +1,114 @@
+
+import argparse
+import json
+import os
+import random
+import sys
+import time
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '../')))
+from scrape_set_f45 import ScrapeSetF45
+from f45_parser import parse_f45_text
+
+
+DEFAULT_CORPUS_PATH = os.path.abspath(os.path.join(os.path.dirname(__file__), './corpus/f45_texts.jsonl'))
+
+SYNTHETIC_TEMPLATE = '''Summary Financial Information
+Company Name        {symbol}
+{period}
+                    Year          {year}          {last_year}
+Net Profit (loss)          {net_profit}          {last_net_profit}
+EPS (baht)          {eps}          {last_eps}
+Type of report      Unqualified Opinion
+Comment             -'''
+
+
+def load_corpus(path: str) -> list:
+    # One {'symbol', 'iso_date', 'text'} per line
+    with open(path) as f:
+        return [json.loads(line) for line in f if line.strip()]
+
+
+def synthetic_corpus(size: int, seed: int = 45) -> list:
+    # Stand-in texts covering the same row shapes as real F45s, for when no corpus is at hand
+    rng = random.Random(seed)
+
+    def number(with_update: bool = False) -> str:
+        value = f'{rng.uniform(-500000, 500000):,.2f}'
+        value = f'({value[1:]})' if value.startswith('-') else value
+        return f'{value} (Update)' if with_update else value
+
+    corpus = []
+    for i in range(size):
+        year = rng.randint(2015, 2024)
+        period = rng.choice(['Quarter 1', 'Quarter 2', 'Quarter 3', 'For 12 Months'])
+        text = SYNTHETIC_TEMPLATE.format(
+            symbol=f'SYM{i % 700}',
+            period=period,
+            year=year,
+            last_year=year - 1,
+            net_profit=number(rng.random() < 0.1),
+            last_net_profit=number(),
+            eps=number(rng.random() < 0.1),
+            last_eps=number(),
+        )
+        corpus.append({'symbol': f'SYM{i % 700}', 'iso_date': f'{year}-08-07T08:41:00', 'text': text})
+    return corpus
+
+
+def run_parser(parse, corpus: list, repeat: int) -> tuple:
+    outputs = []
+    start = time.perf_counter()
+    for _ in range(repeat):
+        outputs = [parse(record) for record in corpus]
+    elapsed = time.perf_counter() - start
+    return outputs, elapsed
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description='Compare the single-pass F45 parser with the three-stage path')
+    parser.add_argument('--corpus', default=DEFAULT_CORPUS_PATH, help='JSONL file of detail texts')
+    parser.add_argument('--synthetic', type=int, default=0, help='Use this many generated texts instead of a corpus')
+    parser.add_argument('--repeat', type=int, default=5)
+    parser.add_argument('--show-diffs', type=int, default=10)
+    args = parser.parse_args()
+    
+    corpus = synthetic_corpus(args.synthetic) if args.synthetic else load_corpus(args.corpus)
+    scraper = ScrapeSetF45()
+    
+    def three_stage(record: dict):
+        result = scraper.parse_f45_in_stages(record)
+        return result.value if result.is_right() else None
+    
+    def single_pass(record: dict):
+        try:
+            return dict(parse_f45_text(record['text']), symbol=record['symbol'], last_update=record['iso_date'])
+        except Exception:
+            return None
+    
+    old_outputs, old_seconds = run_parser(three_stage, corpus, args.repeat)
+    new_outputs, new_seconds = run_parser(single_pass, corpus, args.repeat)
+    records = len(corpus) * args.repeat
+    
+    diffs = [
+        (record, old, new)
+        for record, old, new in zip(corpus, old_outputs, new_outputs)
+        if old != new
+    ]
+    for record, old, new in diffs[:args.show_diffs]:
+        print(f'> {record["symbol"]} {record["iso_date"]}: three-stage {old} != single-pass {new}')
+    
+    report = {
+        'texts': len(corpus),
+        'repeat': args.repeat,
+        'three_stage_records_per_second': round(records / old_seconds, 1),
+        'single_pass_records_per_second': round(records / new_seconds, 1),
+        'speedup': round(old_seconds / new_seconds, 2),
+        'failed': sum(1 for output in new_outputs if output is None),
+        'differences': len(diffs),
+    }
+    print(json.dumps(report, indent=4))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,143 @@
+
+import argparse
+import contextlib
+import io
+import json
+import multiprocessing
+import os
+import signal
+import sys
+import tempfile
+import time
+
+from pymongo import MongoClient
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '../')))
+from fixture_server import FixtureSite, load_fixtures
+from task_queue import TASKS_COLLECTION, F45TaskQueue
+
+
+DEFAULT_MONGO_URI = 'mongodb://127.0.0.1:27017'
+DEFAULT_DATABASE = 'f45_bench'
+
+
+class LocalMongo:
+    # MongoDBManager over a given mongod, so several processes share one real queue
+
+    uri = DEFAULT_MONGO_URI
+
+    def __init__(self, database: str, collection: str) -> None:
+        self.client = MongoClient(self.uri)
+        self.db = self.client[database]
+        self.collection = self.db[collection]
+
+
+def make_scraper(uri: str, database: str, base_url: str, pages: int, history_dir: str):
+    from scrape_set_f45 import ScrapeSetF45
+    from history_store import HistoryStore
+
+    LocalMongo.uri = uri
+    return ScrapeSetF45(
+        backend='http',
+        max_pages=pages,
+        history=HistoryStore(history_dir),
+        base_url=base_url,
+        mongo_factory=LocalMongo,
+        database=database,
+    )
+
+
+def run_worker(uri: str, database: str, base_url: str, history_dir: str, batch_size: int, lease_seconds: float, verbose: bool) -> None:
+    from worker_f45 import WorkerSetF45
+
+    worker = WorkerSetF45(
+        make_scraper(uri, database, base_url, 1, history_dir),
+        batch_size=batch_size,
+        lease_seconds=lease_seconds,
+        idle_sleep=0.5,
+    )
+    output = contextlib.nullcontext() if verbose else contextlib.redirect_stdout(io.StringIO())
+    with output:
+        worker.run(exit_when_empty=True)
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description='Produce F45 tasks and drain them with several worker processes against a local mongod')
+    parser.add_argument('--mongo-uri', default=DEFAULT_MONGO_URI)
+    parser.add_argument('--database', default=DEFAULT_DATABASE, help='Dropped and refilled on every run')
+    parser.add_argument('--workers', type=int, default=4)
+    parser.add_argument('--batch-size', type=int, default=5)
+    parser.add_argument('--lease-seconds', type=float, default=5)
+    parser.add_argument('--pages', type=int, default=5)
+    parser.add_argument('--cards-per-page', type=int, default=20)
+    parser.add_argument('--latency-ms', type=float, default=50)
+    parser.add_argument('--kill-after', type=float, help='SIGKILL the first worker after this many seconds, its leases must be reclaimed')
+    parser.add_argument('--verbose', action='store_true')
+    args = parser.parse_args()
+
+    if args.database == 'stockThai':
+        parser.error('--database is dropped on every run, use a scratch database')
+    client = MongoClient(args.mongo_uri)
+    client.drop_database(args.database)
+    queue = F45TaskQueue(client[args.database][TASKS_COLLECTION])
+    context = multiprocessing.get_context('spawn')
+    fixtures = load_fixtures(args.pages * args.cards_per_page)
+
+    with FixtureSite(fixtures, args.cards_per_page, args.latency_ms / 1000) as site, tempfile.TemporaryDirectory() as history_dir:
+        output = contextlib.nullcontext() if args.verbose else contextlib.redirect_stdout(io.StringIO())
+        start = time.perf_counter()
+        with output:
+            produced = make_scraper(args.mongo_uri, args.database, site.base_url, site.pages, history_dir).produce()
+        produce_seconds = time.perf_counter() - start
+        print(f'Produced {queue.counts()} in {produce_seconds:.2f}s')
+        if not produced:
+            sys.exit(1)
+
+        worker_args = (args.mongo_uri, args.database, site.base_url, history_dir, args.batch_size, args.lease_seconds, args.verbose)
+        start = time.perf_counter()
+        workers = [context.Process(target=run_worker, args=worker_args) for _ in range(args.workers)]
+        for worker in workers:
+            worker.start()
+
+        killed = False
+        if args.kill_after is not None:
+            time.sleep(args.kill_after)
+            if workers[0].is_alive():
+                os.kill(workers[0].pid, signal.SIGKILL)
+                killed = True
+                print(f'> Killed worker {workers[0].pid} holding {client[args.database][TASKS_COLLECTION].count_documents({"status": "leased"})} leases')
+
+        for worker in workers:
+            worker.join()
+
+        # Workers exit once nothing is claimable, leases of a killed worker only come back when they run out
+        sweeps = 0
+        while queue.counts()['leased'] or queue.counts()['queued']:
+            time.sleep(args.lease_seconds)
+            sweeper = context.Process(target=run_worker, args=worker_args)
+            sweeper.start()
+            sweeper.join()
+            sweeps += 1
+        seconds = time.perf_counter() - start
+
+    counts = queue.counts()
+    stored = client[args.database]['f45'].count_documents({})
+    reclaimed = client[args.database][TASKS_COLLECTION].count_documents({'attempts': {'$gt': 1}})
+    report = {
+        'workers': args.workers,
+        'tasks': sum(counts.values()),
+        'counts': counts,
+        'stored': stored,
+        'seconds': round(seconds, 3),
+        'tasks_per_second': round(counts['done'] / seconds, 1) if seconds else None,
+        'killed_worker': killed,
+        'reclaimed_tasks': reclaimed,
+        'sweeps': sweeps,
+    }
+    print(json.dumps(report, indent=4))
+    client.close()
+    sys.exit(0 if counts['done'] == report['tasks'] else 1)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,217 @@
+
+import argparse
+import html
+import json
+import os
+import sys
+import threading
+import time
+from datetime import datetime, timedelta
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlencode, urlparse
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '../')))
+from page_cache import PageCache
+from bench_parser import DEFAULT_CORPUS_PATH, load_corpus, synthetic_corpus
+
+
+# Local stand-in for the SET news search: the list page, its pagination and the F45 detail
+# pages, with the DOM classes the scraper looks for
+
+LIST_PATH = '/en/market/news-and-alert/news'
+DETAIL_PATH = '/en/market/news-and-alert/newsdetails'
+FIRST_CARD_TIME = datetime(2024, 8, 14, 17, 0)
+
+LIST_PAGE = '''<!DOCTYPE html>
+<html><head><title>News | SET</title></head><body><div id="__nuxt">
+<div class="search-box">
+<input type="text" class="form-control" placeholder="Headline">
+<button type="button" class="btn fs-24px px-4 btn-primary">Search</button>
+<button type="button" class="btn-search-clear">Clear</button>
+</div>
+<div class="news-list">
+{cards}
+</div>
+<ul class="pagination">
+<li class="page-item{disabled}"><a class="page-link" aria-label="Go to next page"{next_page}>&gt;</a></li>
+</ul>
+</div></body></html>'''
+
+CARD = '''<div class="card-quote-news-contanier"><a href="{url}" target="_blank">
+<div class="date">{date}</div><div class="time">{time}</div><div class="symbol">{symbol}</div>
+<div class="source">{symbol}</div><div class="headline">Financial Performance {period} (F45) ({headline})</div>
+</a></div>'''
+
+DETAIL_PAGE = '''<!DOCTYPE html>
+<html><head><title>{symbol} | SET</title></head><body><div id="__nuxt">
+<div class="raw-html-new"><pre>{text}</pre></div>
+</div></body></html>'''
+
+
+def load_fixtures(size: int, corpus_path: str = DEFAULT_CORPUS_PATH, cache_dir: str = None) -> list:
+    # Recorded detail texts from a page cache or corpus, topped up with generated ones to size
+    texts = []
+    if cache_dir and os.path.exists(os.path.join(cache_dir, 'index.json')):
+        cache = PageCache(cache_dir)
+        for key in cache.keys('f45'):
+            text = cache.get(key)
+            if text is not None:
+                texts.append(dict(cache.meta(key), text=text))
+    elif corpus_path and os.path.exists(corpus_path):
+        texts = load_corpus(corpus_path)
+
+    texts = texts[:size]
+    if len(texts) < size:
+        texts += synthetic_corpus(size - len(texts), seed=len(texts))
+
+    fixtures = []
+    for index, record in enumerate(texts):
+        # Newest first like the live list, one minute apart so every card has its own time
+        published = FIRST_CARD_TIME - timedelta(minutes=index)
+        fixtures.append({
+            'id': index,
+            'symbol': record['symbol'],
+            'date': published.strftime('%d %b %Y'),
+            'time': published.strftime('%H:%M'),
+            'text': record['text'],
+        })
+    return fixtures
+
+
+class FixtureSite:
+    # Serves len(fixtures) cards over pages of cards_per_page, every response delayed by latency seconds
+
+    def __init__(self, fixtures: list, cards_per_page: int = 20, latency: float = 0.0,
+                 host: str = '127.0.0.1', port: int = 0) -> None:
+        self.fixtures = fixtures
+        self.cards_per_page = max(1, cards_per_page)
+        self.latency = latency
+        self.requests = {'list': 0, 'detail': 0, 'missing': 0}
+        self.lock = threading.Lock()
+        self.server = ThreadingHTTPServer((host, port), self.handler())
+        self.server.daemon_threads = True
+        self.thread = None
+
+    @property
+    def base_url(self) -> str:
+        host, port = self.server.server_address[:2]
+        return f'http://{host}:{port}'
+
+    @property
+    def pages(self) -> int:
+        return max(1, -(-len(self.fixtures) // self.cards_per_page))
+
+    def start(self) -> 'FixtureSite':
+        self.thread = threading.Thread(target=self.server.serve_forever, daemon=True)
+        self.thread.start()
+        return self
+
+    def stop(self) -> None:
+        self.server.shutdown()
+        self.server.server_close()
+
+    def __enter__(self) -> 'FixtureSite':
+        return self.start()
+
+    def __exit__(self, *exc) -> None:
+        self.stop()
+
+    def count(self, kind: str) -> None:
+        with self.lock:
+            self.requests[kind] += 1
+
+    def render_list(self, query: dict) -> str:
+        page = max(1, int(query.get('page', ['1'])[0]))
+        start = (page - 1) * self.cards_per_page
+        cards = '\n'.join(
+            CARD.format(
+                url=f'{DETAIL_PATH}?{urlencode({"id": fixture["id"], "symbol": fixture["symbol"]})}',
+                date=fixture['date'],
+                time=fixture['time'],
+                symbol=html.escape(fixture['symbol']),
+                period='Quarter 2',
+                headline=fixture['id'],
+            )
+            for fixture in self.fixtures[start:start + self.cards_per_page]
+        )
+
+        if page < self.pages:
+            next_query = {key: values[0] for key, values in query.items()}
+            next_query['page'] = page + 1
+            next_page, disabled = f' href="{LIST_PATH}?{urlencode(next_query)}"', ''
+        else:
+            next_page, disabled = ' aria-disabled="true"', ' disabled'
+        return LIST_PAGE.format(cards=cards, next_page=next_page, disabled=disabled)
+
+    def render_detail(self, query: dict):
+        try:
+            fixture = self.fixtures[int(query['id'][0])]
+        except (KeyError, ValueError, IndexError):
+            return None
+        return DETAIL_PAGE.format(symbol=html.escape(fixture['symbol']), text=html.escape(fixture['text']))
+
+    def handler(self):
+        site = self
+
+        class FixtureHandler(BaseHTTPRequestHandler):
+
+            def do_GET(self) -> None:
+                if site.latency:
+                    time.sleep(site.latency)
+                url = urlparse(self.path)
+                query = parse_qs(url.query)
+
+                body = None
+                if url.path == LIST_PATH:
+                    site.count('list')
+                    body = site.render_list(query)
+                elif url.path == DETAIL_PATH:
+                    site.count('detail')
+                    body = site.render_detail(query)
+
+                if body is None:
+                    site.count('missing')
+                    self.send_error(404)
+                    return
+
+                content = body.encode('utf-8')
+                self.send_response(200)
+                self.send_header('Content-Type', 'text/html; charset=utf-8')
+                self.send_header('Content-Length', str(len(content)))
+                self.end_headers()
+                self.wfile.write(content)
+
+            def log_message(self, format, *args) -> None:
+                pass
+
+        return FixtureHandler
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description='Serve F45 fixtures as a local SET news site')
+    parser.add_argument('--records', type=int, default=100)
+    parser.add_argument('--cards-per-page', type=int, default=20)
+    parser.add_argument('--latency-ms', type=float, default=0)
+    parser.add_argument('--port', type=int, default=8045)
+    parser.add_argument('--corpus', default=DEFAULT_CORPUS_PATH)
+    parser.add_argument('--cache-dir', help='Serve the F45 pages recorded in this page cache')
+    args = parser.parse_args()
+
+    site = FixtureSite(
+        load_fixtures(args.records, args.corpus, args.cache_dir),
+        cards_per_page=args.cards_per_page,
+        latency=args.latency_ms / 1000,
+        port=args.port,
+    )
+    print(f'Serving {len(site.fixtures)} F45s over {site.pages} pages at {site.base_url}{LIST_PATH}')
+    try:
+        site.server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        site.server.server_close()
+        print(json.dumps(site.requests))
+
+
+if __name__ == '__main__':
+    main()
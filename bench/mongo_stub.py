@@ -0,0 +1,328 @@
+
+import copy
+import itertools
+import threading
+import time
+from types import SimpleNamespace
+
+
+# In-process stand-in for mongo.mongo.MongoDBManager, covering the queries and updates the
+# scraper sends, so a benchmark measures the pipeline and not a database server
+
+# Seconds every connect, index build, query and bulk write waits, like a round trip to a real server
+ROUND_TRIP = {'seconds': 0.0}
+
+
+def round_trip() -> None:
+    if ROUND_TRIP['seconds']:
+        time.sleep(ROUND_TRIP['seconds'])
+
+
+COMPARISONS = {
+    '$gt': lambda a, b: a is not None and b is not None and a > b,
+    '$gte': lambda a, b: a is not None and b is not None and a >= b,
+    '$lt': lambda a, b: a is not None and b is not None and a < b,
+    '$lte': lambda a, b: a is not None and b is not None and a <= b,
+    '$eq': lambda a, b: a == b,
+    '$ne': lambda a, b: a != b,
+}
+
+
+def get_field(document: dict, path: str):
+    value = document
+    for part in path.split('.'):
+        if not isinstance(value, dict) or part not in value:
+            return None
+        value = value[part]
+    return value
+
+
+def set_field(document: dict, path: str, value) -> None:
+    parts = path.split('.')
+    for part in parts[:-1]:
+        document = document.setdefault(part, {})
+    document[parts[-1]] = value
+
+
+def matches(document: dict, query: dict) -> bool:
+    for key, condition in query.items():
+        if key == '$and':
+            if not all(matches(document, part) for part in condition):
+                return False
+            continue
+        if key == '$or':
+            if not any(matches(document, part) for part in condition):
+                return False
+            continue
+
+        value = get_field(document, key)
+        if not isinstance(condition, dict) or not any(op.startswith('$') for op in condition):
+            if value != condition:
+                return False
+            continue
+
+        for op, operand in condition.items():
+            if op == '$in':
+                ok = value in operand
+            elif op == '$nin':
+                ok = value not in operand
+            elif op == '$exists':
+                ok = (value is not None) == bool(operand)
+            elif op in COMPARISONS:
+                ok = COMPARISONS[op](value, operand)
+            else:
+                raise NotImplementedError(f'Query operator {op} is not supported by the Mongo stand-in')
+            if not ok:
+                return False
+    return True
+
+
+def evaluate(expression, document: dict):
+    # Aggregation expressions used by pipeline updates
+    if isinstance(expression, str) and expression.startswith('$'):
+        return get_field(document, expression[1:])
+    if isinstance(expression, list):
+        return [evaluate(item, document) for item in expression]
+    if not isinstance(expression, dict) or len(expression) != 1 or not next(iter(expression)).startswith('$'):
+        if isinstance(expression, dict):
+            return {key: evaluate(value, document) for key, value in expression.items()}
+        return expression
+
+    op, operand = next(iter(expression.items()))
+    if op == '$literal':
+        return operand
+    if op == '$cond':
+        if isinstance(operand, dict):
+            operand = [operand['if'], operand['then'], operand['else']]
+        condition, then, otherwise = operand
+        return evaluate(then, document) if evaluate(condition, document) else evaluate(otherwise, document)
+    if op == '$ifNull':
+        *values, fallback = operand
+        for value in values:
+            value = evaluate(value, document)
+            if value is not None:
+                return value
+        return evaluate(fallback, document)
+    if op == '$and':
+        return all(evaluate(item, document) for item in operand)
+    if op == '$or':
+        return any(evaluate(item, document) for item in operand)
+    if op in COMPARISONS:
+        left, right = (evaluate(item, document) for item in operand)
+        return COMPARISONS[op](left, right)
+    raise NotImplementedError(f'Expression {op} is not supported by the Mongo stand-in')
+
+
+def project(document: dict, projection: dict) -> dict:
+    if not projection:
+        return copy.deepcopy(document)
+    included = [key for key, value in projection.items() if value and key != '_id']
+    if included:
+        result = {key: copy.deepcopy(get_field(document, key)) for key in included if get_field(document, key) is not None}
+        if projection.get('_id', 1) and '_id' in document:
+            result['_id'] = document['_id']
+        return result
+    return {key: copy.deepcopy(value) for key, value in document.items() if projection.get(key, 1)}
+
+
+class InMemoryCursor:
+
+    def __init__(self, documents: list) -> None:
+        self.documents = documents
+
+    def sort(self, key, direction: int = 1):
+        keys = key if isinstance(key, list) else [(key, direction)]
+        for field, order in reversed(keys):
+            self.documents.sort(key=lambda doc: (get_field(doc, field) is not None, get_field(doc, field)), reverse=order < 0)
+        return self
+
+    def limit(self, count: int):
+        if count:
+            self.documents = self.documents[:count]
+        return self
+
+    def __iter__(self):
+        return iter(self.documents)
+
+
+class InMemoryCollection:
+
+    def __init__(self, name: str) -> None:
+        self.name = name
+        self.lock = threading.RLock()
+        self.documents = []
+        self.indexes = {}
+        self.ids = itertools.count(1)
+
+    def create_index(self, keys, name: str = None, **kwargs) -> str:
+        round_trip()
+        name = name or '_'.join(f'{field}_{order}' for field, order in keys)
+        self.indexes[name] = {'keys': list(keys), **kwargs}
+        return name
+
+    def index_information(self) -> dict:
+        round_trip()
+        return {name: {'key': index['keys'], **{key: value for key, value in index.items() if key != 'keys'}}
+                for name, index in self.indexes.items()}
+
+    def drop_index(self, name: str) -> None:
+        round_trip()
+        self.indexes.pop(name, None)
+
+    def find(self, query: dict = None, projection: dict = None) -> InMemoryCursor:
+        round_trip()
+        with self.lock:
+            return InMemoryCursor([project(doc, projection) for doc in self.documents if matches(doc, query or {})])
+
+    def find_one(self, query: dict = None, projection: dict = None, sort: list = None):
+        cursor = self.find(query, projection)
+        if sort:
+            cursor.sort(sort)
+        return next(iter(cursor), None)
+
+    def count_documents(self, query: dict) -> int:
+        with self.lock:
+            return sum(1 for doc in self.documents if matches(doc, query))
+
+    def delete_many(self, query: dict) -> SimpleNamespace:
+        round_trip()
+        with self.lock:
+            kept = [doc for doc in self.documents if not matches(doc, query)]
+            deleted = len(self.documents) - len(kept)
+            self.documents = kept
+        return SimpleNamespace(deleted_count=deleted)
+
+    def insert_one(self, document: dict) -> SimpleNamespace:
+        with self.lock:
+            document = copy.deepcopy(document)
+            document.setdefault('_id', next(self.ids))
+            self.documents.append(document)
+            return SimpleNamespace(inserted_id=document['_id'])
+
+    def apply_update(self, document: dict, update) -> bool:
+        before = copy.deepcopy(document)
+        if isinstance(update, list):
+            for step in update:
+                for op, fields in step.items():
+                    if op not in ('$set', '$addFields'):
+                        raise NotImplementedError(f'Pipeline stage {op} is not supported by the Mongo stand-in')
+                    values = {field: evaluate(expression, document) for field, expression in fields.items()}
+                    for field, value in values.items():
+                        set_field(document, field, value)
+        else:
+            for op, fields in update.items():
+                for field, value in fields.items():
+                    if op == '$set':
+                        set_field(document, field, copy.deepcopy(value))
+                    elif op == '$setOnInsert':
+                        continue
+                    elif op == '$inc':
+                        set_field(document, field, (get_field(document, field) or 0) + value)
+                    elif op == '$unset':
+                        parent = get_field(document, field.rsplit('.', 1)[0]) if '.' in field else document
+                        if isinstance(parent, dict):
+                            parent.pop(field.rsplit('.', 1)[-1], None)
+                    else:
+                        raise NotImplementedError(f'Update operator {op} is not supported by the Mongo stand-in')
+        return document != before
+
+    def update_one(self, query: dict, update, upsert: bool = False) -> SimpleNamespace:
+        with self.lock:
+            for document in self.documents:
+                if matches(document, query):
+                    modified = self.apply_update(document, update)
+                    return SimpleNamespace(matched_count=1, modified_count=int(modified), upserted_id=None)
+
+            if not upsert:
+                return SimpleNamespace(matched_count=0, modified_count=0, upserted_id=None)
+
+            document = {key: value for key, value in query.items() if not isinstance(value, dict) and not key.startswith('$')}
+            document['_id'] = next(self.ids)
+            self.apply_update(document, update)
+            if isinstance(update, dict):
+                for field, value in update.get('$setOnInsert', {}).items():
+                    set_field(document, field, copy.deepcopy(value))
+            self.documents.append(document)
+            return SimpleNamespace(matched_count=0, modified_count=0, upserted_id=document['_id'])
+
+    def update_many(self, query: dict, update) -> SimpleNamespace:
+        round_trip()
+        with self.lock:
+            matched = [doc for doc in self.documents if matches(doc, query)]
+            modified = sum(self.apply_update(doc, update) for doc in matched)
+        return SimpleNamespace(matched_count=len(matched), modified_count=modified, upserted_id=None)
+
+    def find_one_and_update(self, query: dict, update, sort: list = None, return_document: bool = False, upsert: bool = False):
+        # return_document is pymongo's ReturnDocument, AFTER is True
+        with self.lock:
+            candidates = InMemoryCursor([doc for doc in self.documents if matches(doc, query)])
+            if sort:
+                candidates.sort(sort)
+            document = next(iter(candidates), None)
+            if document is None:
+                if not upsert:
+                    return None
+                result = self.update_one(query, update, upsert=True)
+                return self.find_one({'_id': result.upserted_id}) if return_document else None
+
+            before = copy.deepcopy(document)
+            self.apply_update(document, update)
+            return copy.deepcopy(document) if return_document else before
+
+    def bulk_write(self, operations: list, ordered: bool = True) -> SimpleNamespace:
+        # pymongo UpdateOne keeps its arguments in _filter, _doc and _upsert
+        round_trip()
+        result = SimpleNamespace(matched_count=0, modified_count=0, upserted_count=0, inserted_count=0)
+        for operation in operations:
+            name = operation.__class__.__name__
+            if name == 'UpdateOne':
+                one = self.update_one(operation._filter, operation._doc, upsert=bool(operation._upsert))
+                result.matched_count += one.matched_count
+                result.modified_count += one.modified_count
+                result.upserted_count += int(one.upserted_id is not None)
+            elif name == 'InsertOne':
+                self.insert_one(operation._doc)
+                result.inserted_count += 1
+            else:
+                raise NotImplementedError(f'{name} is not supported by the Mongo stand-in')
+        return result
+
+
+class InMemoryClient:
+
+    def __init__(self, databases: dict) -> None:
+        self.databases = databases
+        self.closed = False
+
+    def __getitem__(self, name: str) -> 'InMemoryDatabase':
+        return self.databases.setdefault(name, InMemoryDatabase(name))
+
+    def close(self) -> None:
+        round_trip()
+        self.closed = True
+
+
+class InMemoryDatabase:
+
+    def __init__(self, name: str) -> None:
+        self.name = name
+        self.collections = {}
+
+    def __getitem__(self, name: str) -> InMemoryCollection:
+        return self.collections.setdefault(name, InMemoryCollection(name))
+
+
+class InMemoryMongo:
+    # Same constructor and attributes as MongoDBManager, every instance of a process shares the data
+
+    databases = {}
+
+    def __init__(self, database: str, collection: str) -> None:
+        round_trip()
+        self.client = InMemoryClient(self.databases)
+        self.db = self.client[database]
+        self.collection = self.db[collection]
+
+    @classmethod
+    def reset(cls) -> None:
+        cls.databases.clear()
@@ -0,0 +1,179 @@
+
+import argparse
+import contextlib
+import io
+import json
+import multiprocessing
+import os
+import resource
+import sys
+import tempfile
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '../')))
+from fixture_server import FixtureSite, load_fixtures
+from bench_parser import DEFAULT_CORPUS_PATH
+
+
+DEFAULT_BASELINE_PATH = os.path.abspath(os.path.join(os.path.dirname(__file__), './baseline.json'))
+
+# name -> ScrapeSetF45 arguments, every scenario runs the whole of main() against the fixture site.
+# 'runner': 'async' runs it through AsyncScrapeSetF45 instead
+SCENARIOS = {
+    'http': {'backend': 'http', 'detail_workers': 4},
+    'http-stream': {'backend': 'http', 'detail_workers': 4, 'stream': True, 'stream_batch_size': 20},
+    'http-async': {'backend': 'http', 'detail_workers': 4, 'stream_batch_size': 20, 'runner': 'async'},
+    'selenium': {'backend': 'selenium', 'detail_workers': 1},
+    'selenium-pool': {'backend': 'selenium', 'detail_workers': 4},
+    'selenium-fast': {'backend': 'selenium', 'detail_workers': 1, 'browser_profile': 'fast'},
+    'selenium-fast-pool': {'backend': 'selenium', 'detail_workers': 4, 'browser_profile': 'fast'},
+    'selenium-fast-async': {'backend': 'selenium', 'detail_workers': 4, 'browser_profile': 'fast', 'stream_batch_size': 20, 'runner': 'async'},
+}
+DEFAULT_SCENARIOS = ['http', 'http-stream', 'http-async']
+
+# Metric -> True when bigger is better
+COMPARED = {'seconds': False, 'records_per_second': True, 'peak_rss_mb': False}
+
+
+def peak_rss_mb() -> float:
+    # ru_maxrss is in kilobytes on Linux and bytes on macOS
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return round(peak / (1024 * 1024 if sys.platform == 'darwin' else 1024), 1)
+
+
+def run_scenario(name: str, base_url: str, pages: int, verbose: bool, db_latency: float = 0.0) -> dict:
+    # Runs in a fresh process, so peak RSS belongs to this scenario alone
+    from scrape_set_f45 import ScrapeSetF45
+    from history_store import HistoryStore
+    from mongo_stub import ROUND_TRIP, InMemoryMongo
+
+    ROUND_TRIP['seconds'] = db_latency
+    options = dict(SCENARIOS[name])
+    runner = options.pop('runner', None)
+    with tempfile.TemporaryDirectory() as history_dir:
+        scraper = ScrapeSetF45(
+            max_pages=pages,
+            history=HistoryStore(history_dir),
+            base_url=base_url,
+            mongo_factory=InMemoryMongo,
+            **options,
+        )
+        if runner == 'async':
+            from async_f45 import AsyncScrapeSetF45
+            scraper = AsyncScrapeSetF45(scraper)
+        output = contextlib.nullcontext() if verbose else contextlib.redirect_stdout(io.StringIO())
+        start = time.perf_counter()
+        with output:
+            ok = scraper.main()
+        seconds = time.perf_counter() - start
+
+    report = scraper.metrics.report()
+    ROUND_TRIP['seconds'] = 0.0
+    records = len(InMemoryMongo('stockThai', 'f45').collection.documents)
+    parsed = sum(stage['records_out'] for stage in report['stages'] if stage['stage'] in ('parse_f45_texts', 'stream_f45_to_db', 'fetch_parse_write'))
+    return {
+        'scenario': name,
+        'ok': ok,
+        'status': report['status'],
+        'seconds': round(seconds, 3),
+        'records': parsed,
+        'records_in_db': records,
+        'records_per_second': round(parsed / seconds, 1) if seconds else None,
+        'peak_rss_mb': peak_rss_mb(),
+        'stages': {stage['stage']: round(stage['seconds'], 4) for stage in report['stages']},
+        'steps': {step: round(values['seconds'], 4) for step, values in report['steps'].items()},
+        'marks': {mark: round(seconds, 4) for mark, seconds in report['marks'].items()},
+        'counters': report['counters'],
+    }
+
+
+def compare(results: list, baseline: dict, tolerance: float) -> list:
+    # Returns one message per metric that got worse than the baseline by more than tolerance
+    regressions = []
+    for result in results:
+        expected = baseline.get(result['scenario'])
+        if not expected:
+            continue
+        for metric, higher_is_better in COMPARED.items():
+            if expected.get(metric) is None or result.get(metric) is None:
+                continue
+            if higher_is_better:
+                worse = result[metric] < expected[metric] / (1 + tolerance)
+            else:
+                worse = result[metric] > expected[metric] * (1 + tolerance)
+            if worse:
+                regressions.append(f'{result["scenario"]} {metric}: {result[metric]} vs baseline {expected[metric]}')
+    return regressions
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description='Run the F45 pipeline end to end against a local fixture site')
+    parser.add_argument('--scenarios', nargs='+', choices=sorted(SCENARIOS), default=DEFAULT_SCENARIOS)
+    parser.add_argument('--pages', type=int, default=5, help='Result pages of news cards')
+    parser.add_argument('--cards-per-page', type=int, default=20)
+    parser.add_argument('--latency-ms', type=float, default=20, help='Delay added to every fixture response')
+    parser.add_argument('--db-latency-ms', type=float, default=0, help='Delay added to every in-memory Mongo round trip')
+    parser.add_argument('--repeat', type=int, default=3, help='Runs per scenario, the fastest is kept')
+    parser.add_argument('--corpus', default=DEFAULT_CORPUS_PATH, help='JSONL of recorded F45 texts')
+    parser.add_argument('--cache-dir', help='Serve the F45 pages recorded in this page cache instead')
+    parser.add_argument('--baseline', default=DEFAULT_BASELINE_PATH)
+    parser.add_argument('--tolerance', type=float, default=0.2, help='Allowed slowdown before a run counts as a regression')
+    parser.add_argument('--update-baseline', action='store_true')
+    parser.add_argument('--output', help='Also write the results to this JSON file')
+    parser.add_argument('--verbose', action='store_true', help='Show the pipeline output')
+    args = parser.parse_args()
+
+    fixtures = load_fixtures(args.pages * args.cards_per_page, args.corpus, args.cache_dir)
+    context = multiprocessing.get_context('spawn')
+    results = []
+
+    with FixtureSite(fixtures, args.cards_per_page, args.latency_ms / 1000) as site:
+        print(f'Serving {len(fixtures)} F45s over {site.pages} pages at {site.base_url}, {args.latency_ms}ms latency')
+        for name in args.scenarios:
+            runs = []
+            for _ in range(args.repeat):
+                with ProcessPoolExecutor(max_workers=1, mp_context=context) as executor:
+                    runs.append(executor.submit(run_scenario, name, site.base_url, site.pages, args.verbose, args.db_latency_ms / 1000).result())
+            result = min(runs, key=lambda run: run['seconds'])
+            result['peak_rss_mb'] = max(run['peak_rss_mb'] for run in runs)
+            results.append(result)
+            print(f'> {name}: {result["status"]}, {result["seconds"]}s, {result["records_per_second"]} records/s, '
+                  f'{result["peak_rss_mb"]} MB peak RSS')
+            for stage, seconds in result['stages'].items():
+                print(f'    {stage:<36}{seconds:>10.4f}s')
+
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump(results, f, indent=4)
+
+    failed = [result['scenario'] for result in results if not result['ok']]
+    if args.update_baseline:
+        baseline = {}
+        if os.path.exists(args.baseline):
+            with open(args.baseline) as f:
+                baseline = json.load(f)
+        baseline.update({
+            result['scenario']: {metric: result[metric] for metric in COMPARED}
+            for result in results if result['ok']
+        })
+        with open(args.baseline, 'w') as f:
+            json.dump(baseline, f, indent=4)
+        print(f'Baseline written to {args.baseline}')
+        regressions = []
+    elif os.path.exists(args.baseline):
+        with open(args.baseline) as f:
+            regressions = compare(results, json.load(f), args.tolerance)
+    else:
+        print(f'No baseline at {args.baseline}, run with --update-baseline to store one')
+        regressions = []
+
+    for regression in regressions:
+        print(f'Regression: {regression}')
+    for name in failed:
+        print(f'Failed: {name}')
+    sys.exit(1 if regressions or failed else 0)
+
+
+if __name__ == '__main__':
+    main()
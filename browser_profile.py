@@ -0,0 +1,97 @@
+
+import os
+import time
+
+# Selenium is imported where it is used, jobs that never open a browser don't pay for loading it
+
+
+BROWSER_PROFILES = ('default', 'fast')
+DEFAULT_REMOTE_URL = os.environ.get('SELENIUM_REMOTE_URL', 'http://localhost:4444/wd/hub')
+FAST_WINDOW_SIZE = (1280, 900)
+# Images and web fonts are never read by the scraper
+BLOCKED_URLS = ['*.png', '*.jpg', '*.jpeg', '*.gif', '*.webp', '*.svg', '*.ico', '*.woff', '*.woff2', '*.ttf', '*.otf', '*.eot']
+
+# The search page is a Nuxt app, its buttons do nothing until the app has mounted
+APP_READY_SCRIPT = '''
+return document.readyState === 'complete' || !!(window.$nuxt && window.$nuxt.$root && window.$nuxt.$root._isMounted);
+'''
+
+
+def fast_chrome_options(window_size: tuple = FAST_WINDOW_SIZE):
+    from selenium import webdriver as selenium_webdriver
+    options = selenium_webdriver.ChromeOptions()
+    # get() returns at DOMContentLoaded, the explicit waits cover the rest
+    options.page_load_strategy = 'eager'
+    options.add_argument('--headless=new')
+    options.add_argument(f'--window-size={window_size[0]},{window_size[1]}')
+    options.add_argument('--blink-settings=imagesEnabled=false')
+    options.add_argument('--disable-gpu')
+    options.add_argument('--disable-extensions')
+    options.add_argument('--mute-audio')
+    options.add_experimental_option('prefs', {'profile.managed_default_content_settings.images': 2})
+    return options
+
+
+def block_resources(driver, patterns: list = BLOCKED_URLS) -> bool:
+    # Fonts can only be blocked over CDP, which only the Chromium drivers expose. Any other session,
+    # a plain Remote one included, keeps loading fonts and relies on the image pref alone
+    if not hasattr(driver, 'execute_cdp_cmd'):
+        return False
+    try:
+        driver.execute_cdp_cmd('Network.enable', {})
+        driver.execute_cdp_cmd('Network.setBlockedURLs', {'urls': patterns})
+        return True
+    except Exception:
+        return False
+
+
+def open_fast_web_driver(remote_url: str = DEFAULT_REMOTE_URL):
+    from selenium import webdriver as selenium_webdriver
+    driver = selenium_webdriver.Remote(command_executor=remote_url, options=fast_chrome_options())
+    driver.implicitly_wait(0)
+    block_resources(driver)
+    return driver
+
+
+def timed_wait(driver, condition, timeout: float = 10, metrics=None, name: str = 'wait', poll: float = 0.1):
+    # WebDriverWait.until that records how long it actually waited, and how often it gave up
+    from selenium.common.exceptions import TimeoutException
+    from selenium.webdriver.support.ui import WebDriverWait
+    start = time.perf_counter()
+    try:
+        return WebDriverWait(driver, timeout, poll_frequency=poll).until(condition)
+    except TimeoutException:
+        if metrics is not None:
+            metrics.incr(f'{name}_timeouts')
+        raise
+    finally:
+        if metrics is not None:
+            metrics.observe(name, time.perf_counter() - start)
+
+
+def class_text_present(class_name: str):
+    # Text of the first element with class_name once it has any, the detail body is filled in after the element appears
+    from selenium.common.exceptions import StaleElementReferenceException
+    from selenium.webdriver.common.by import By
+
+    def condition(driver):
+        try:
+            elements = driver.find_elements(By.CLASS_NAME, class_name)
+            text = elements[0].text if elements else ''
+        except StaleElementReferenceException:
+            return False
+        return text if text.strip() else False
+    return condition
+
+
+def app_ready_and_clickable(css_selector: str):
+    from selenium.webdriver.common.by import By
+
+    def condition(driver):
+        if not driver.execute_script(APP_READY_SCRIPT):
+            return False
+        elements = driver.find_elements(By.CSS_SELECTOR, css_selector)
+        if not elements or not elements[0].is_displayed() or not elements[0].is_enabled():
+            return False
+        return elements[0]
+    return condition
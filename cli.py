@@ -0,0 +1,248 @@
+import argparse
+import os
+import sys
+
+# Entry point of every F45 job. Only argparse and path defaults are loaded up front, each command
+# imports what it runs, so replay and export start without selenium, requests, pymongo or pandas.
+# bench/bench_import_time.py keeps it that way
+from backfill import DEFAULT_CHECKPOINT_PATH
+from browser_profile import BROWSER_PROFILES
+from dead_letter import DEFAULT_DEAD_LETTER_PATH
+from history_store import DEFAULT_HISTORY_DIR
+from page_cache import DEFAULT_CACHE_DIR
+
+
+DEFAULT_REPORT_PATH = os.path.abspath(os.path.join(os.path.dirname(__file__), './report/run_report.json'))
+DEFAULT_FORMS = ['F45']
+
+
+def build_parser() -> argparse.ArgumentParser:
+    parser = argparse.ArgumentParser(description='Scrape F45 announcements from set.or.th')
+    parser.add_argument('--detail-workers', type=int, default=1, help='WebDriver sessions used to fetch F45 detail pages')
+    parser.add_argument('--backend', choices=['selenium', 'http'], default='selenium', help='Fetch pages with a browser or over plain HTTP')
+    parser.add_argument('--max-pages', type=int, default=1, help='Result pages of news cards to read')
+    parser.add_argument('--report', default=DEFAULT_REPORT_PATH, help='Run report path, empty to skip')
+    parser.add_argument('--report-format', choices=['json', 'prometheus'], default='json')
+    parser.add_argument('--profile', action='store_true', help='Add cProfile and tracemalloc hot spots to the run report')
+    parser.add_argument('--stream', action='store_true', help='Parse and upsert each F45 as soon as its page is read')
+    parser.add_argument('--stream-batch-size', type=int, default=1, help='Records per upsert in --stream mode')
+    parser.add_argument('--cache-dir', default=DEFAULT_CACHE_DIR, help='Raw page cache, empty to disable')
+    parser.add_argument('--cache-max-mb', type=int, default=512)
+    parser.add_argument('--replay', action='store_true', help='Same as the replay command')
+    parser.add_argument('--history-dir', default=DEFAULT_HISTORY_DIR, help='Append-only F45 history store')
+    parser.add_argument('--browser-profile', choices=BROWSER_PROFILES, default='default',
+                        help="'fast': headless, eager page loads, no images or fonts, explicit waits only")
+    parser.add_argument('--dead-letter', default=DEFAULT_DEAD_LETTER_PATH, help='Where failed F45s are kept for retry, empty to disable')
+    parser.add_argument('--forms', nargs='+', default=DEFAULT_FORMS,
+                        help='News keywords to scrape in one session, those without a parser of their own keep their text. '
+                             'The site search takes one keyword at a time, so each form runs its own search and pagination')
+    parser.add_argument('--async', dest='use_async', action='store_true',
+                        help='Overlap list, Mongo, fetch, parse and DB writes on an event loop (scrape and backfill)')
+    parser.add_argument('--parse-executor', choices=['thread', 'process'], default='thread', help='Where --async parses pages')
+    commands = parser.add_subparsers(dest='command')
+
+    scrape_parser = commands.add_parser('scrape', help='Scrape new F45s into Mongo and the history store (the default)')
+    scrape_parser.add_argument('--from-date', help='First date, YYYY-MM-DD')
+    scrape_parser.add_argument('--to-date', help='Last date, YYYY-MM-DD')
+
+    commands.add_parser('replay', help='Parse and export cached F45 pages without a browser or Mongo')
+
+    export_parser = commands.add_parser('export', help='Export stored F45s from the history store to JSON')
+    export_parser.add_argument('--year', type=int)
+    export_parser.add_argument('--quarter', type=int)
+    export_parser.add_argument('--symbols', nargs='+')
+    export_parser.add_argument('--all', action='store_true', help='Every filing instead of the latest per symbol')
+    export_parser.add_argument('--output', help='Defaults to report/f45_data.json')
+
+    backfill_parser = commands.add_parser('backfill', help='Scrape a date range in windows, resuming from the checkpoint')
+    backfill_parser.add_argument('start', help='First date, YYYY-MM-DD')
+    backfill_parser.add_argument('end', help='Last date, YYYY-MM-DD')
+    backfill_parser.add_argument('--window-days', type=int, default=30)
+    backfill_parser.add_argument('--concurrency', type=int, default=2, help='Windows scraped at the same time')
+    backfill_parser.add_argument('--checkpoint', default=DEFAULT_CHECKPOINT_PATH)
+
+    watch_parser = commands.add_parser('watch', help='Keep a warm browser and poll for new F45s')
+    watch_parser.add_argument('--interval', type=float, default=30, help='Seconds between polls')
+
+    analytics_parser = commands.add_parser('analytics', help='Screen the latest quarter of every symbol')
+    analytics_parser.add_argument('--query', help='pandas query on the metrics, e.g. "eps_yoy > 0.2"')
+    analytics_parser.add_argument('--sort-by', default='surprise_rank')
+    analytics_parser.add_argument('--top', type=int, default=20)
+
+    commands.add_parser('retry', help='Reprocess the F45s in the dead-letter queue')
+
+    produce_parser = commands.add_parser('produce', help='Queue an F45 task for every new announcement on the list')
+    produce_parser.add_argument('--from-date', help='First date, YYYY-MM-DD')
+    produce_parser.add_argument('--to-date', help='Last date, YYYY-MM-DD')
+
+    work_parser = commands.add_parser('work', help='Claim queued F45 tasks, fetch, parse and upsert them')
+    work_parser.add_argument('--worker-id', help='Defaults to hostname-pid')
+    work_parser.add_argument('--batch-size', type=int, default=10, help='Tasks claimed at a time')
+    work_parser.add_argument('--lease-seconds', type=float, default=300, help='Time a worker has to finish a batch before its tasks are reclaimed')
+    work_parser.add_argument('--max-attempts', type=int, default=5)
+    work_parser.add_argument('--exit-when-empty', action='store_true')
+    return parser
+
+
+def open_stores(args) -> dict:
+    from dead_letter import DeadLetterQueue
+    from history_store import HistoryStore
+    from page_cache import PageCache
+
+    return {
+        'cache': PageCache(args.cache_dir, args.cache_max_mb * 1024 * 1024) if args.cache_dir else None,
+        'history': HistoryStore(args.history_dir),
+        'dead_letters': DeadLetterQueue(args.dead_letter) if args.dead_letter else None,
+    }
+
+
+def report_options(args) -> dict:
+    return {'report_path': args.report or None, 'report_format': args.report_format, 'profile': args.profile}
+
+
+def scrape_options(args) -> dict:
+    return {
+        'detail_workers': args.detail_workers,
+        'browser_profile': args.browser_profile,
+        'backend': args.backend,
+        'max_pages': args.max_pages,
+        'stream': args.stream,
+        'stream_batch_size': args.stream_batch_size,
+    }
+
+
+def new_scraper(args, **options):
+    # One F45 scraper, or one session over several forms when --forms asks for more
+    if args.forms != DEFAULT_FORMS:
+        if args.use_async:
+            raise SystemExit('--async runs a single form')
+        from scrape_set_news import ScrapeSetNews
+        return ScrapeSetNews(args.forms, **options)
+
+    from scrape_set_f45 import ScrapeSetF45
+    if args.use_async:
+        from async_f45 import AsyncScrapeSetF45
+        return AsyncScrapeSetF45(ScrapeSetF45(**options), parse_workers=max(args.detail_workers, 2), parse_executor=args.parse_executor)
+    return ScrapeSetF45(**options)
+
+
+def run_scrape(args) -> bool:
+    return new_scraper(args, **scrape_options(args), **report_options(args), **open_stores(args)).main(
+        getattr(args, 'from_date', None), getattr(args, 'to_date', None))
+
+
+def run_replay(args) -> bool:
+    from scrape_set_f45 import ScrapeSetF45
+    stores = open_stores(args)
+    return ScrapeSetF45(**report_options(args), cache=stores['cache'], dead_letters=stores['dead_letters']).replay()
+
+
+def run_export(args) -> bool:
+    from scrape_set_f45 import ScrapeSetF45
+    stores = open_stores(args)
+    return ScrapeSetF45(**report_options(args), history=stores['history']).export(
+        args.year, args.quarter, args.symbols, args.all, args.output)
+
+
+def run_backfill_command(args) -> bool:
+    from backfill import run_backfill
+    stores = open_stores(args)
+    options = dict(scrape_options(args), max_pages=max(args.max_pages, 100))
+    summary = run_backfill(
+        args.start,
+        args.end,
+        lambda: new_scraper(args, **options, **stores),
+        window_days=args.window_days,
+        concurrency=args.concurrency,
+        checkpoint_path=args.checkpoint,
+    )
+    return not summary['failed']
+
+
+def run_watch(args) -> bool:
+    from scrape_set_f45 import ScrapeSetF45
+    from watch_f45 import WatchSetF45
+    WatchSetF45(
+        ScrapeSetF45(
+            detail_workers=args.detail_workers,
+            browser_profile=args.browser_profile,
+            **report_options(args),
+            **open_stores(args),
+        ),
+        interval=args.interval,
+    ).run()
+    return True
+
+
+def run_analytics(args) -> bool:
+    from f45_analytics import EarningsAnalytics
+    from history_store import HistoryStore
+    screen = EarningsAnalytics(HistoryStore(args.history_dir)).screen(args.query, args.sort_by, args.top)
+    print(screen.to_string(index=False))
+    return True
+
+
+def run_retry(args) -> bool:
+    from news_forms import get_form
+    from scrape_set_f45 import ScrapeSetF45
+    stores = open_stores(args)
+    results = [ScrapeSetF45(**report_options(args), **stores, form=get_form(form)).retry() for form in args.forms]
+    return all(results)
+
+
+def run_produce(args) -> bool:
+    from scrape_set_f45 import ScrapeSetF45
+    stores = open_stores(args)
+    return ScrapeSetF45(
+        backend=args.backend,
+        max_pages=args.max_pages,
+        browser_profile=args.browser_profile,
+        report_path=args.report or None,
+        report_format=args.report_format,
+        cache=stores['cache'],
+        dead_letters=stores['dead_letters'],
+    ).produce(args.from_date, args.to_date)
+
+
+def run_work(args) -> bool:
+    from scrape_set_f45 import ScrapeSetF45
+    from worker_f45 import WorkerSetF45
+    WorkerSetF45(
+        ScrapeSetF45(
+            detail_workers=args.detail_workers,
+            browser_profile=args.browser_profile,
+            backend=args.backend,
+            report_path=args.report or None,
+            report_format=args.report_format,
+            **open_stores(args),
+        ),
+        worker_id=args.worker_id,
+        batch_size=args.batch_size,
+        lease_seconds=args.lease_seconds,
+        max_attempts=args.max_attempts,
+    ).run(exit_when_empty=args.exit_when_empty)
+    return True
+
+
+COMMANDS = {
+    'scrape': run_scrape,
+    'replay': run_replay,
+    'export': run_export,
+    'backfill': run_backfill_command,
+    'watch': run_watch,
+    'analytics': run_analytics,
+    'retry': run_retry,
+    'produce': run_produce,
+    'work': run_work,
+}
+
+
+def main(argv: list = None) -> None:
+    args = build_parser().parse_args(argv)
+    command = 'replay' if args.replay else args.command or 'scrape'
+    # A failed run exits non-zero so cron and schedulers can tell
+    sys.exit(0 if COMMANDS[command](args) else 1)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,72 @@
+
+import json
+import os
+import threading
+from datetime import datetime
+
+
+DEFAULT_DEAD_LETTER_PATH = os.path.abspath(os.path.join(os.path.dirname(__file__), './report/dead_letter.jsonl'))
+# form is only set for news other than F45, see news_forms
+ANNOUNCEMENT_FIELDS = ('symbol', 'date', 'time', 'iso_date', 'source', 'headline', 'url', 'card_text', 'form')
+
+
+def dead_letter_key(f45: dict) -> str:
+    # Announcement identity, or the raw card when the card itself could not be read
+    if f45.get('symbol') and f45.get('iso_date'):
+        return f'f45|{f45["symbol"]}|{f45["iso_date"]}|{f45.get("headline", "")}'
+    return f'card|{f45.get("card_text") or f45.get("url") or ""}'
+
+
+class DeadLetterQueue:
+    # JSONL of announcements that failed a stage, with the raw card and page text needed to retry them.
+    # Failures are appended as they happen, so they survive a run that dies half way
+
+    def __init__(self, path: str = DEFAULT_DEAD_LETTER_PATH) -> None:
+        self.path = path
+        self.lock = threading.Lock()
+
+    def add(self, stage: str, f45: dict, error: str, text: str = None) -> dict:
+        entry = {
+            'key': dead_letter_key(f45),
+            'stage': stage,
+            'error': error,
+            'failed_at': datetime.now().isoformat(timespec='seconds'),
+            'f45': {field: f45[field] for field in ANNOUNCEMENT_FIELDS if f45.get(field) is not None},
+            'text': text if text is not None else f45.get('text'),
+        }
+        with self.lock:
+            os.makedirs(os.path.dirname(os.path.abspath(self.path)), exist_ok=True)
+            with open(self.path, 'a', encoding='utf-8') as f:
+                f.write(json.dumps(entry, ensure_ascii=False) + '\n')
+        return entry
+
+    def read(self) -> list:
+        # One entry per announcement, the latest failure wins and attempts counts them all
+        if not os.path.exists(self.path):
+            return []
+
+        entries = {}
+        with self.lock, open(self.path, encoding='utf-8') as f:
+            for line in f:
+                if not line.strip():
+                    continue
+                entry = json.loads(line)
+                attempts = entries[entry['key']]['attempts'] if entry['key'] in entries else 0
+                entry['attempts'] = attempts + entry.get('attempts', 1)
+                entries[entry['key']] = entry
+        return list(entries.values())
+
+    def replace(self, entries: list) -> None:
+        # Rewrites the queue with entries, dropping the ones a retry has resolved
+        with self.lock:
+            if not entries:
+                if os.path.exists(self.path):
+                    os.remove(self.path)
+                return
+
+            os.makedirs(os.path.dirname(os.path.abspath(self.path)), exist_ok=True)
+            tmp_path = f'{self.path}.tmp'
+            with open(tmp_path, 'w', encoding='utf-8') as f:
+                for entry in entries:
+                    f.write(json.dumps(entry, ensure_ascii=False) + '\n')
+            os.replace(tmp_path, self.path)
@@ -0,0 +1,133 @@
+
+import contextvars
+import queue
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from browser_profile import class_text_present, timed_wait
+
+
+# Put on the results by every worker on its way out, however it ends
+WORKER_DONE = object()
+
+def open_remote_web_driver():
+    from sel.sel import RemoteWebDriver
+    webdriver = RemoteWebDriver()
+    webdriver.InitializeWebDriver()
+    return webdriver.driver
+
+
+class DetailPagePool:
+    # Pool of WebDriver sessions that fetch F45 detail texts by URL in parallel
+
+    def __init__(self, size: int, text_class_name: str, driver_factory=open_remote_web_driver, timeout: int = 10, metrics=None) -> None:
+        self.size = max(1, int(size))
+        self.metrics = metrics
+        self.text_class_name = text_class_name
+        self.driver_factory = driver_factory
+        self.timeout = timeout
+        self.drivers = []
+
+    def open(self, pages: int = None) -> None:
+        # Start the sessions concurrently, browser startup dominates small batches. No more sessions
+        # than there are pages to read
+        wanted = self.size if pages is None else min(self.size, pages)
+        missing = wanted - len(self.drivers)
+        if missing <= 0:
+            return
+        with ThreadPoolExecutor(max_workers=missing) as executor:
+            futures = [executor.submit(self.driver_factory) for _ in range(missing)]
+            for future in futures:
+                self.drivers.append(future.result())
+
+    def close(self) -> None:
+        for driver in self.drivers:
+            try:
+                driver.quit()
+            except Exception:
+                pass
+        self.drivers = []
+
+    def __enter__(self):
+        # Sessions are started by the first fetch, sized to its pages
+        return self
+
+    def __exit__(self, *exc) -> None:
+        self.close()
+
+    def fetch_text(self, driver, url: str) -> str:
+        if not url:
+            raise ValueError('No detail link on the news card')
+        driver.get(url)
+        return timed_wait(driver, class_text_present(self.text_class_name), self.timeout, self.metrics, 'wait_f45_text')
+
+    def iter_fetch(self, urls: list):
+        # Yields (index, text, error) as soon as each page arrives, holding at most
+        # a couple of pages per session in memory
+        if not urls:
+            return
+        self.open(len(urls))
+        tasks = queue.Queue()
+        for index, url in enumerate(urls):
+            tasks.put((index, url))
+        results = queue.Queue(maxsize=2 * len(self.drivers))
+        stop = threading.Event()
+
+        def put(result) -> None:
+            while not stop.is_set():
+                try:
+                    results.put(result, timeout=0.5)
+                    return
+                except queue.Full:
+                    pass
+
+        def worker(driver) -> None:
+            try:
+                while not stop.is_set():
+                    try:
+                        index, url = tasks.get_nowait()
+                    except queue.Empty:
+                        return
+                    start = time.perf_counter()
+                    try:
+                        result = (index, self.fetch_text(driver, url), None)
+                    except Exception as e:
+                        result = (index, None, str(e) or e.__class__.__name__)
+                    if self.metrics is not None:
+                        self.metrics.observe('fetch_f45_page', time.perf_counter() - start)
+                    put(result)
+            finally:
+                put(WORKER_DONE)
+
+        # Workers run in copies of the caller's context, so their WebDriver calls count into the caller's run
+        threads = [threading.Thread(target=contextvars.copy_context().run, args=(worker, driver), daemon=True) for driver in self.drivers]
+        for thread in threads:
+            thread.start()
+        try:
+            read = set()
+            finished = 0
+            while len(read) < len(urls) and finished < len(threads):
+                result = results.get()
+                if result is WORKER_DONE:
+                    finished += 1
+                    continue
+                read.add(result[0])
+                yield result
+
+            # Every worker is gone, a page one of them was reading when it died is an error, not a hang
+            for index in range(len(urls)):
+                if index not in read:
+                    yield (index, None, 'Detail page worker stopped before reading the page')
+        finally:
+            # The consumer may stop early, let the workers finish their current page and exit
+            stop.set()
+            for thread in threads:
+                thread.join()
+
+    def fetch_all(self, urls: list) -> list:
+        # Returns one (text, error) pair per url, in the same order as urls
+        results = [(None, None)] * len(urls)
+        for index, text, error in self.iter_fetch(urls):
+            results[index] = (text, error)
+        return results
@@ -0,0 +1,141 @@
+
+import json
+import os
+
+import numpy as np
+import pandas as pd
+
+from history_store import HistoryStore
+
+
+DEFAULT_ANALYTICS_DIR = os.path.abspath(os.path.join(os.path.dirname(__file__), './report/analytics'))
+KEY = ['symbol', 'year', 'quarter']
+
+
+def load_frame(records) -> pd.DataFrame:
+    frame = pd.DataFrame.from_records(
+        list(records),
+        columns=['symbol', 'last_update', 'quarter', 'year', 'net_profit', 'eps'],
+    )
+    return frame.astype({'symbol': 'string', 'last_update': 'string', 'quarter': 'int64', 'year': 'int64',
+                         'net_profit': 'float64', 'eps': 'float64'})
+
+
+def latest_versions(frame: pd.DataFrame) -> pd.DataFrame:
+    # One row per symbol and quarter, the last amendment wins
+    frame = frame.sort_values(KEY + ['last_update'])
+    return frame.drop_duplicates(KEY, keep='last').reset_index(drop=True)
+
+
+def growth(current: pd.Series, previous: pd.Series) -> pd.Series:
+    previous = previous.where(previous != 0)
+    return (current - previous) / previous.abs()
+
+
+def lagged(values: pd.Series, symbols: pd.Series, periods: pd.Series, lag: int) -> np.ndarray:
+    # Value of the same symbol `lag` quarters earlier, NaN when that quarter is missing
+    index = pd.MultiIndex.from_arrays([symbols, periods - lag])
+    return values.reindex(index).to_numpy()
+
+
+def compute_metrics(frame: pd.DataFrame) -> pd.DataFrame:
+    # Growth, trailing-four-quarter EPS and surprise rank for every symbol and quarter at once
+    frame = latest_versions(frame)
+    frame['period'] = frame['year'] * 4 + frame['quarter'] - 1
+    symbols, periods = frame['symbol'], frame['period']
+
+    # Q4 rows hold '12 Months' figures, take Q1-Q3 off to get the quarter on its own
+    by_period = frame.set_index(['symbol', 'period'])
+    for column in ('eps', 'net_profit'):
+        first_three = sum(lagged(by_period[column], symbols, periods, lag) for lag in (1, 2, 3))
+        frame[f'{column}_quarter'] = np.where(frame['quarter'] == 4, frame[column] - first_three, frame[column])
+
+    by_period = frame.set_index(['symbol', 'period'])
+    for column in ('eps', 'net_profit'):
+        quarterly = by_period[f'{column}_quarter']
+        frame[f'{column}_qoq'] = growth(frame[f'{column}_quarter'], pd.Series(lagged(quarterly, symbols, periods, 1), index=frame.index))
+        frame[f'{column}_yoy'] = growth(frame[column], pd.Series(lagged(by_period[column], symbols, periods, 4), index=frame.index))
+
+    quarterly_eps = by_period['eps_quarter']
+    frame['eps_ttm'] = frame['eps_quarter'] + sum(lagged(quarterly_eps, symbols, periods, lag) for lag in (1, 2, 3))
+
+    # No consensus estimates are scraped, so the surprise is year-on-year EPS growth
+    # ranked against every other filing of the same quarter (1.0 = biggest surprise)
+    frame['surprise_rank'] = frame.groupby(['year', 'quarter'])['eps_yoy'].rank(pct=True)
+
+    return frame.sort_values(['symbol', 'period']).reset_index(drop=True)
+
+
+class EarningsAnalytics:
+    # Metrics materialized on disk, refreshed from only the history part files added since
+
+    def __init__(self, history: HistoryStore = None, cache_dir: str = DEFAULT_ANALYTICS_DIR) -> None:
+        self.history = history if history is not None else HistoryStore()
+        self.cache_dir = cache_dir
+        self.frame_path = os.path.join(cache_dir, 'metrics.pkl')
+        self.manifest_path = os.path.join(cache_dir, 'manifest.json')
+        self._frame = None
+        self._parts = None
+
+    def load_cache(self) -> None:
+        if self._frame is not None:
+            return
+        if os.path.exists(self.frame_path) and os.path.exists(self.manifest_path):
+            self._frame = pd.read_pickle(self.frame_path)
+            with open(self.manifest_path) as f:
+                self._parts = set(json.load(f)['parts'])
+        else:
+            self._frame = None
+            self._parts = set()
+
+    def save_cache(self) -> None:
+        os.makedirs(self.cache_dir, exist_ok=True)
+        self._frame.to_pickle(f'{self.frame_path}.tmp')
+        os.replace(f'{self.frame_path}.tmp', self.frame_path)
+        with open(f'{self.manifest_path}.tmp', 'w') as f:
+            json.dump({'parts': sorted(self._parts)}, f)
+        os.replace(f'{self.manifest_path}.tmp', self.manifest_path)
+
+    def refresh(self) -> pd.DataFrame:
+        self.load_cache()
+        parts = self.history.part_files()
+        relative = {os.path.relpath(path, self.history.root): path for path in parts}
+        new_parts = [path for name, path in relative.items() if name not in self._parts]
+
+        if self._frame is None:
+            print(f'> Computing F45 metrics from {len(parts)} history parts')
+            self._frame = compute_metrics(load_frame(self.history.iter_records()))
+        elif new_parts:
+            # History parts are immutable, only symbols in the new ones need recomputing
+            symbols = set()
+            for path in new_parts:
+                with open(path) as f:
+                    symbols.update(json.loads(line)['symbol'] for line in f if line.strip())
+            print(f'> Updating F45 metrics of {len(symbols)} symbols from {len(new_parts)} new history parts')
+
+            updated = compute_metrics(load_frame(self.history.iter_records(symbols=sorted(symbols))))
+            kept = self._frame[~self._frame['symbol'].isin(symbols)]
+            frame = pd.concat([kept, updated], ignore_index=True)
+            frame['surprise_rank'] = frame.groupby(['year', 'quarter'])['eps_yoy'].rank(pct=True)
+            self._frame = frame.sort_values(['symbol', 'period']).reset_index(drop=True)
+        else:
+            return self._frame
+
+        self._parts = set(relative)
+        self.save_cache()
+        return self._frame
+
+    def metrics(self) -> pd.DataFrame:
+        return self.refresh()
+
+    def latest(self) -> pd.DataFrame:
+        # Most recent quarter of every symbol
+        frame = self.refresh()
+        return frame.loc[frame.groupby('symbol')['period'].idxmax()].reset_index(drop=True)
+
+    def screen(self, query: str = None, sort_by: str = 'surprise_rank', top: int = None) -> pd.DataFrame:
+        frame = self.latest()
+        if query:
+            frame = frame.query(query)
+        frame = frame.sort_values(sort_by, ascending=False, na_position='last')
+        return frame.head(top) if top else frame
@@ -0,0 +1,64 @@
+
+import re
+
+
+# Same rules as ScrapeSetF45.parse_f45_in_stages (split_row_from_f45 -> extract_numbers_from_f45 -> clean_f45), in one pass:
+# a row is classified by the first matching marker, the last row of each kind wins,
+# '12' in the quarter row means Quarter 4, numbers are the second double-space separated
+# column with '(Update)' and ',' removed and '(x)' read as -x
+WIDE_SPACE = re.compile(r'\s{3,}')
+NUMBER_TABLE = str.maketrans({',': None, '(': '-', ')': None})
+
+QUARTER, YEAR, NET_PROFIT, EPS = range(4)
+
+
+def classify_row(row: str):
+    if 'Quarter' in row or '12 Months' in row:
+        return QUARTER
+    if '  Year  ' in row:
+        return YEAR
+    if 'Profit (loss)' in row or 'Increase (decrease)' in row:
+        return NET_PROFIT
+    if 'EPS' in row:
+        return EPS
+    return None
+
+
+def second_column(row: str) -> str:
+    return WIDE_SPACE.sub('  ', row).split('  ', 2)[1]
+
+
+def to_number(value: str) -> float:
+    return float(value.replace('(Update)', '').translate(NUMBER_TABLE))
+
+
+def parse_f45_text(text: str) -> dict:
+    # Returns {'quarter', 'year', 'net_profit', 'eps'} from the raw text of an F45 detail page
+    rows = [None, None, None, None]
+    missing = 4
+
+    # Walking backwards the first row of each kind is the last one, stop once all are found
+    for row in reversed(text.split('\n')):
+        kind = classify_row(row)
+        if kind is not None and rows[kind] is None:
+            rows[kind] = row.strip()
+            missing -= 1
+            if not missing:
+                break
+
+    quarter, year, net_profit, eps = rows
+    if quarter is None:
+        raise ValueError('No Quarter row in F45 text')
+    if year is None:
+        raise ValueError('No Year row in F45 text')
+    if net_profit is None:
+        raise ValueError('No Profit (loss) row in F45 text')
+    if eps is None:
+        raise ValueError('No EPS row in F45 text')
+
+    return {
+        'quarter': 4 if '12' in quarter else int(quarter.split()[1]),
+        'year': int(year.split()[1]),
+        'net_profit': to_number(second_column(net_profit)),
+        'eps': to_number(second_column(eps)),
+    }
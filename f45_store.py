@@ -0,0 +1,191 @@
+
+from pymongo import ASCENDING, DESCENDING, UpdateOne
+
+
+# content_hash is the sha256 of the detail text, a refiled but identical F45 is not parsed or written again
+LATEST_FIELDS = ('symbol', 'last_update', 'quarter', 'year', 'net_profit', 'eps', 'content_hash')
+
+# Every filing of every quarter, amendments kept as versions told apart by last_update
+VERSIONS_COLLECTION = 'f45_versions'
+VERSION_KEY = ('symbol', 'year', 'quarter', 'last_update')
+
+
+def ensure_latest_indexes(collection) -> None:
+    # compare_period_in_db and update_db both look documents up by symbol. Unique, so upserts racing from
+    # backfill windows, queue workers and async writes can't insert a symbol twice; the server retries the
+    # upsert that loses the race as an update
+    index = collection.index_information().get('symbol_1')
+    if index is not None and index.get('unique'):
+        return
+    
+    # Collections from before the unique index may already hold duplicates
+    remove_duplicate_latest(collection)
+    if index is not None:
+        collection.drop_index('symbol_1')
+    collection.create_index([('symbol', ASCENDING)], name='symbol_1', unique=True)
+
+
+def remove_duplicate_latest(collection) -> int:
+    # Keeps the newest document of every symbol, returns how many were removed
+    kept = {}
+    duplicates = []
+    for doc in collection.find({}, {'_id': 1, 'symbol': 1, 'last_update': 1}):
+        current = kept.get(doc.get('symbol'))
+        if current is None:
+            kept[doc.get('symbol')] = doc
+        elif (doc.get('last_update') or '') > (current.get('last_update') or ''):
+            duplicates.append(current['_id'])
+            kept[doc.get('symbol')] = doc
+        else:
+            duplicates.append(doc['_id'])
+    if not duplicates:
+        return 0
+    return collection.delete_many({'_id': {'$in': duplicates}}).deleted_count
+
+
+def find_latest(collection, symbols: list) -> dict:
+    # One $in round trip for every card, returning {symbol: {'last_update', 'content_hash'}}
+    symbols = list(dict.fromkeys(symbols))
+    if not symbols:
+        return {}
+    
+    cursor = collection.find(
+        {'symbol': {'$in': symbols}},
+        {'_id': 0, 'symbol': 1, 'last_update': 1, 'content_hash': 1},
+    )
+    return {doc['symbol']: doc for doc in cursor}
+
+
+def newer_only_update(record: dict, fields: tuple = LATEST_FIELDS) -> list:
+    # Pipeline update that leaves the stored document alone when it is already newer,
+    # so concurrent backfill windows can't move a symbol back to an older quarter
+    is_newer = {'$gt': [record['last_update'], {'$ifNull': ['$last_update', '']}]}
+    return [{'$set': {field: {'$cond': [is_newer, {'$literal': record.get(field)}, f'${field}']} for field in fields}}]
+
+
+def bulk_upsert_latest(collection, records: list, newer_only: bool = False, fields: tuple = LATEST_FIELDS) -> dict:
+    # Keep the newest record per symbol, on equal last_update the later record wins
+    latest = {}
+    for record in records:
+        current = latest.get(record['symbol'])
+        if current is None or record['last_update'] >= current['last_update']:
+            latest[record['symbol']] = record
+    
+    report = {'matched': 0, 'modified': 0, 'upserted': 0, 'skipped': len(records) - len(latest)}
+    if not latest:
+        return report
+    
+    operations = [
+        UpdateOne({'symbol': symbol}, newer_only_update(record, fields) if newer_only else {'$set': {field: record.get(field) for field in fields}}, upsert=True)
+        for symbol, record in latest.items()
+    ]
+    result = collection.bulk_write(operations, ordered=False)
+    
+    report['matched'] = result.matched_count
+    report['modified'] = result.modified_count
+    report['upserted'] = result.upserted_count
+    return report
+
+
+def bulk_touch_latest(collection, f45s: list, newer_only: bool = False) -> int:
+    # Moves last_update of symbols whose new F45 has the stored content, so the next run does not fetch it again
+    latest = {}
+    for f45 in f45s:
+        if f45['iso_date'] >= latest.get(f45['symbol'], ''):
+            latest[f45['symbol']] = f45['iso_date']
+    if not latest:
+        return 0
+    
+    operations = []
+    for symbol, iso_date in latest.items():
+        query = {'symbol': symbol}
+        if newer_only:
+            query['last_update'] = {'$lt': iso_date}
+        operations.append(UpdateOne(query, {'$set': {'last_update': iso_date}}))
+    return collection.bulk_write(operations, ordered=False).modified_count
+
+
+def ensure_version_indexes(collection) -> None:
+    # Newest version of a symbol's newest quarter comes first, which latest_eps relies on
+    collection.create_index(
+        [('symbol', ASCENDING), ('year', DESCENDING), ('quarter', DESCENDING), ('last_update', DESCENDING)],
+        name='symbol_1_year_-1_quarter_-1_last_update_-1',
+        unique=True,
+    )
+    # Filings of one quarter in time order, for filings_after
+    collection.create_index(
+        [('year', ASCENDING), ('quarter', ASCENDING), ('last_update', ASCENDING)],
+        name='year_1_quarter_1_last_update_1',
+    )
+    # Everything filed since a timestamp, across quarters
+    collection.create_index([('last_update', ASCENDING)], name='last_update_1')
+
+
+def bulk_upsert_versions(collection, records: list, key: tuple = VERSION_KEY, fields: tuple = LATEST_FIELDS) -> dict:
+    # One document per (symbol, year, quarter, last_update), re-scraping a filing only refreshes its numbers
+    versions = {tuple(record[field] for field in key): record for record in records}
+    report = {'versions_matched': 0, 'versions_upserted': 0}
+    if not versions:
+        return report
+    
+    operations = [
+        UpdateOne(dict(zip(key, values)), {'$set': {field: record.get(field) for field in fields}}, upsert=True)
+        for values, record in versions.items()
+    ]
+    result = collection.bulk_write(operations, ordered=False)
+    
+    report['versions_matched'] = result.matched_count
+    report['versions_upserted'] = result.upserted_count
+    return report
+
+
+def find_version_dates(collection, symbols: list, since: str, until: str) -> set:
+    # {(symbol, last_update)} already stored for cards published between since and until
+    symbols = list(dict.fromkeys(symbols))
+    if not symbols:
+        return set()
+    
+    cursor = collection.find(
+        {'symbol': {'$in': symbols}, 'last_update': {'$gte': since, '$lte': until}},
+        {'_id': 0, 'symbol': 1, 'last_update': 1},
+    )
+    return {(doc['symbol'], doc['last_update']) for doc in cursor}
+
+
+def latest_eps(collection, symbols: list) -> dict:
+    # {symbol: newest version of its newest quarter}, read off the front of the compound index
+    symbols = list(dict.fromkeys(symbols))
+    if not symbols:
+        return {}
+    
+    pipeline = [
+        {'$match': {'symbol': {'$in': symbols}}},
+        {'$sort': {'symbol': 1, 'year': -1, 'quarter': -1, 'last_update': -1}},
+        {'$group': {
+            '_id': '$symbol',
+            'year': {'$first': '$year'},
+            'quarter': {'$first': '$quarter'},
+            'last_update': {'$first': '$last_update'},
+            'net_profit': {'$first': '$net_profit'},
+            'eps': {'$first': '$eps'},
+        }},
+    ]
+    return {doc.pop('_id'): doc for doc in collection.aggregate(pipeline)}
+
+
+def filings_after(collection, year: int, quarter: int, since: str = '') -> list:
+    # Every version filed for one quarter after since, oldest first
+    cursor = collection.find(
+        {'year': int(year), 'quarter': int(quarter), 'last_update': {'$gt': since}},
+        {'_id': 0},
+    ).sort([('year', ASCENDING), ('quarter', ASCENDING), ('last_update', ASCENDING)])
+    return list(cursor)
+
+
+def quarter_versions(collection, symbol: str, year: int, quarter: int) -> list:
+    # Original filing of one quarter and its amendments, newest first
+    cursor = collection.find(
+        {'symbol': symbol, 'year': int(year), 'quarter': int(quarter)},
+        {'_id': 0},
+    ).sort([('symbol', ASCENDING), ('year', DESCENDING), ('quarter', DESCENDING), ('last_update', DESCENDING)])
+    return list(cursor)
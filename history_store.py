@@ -0,0 +1,118 @@
+
+import json
+import mmap
+import os
+import re
+import threading
+import uuid
+from datetime import datetime, timezone
+
+
+DEFAULT_HISTORY_DIR = os.path.abspath(os.path.join(os.path.dirname(__file__), './report/history'))
+HISTORY_FIELDS = ('symbol', 'last_update', 'quarter', 'year', 'net_profit', 'eps')
+PARTITION_PATTERN = re.compile(r'^year=(\d{4})$|^quarter=(\d)$')
+
+
+def record_key(record: dict) -> tuple:
+    return (record['symbol'], record['last_update'], record['year'], record['quarter'])
+
+
+def encode_record(record: dict) -> bytes:
+    # Compact JSON with symbol first, so a symbol can be found with a byte search
+    return json.dumps({field: record[field] for field in HISTORY_FIELDS}, ensure_ascii=False, separators=(',', ':')).encode('utf-8')
+
+
+def symbol_needle(symbol: str) -> bytes:
+    return b'{"symbol":' + json.dumps(symbol, ensure_ascii=False).encode('utf-8') + b','
+
+
+class HistoryStore:
+    # Append-only JSONL history partitioned by year=YYYY/quarter=Q. Every append writes a new
+    # immutable part file, so readers never see a half-written file and nothing is rewritten
+
+    def __init__(self, root: str = DEFAULT_HISTORY_DIR) -> None:
+        self.root = root
+        self.lock = threading.Lock()
+
+    def partition_path(self, year: int, quarter: int) -> str:
+        return os.path.join(self.root, f'year={int(year)}', f'quarter={int(quarter)}')
+
+    def partitions(self, year: int = None, quarter: int = None) -> list:
+        # [(year, quarter, path)] matching the filter, oldest first
+        found = []
+        if not os.path.isdir(self.root):
+            return found
+        for year_dir in sorted(os.listdir(self.root)):
+            match = PARTITION_PATTERN.match(year_dir)
+            if not match or not match.group(1) or (year is not None and int(match.group(1)) != int(year)):
+                continue
+            year_path = os.path.join(self.root, year_dir)
+            for quarter_dir in sorted(os.listdir(year_path)):
+                match_quarter = PARTITION_PATTERN.match(quarter_dir)
+                if not match_quarter or not match_quarter.group(2):
+                    continue
+                if quarter is not None and int(match_quarter.group(2)) != int(quarter):
+                    continue
+                found.append((int(match.group(1)), int(match_quarter.group(2)), os.path.join(year_path, quarter_dir)))
+        return found
+
+    def part_files(self, year: int = None, quarter: int = None) -> list:
+        return [
+            os.path.join(path, name)
+            for _, _, path in self.partitions(year, quarter)
+            for name in sorted(os.listdir(path))
+            if name.endswith('.jsonl')
+        ]
+
+    def append(self, records: list) -> int:
+        # Writes the records not yet in their partition, returns how many were appended
+        by_partition = {}
+        for record in records:
+            by_partition.setdefault((record['year'], record['quarter']), []).append(record)
+
+        appended = 0
+        run_id = f'{datetime.now(timezone.utc).strftime("%Y%m%dT%H%M%S")}-{uuid.uuid4().hex[:8]}'
+        with self.lock:
+            for (year, quarter), partition_records in sorted(by_partition.items()):
+                existing = {record_key(record) for record in self.iter_records(year, quarter)}
+                new_records = []
+                for record in partition_records:
+                    if record_key(record) not in existing:
+                        existing.add(record_key(record))
+                        new_records.append(record)
+                if not new_records:
+                    continue
+
+                path = self.partition_path(year, quarter)
+                os.makedirs(path, exist_ok=True)
+                part_path = os.path.join(path, f'part-{run_id}.jsonl')
+                tmp_path = os.path.join(path, f'.part-{run_id}.tmp')
+                with open(tmp_path, 'wb') as f:
+                    f.write(b'\n'.join(encode_record(record) for record in new_records) + b'\n')
+                os.replace(tmp_path, part_path)
+                appended += len(new_records)
+        return appended
+
+    def iter_records(self, year: int = None, quarter: int = None, symbols: list = None):
+        # Streams records of the matching partitions, only decoding lines of the given symbols
+        needles = [symbol_needle(symbol) for symbol in symbols] if symbols else None
+        for part_path in self.part_files(year, quarter):
+            if os.path.getsize(part_path) == 0:
+                continue
+            with open(part_path, 'rb') as f, mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mapped:
+                if needles is None:
+                    for line in iter(mapped.readline, b''):
+                        if line.strip():
+                            yield json.loads(line)
+                    continue
+
+                for needle in needles:
+                    start = mapped.find(needle)
+                    while start != -1:
+                        end = mapped.find(b'\n', start)
+                        end = len(mapped) if end == -1 else end
+                        yield json.loads(mapped[start:end])
+                        start = mapped.find(needle, end)
+
+    def read(self, year: int = None, quarter: int = None, symbols: list = None) -> list:
+        return list(self.iter_records(year, quarter, symbols))
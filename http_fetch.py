@@ -0,0 +1,218 @@
+
+import contextvars
+import re
+import time
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from html.parser import HTMLParser
+from urllib.parse import urljoin
+
+import certifi
+import requests
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+
+from run_metrics import current_metrics
+
+
+VOID_TAGS = {'area', 'base', 'br', 'col', 'embed', 'hr', 'img', 'input', 'link', 'meta', 'param', 'source', 'track', 'wbr'}
+BLOCK_TAGS = {
+    'address', 'article', 'aside', 'blockquote', 'br', 'dd', 'div', 'dl', 'dt', 'fieldset', 'figcaption', 'figure',
+    'footer', 'form', 'h1', 'h2', 'h3', 'h4', 'h5', 'h6', 'header', 'hr', 'li', 'main', 'nav', 'ol', 'p', 'pre',
+    'section', 'table', 'tr', 'ul',
+}
+SKIP_TAGS = {'script', 'style', 'noscript', 'template'}
+
+HEADERS = {
+    'User-Agent': 'Mozilla/5.0 (X11; Linux x86_64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/126.0 Safari/537.36',
+    'Accept': 'text/html,application/xhtml+xml',
+    'Accept-Language': 'en',
+}
+
+
+class ClassTextParser(HTMLParser):
+    # Collects the visible text and first link of every element carrying class_name,
+    # mirroring the line layout WebElement.text gives for the same element
+
+    def __init__(self, class_name: str, preserve_whitespace: bool = False) -> None:
+        super().__init__(convert_charrefs=True)
+        self.class_name = class_name
+        self.preserve_whitespace = preserve_whitespace
+        self.results = []
+        # Tag of the element being collected and how deep it nests in itself. Only that tag is counted,
+        # other tags may be left open (<p>, <li>) as HTML allows
+        self._tag = None
+        self._depth = 0
+        self._skip = 0
+        self._chunks = None
+        self._href = None
+
+    def handle_starttag(self, tag, attrs) -> None:
+        attrs = dict(attrs)
+        if self._chunks is None:
+            if self.class_name in (attrs.get('class') or '').split():
+                self._chunks = []
+                self._href = attrs.get('href') if tag == 'a' else None
+                self._tag = tag
+                self._depth = 1
+                if tag in VOID_TAGS:
+                    self._close()
+            return
+
+        if tag in SKIP_TAGS:
+            self._skip += 1
+        if tag == 'a' and self._href is None:
+            self._href = attrs.get('href')
+        if tag in BLOCK_TAGS:
+            self._chunks.append('\n')
+        if tag == self._tag:
+            self._depth += 1
+
+    def handle_startendtag(self, tag, attrs) -> None:
+        if self._chunks is not None and tag in BLOCK_TAGS:
+            self._chunks.append('\n')
+
+    def handle_endtag(self, tag) -> None:
+        if self._chunks is None or tag in VOID_TAGS:
+            return
+        if tag in SKIP_TAGS and self._skip:
+            self._skip -= 1
+        if tag in BLOCK_TAGS:
+            self._chunks.append('\n')
+
+        if tag == self._tag:
+            self._depth -= 1
+            if self._depth <= 0:
+                self._close()
+
+    def handle_data(self, text) -> None:
+        if self._chunks is None or self._skip:
+            return
+        text = text.replace('\xa0', ' ')
+        if not self.preserve_whitespace:
+            text = re.sub(r'\s+', ' ', text)
+        self._chunks.append(text)
+
+    def _close(self) -> None:
+        self.results.append({'text': self._finish(), 'href': self._href})
+        self._chunks = None
+        self._href = None
+        self._tag = None
+
+    def _finish(self) -> str:
+        lines = ''.join(self._chunks).split('\n')
+        if not self.preserve_whitespace:
+            lines = [line.strip() for line in lines]
+        return '\n'.join(line for line in lines if line.strip()).strip('\n')
+
+
+class NextPageParser(HTMLParser):
+    # Finds the href of the pagination link pointing at the next page of results
+
+    def __init__(self) -> None:
+        super().__init__(convert_charrefs=True)
+        self.href = None
+
+    def handle_starttag(self, tag, attrs) -> None:
+        attrs = dict(attrs)
+        if self.href is not None or tag != 'a' or not attrs.get('href'):
+            return
+        if attrs.get('aria-disabled') == 'true' or 'disabled' in (attrs.get('class') or '').split():
+            return
+        if 'next' in (attrs.get('rel') or '').split() or attrs.get('aria-label') == 'Go to next page':
+            self.href = attrs['href']
+
+
+def find_next_page_url(html: str, url: str):
+    parser = NextPageParser()
+    parser.feed(html)
+    parser.close()
+    return urljoin(url, parser.href) if parser.href else None
+
+
+def parse_class_texts(html: str, class_name: str, preserve_whitespace: bool = False) -> list:
+    parser = ClassTextParser(class_name, preserve_whitespace)
+    parser.feed(html)
+    parser.close()
+    return parser.results
+
+
+class HttpF45Fetcher:
+    # Browser-free fetch of the news list and F45 detail pages over one keep-alive session. Requests are
+    # counted into the run active when they are sent, a warm session outlives the RunMetrics of many polls
+
+    def __init__(self, pool_size: int = 8, timeout: int = 15) -> None:
+        self.pool_size = pool_size
+        self.timeout = timeout
+        self.session = requests.Session()
+        self.session.headers.update(HEADERS)
+        self.session.verify = certifi.where()
+
+        adapter = HTTPAdapter(
+            pool_connections=pool_size,
+            pool_maxsize=pool_size,
+            max_retries=Retry(total=2, backoff_factor=0.5, status_forcelist=(502, 503, 504)),
+        )
+        self.session.mount('http://', adapter)
+        self.session.mount('https://', adapter)
+
+    def close(self) -> None:
+        self.session.close()
+
+    def get_html(self, url: str) -> str:
+        start = time.perf_counter()
+        response = self.session.get(url, timeout=self.timeout)
+        metrics = current_metrics.get()
+        if metrics is not None:
+            metrics.observe('http_get', time.perf_counter() - start)
+            metrics.incr('http_requests')
+            metrics.incr('http_bytes', len(response.content))
+        response.raise_for_status()
+        return response.text
+
+    def get_card_quote_news(self, url: str, class_name: str, max_pages: int = 1, page_class: str = None) -> list:
+        # Returns one {'text', 'url'} per news card, in page order, following up to max_pages pages.
+        # With page_class, a first page without cards must still carry it, otherwise the list did not render
+        cards = []
+        page = 0
+        while url is not None and page < max_pages:
+            html = self.get_html(url)
+            if not page and page_class and not parse_class_texts(html, class_name) and not parse_class_texts(html, page_class):
+                raise ValueError(f'No {page_class} in {url}, the news list did not render')
+            cards.extend(
+                {'text': card['text'], 'url': urljoin(url, card['href']) if card['href'] else None}
+                for card in parse_class_texts(html, class_name)
+            )
+            url = find_next_page_url(html, url)
+            page += 1
+        return cards
+
+    def get_f45_text(self, url: str, class_name: str) -> str:
+        texts = parse_class_texts(self.get_html(url), class_name, preserve_whitespace=True)
+        if not texts:
+            raise ValueError(f'No element with class {class_name} in {url}')
+        return texts[0]['text']
+
+    def iter_f45_texts(self, urls: list, class_name: str):
+        # Yields (index, text, error) in completion order
+        def fetch(index, url):
+            try:
+                return (index, self.get_f45_text(url, class_name), None)
+            except Exception as e:
+                return (index, None, str(e) or e.__class__.__name__)
+
+        with ThreadPoolExecutor(max_workers=self.pool_size) as executor:
+            # Each page in a copy of the caller's context, so it counts into the caller's run
+            futures = [executor.submit(contextvars.copy_context().run, fetch, index, url) for index, url in enumerate(urls)]
+            try:
+                for future in as_completed(futures):
+                    yield future.result()
+            finally:
+                for future in futures:
+                    future.cancel()
+
+    def get_f45_texts(self, urls: list, class_name: str) -> list:
+        # Returns one (text, error) pair per url, in the same order as urls
+        results = [(None, None)] * len(urls)
+        for index, text, error in self.iter_f45_texts(urls, class_name):
+            results[index] = (text, error)
+        return results
@@ -0,0 +1,98 @@
+
+import re
+
+from pymongo import ASCENDING
+
+from f45_parser import parse_f45_text
+from f45_store import LATEST_FIELDS, VERSION_KEY, ensure_latest_indexes, ensure_version_indexes
+
+
+class NewsForm:
+    # One kind of company news: the search keyword, how its detail text becomes fields, and where it is stored.
+    # Records are {'symbol', 'last_update', *card_fields, *parse(text), 'content_hash'}, the newest per symbol
+    # goes to collection and every filing to versions_collection under version_key
+
+    def __init__(self, name: str, keyword: str, parse, fields: tuple, collection: str, versions_collection: str,
+                 version_key: tuple, card_fields: tuple = (), history: bool = False, cache_kind: str = None,
+                 latest_card_only: bool = False) -> None:
+        self.name = name
+        self.keyword = keyword
+        self.parse = parse
+        self.fields = fields
+        self.collection = collection
+        self.versions_collection = versions_collection
+        self.version_key = version_key
+        self.card_fields = card_fields
+        # Only F45 records fit the partitioned earnings history
+        self.history = history
+        # Kind of the detail pages in the page cache, so replay only reads its own form
+        self.cache_kind = cache_kind or collection
+        # Only the newest card of a symbol is worth fetching outside a backfill. True for F45, where an older
+        # card is an earlier filing the newer one supersedes; other news can have several distinct notices
+        # of one symbol on a page
+        self.latest_card_only = latest_card_only
+
+    def ensure_indexes(self, collection, versions) -> None:
+        ensure_latest_indexes(collection)
+        key = [(field, ASCENDING) for field in self.version_key]
+        versions.create_index(key, name='_'.join(f'{field}_1' for field in self.version_key), unique=True)
+        versions.create_index([('last_update', ASCENDING)], name='last_update_1')
+
+
+class F45Form(NewsForm):
+
+    def ensure_indexes(self, collection, versions) -> None:
+        ensure_latest_indexes(collection)
+        ensure_version_indexes(versions)
+
+
+F45_FORM = F45Form(
+    name='F45',
+    keyword='F45',
+    parse=parse_f45_text,
+    fields=LATEST_FIELDS,
+    collection='f45',
+    versions_collection='f45_versions',
+    version_key=VERSION_KEY,
+    history=True,
+    latest_card_only=True,
+)
+
+FORMS = {F45_FORM.name: F45_FORM}
+
+
+class FormCollections:
+    # Stands in for MongoDBManager when several forms share one client, only the collection differs
+
+    def __init__(self, client, database: str, collection: str) -> None:
+        self.client = client
+        self.db = client[database]
+        self.collection = self.db[collection]
+
+
+def parse_raw_text(text: str) -> dict:
+    return {'text': text}
+
+
+def raw_text_form(keyword: str) -> NewsForm:
+    # Any other kind of news, kept as its headline and detail text until it gets a parser of its own
+    name = re.sub(r'[^A-Za-z0-9]+', '_', keyword).strip('_').lower()
+    return NewsForm(
+        name=keyword,
+        keyword=keyword,
+        parse=parse_raw_text,
+        fields=('symbol', 'last_update', 'headline', 'text', 'content_hash'),
+        collection=f'news_{name}',
+        versions_collection=f'news_{name}_versions',
+        version_key=('symbol', 'last_update', 'headline'),
+        card_fields=('headline',),
+    )
+
+
+def register_form(form: NewsForm) -> NewsForm:
+    FORMS[form.name] = form
+    return form
+
+
+def get_form(name: str) -> NewsForm:
+    return FORMS.get(name) or raw_text_form(name)
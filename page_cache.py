@@ -0,0 +1,159 @@
+
+import hashlib
+import json
+import os
+import threading
+import time
+from contextlib import contextmanager
+
+try:
+    import fcntl
+except ImportError:
+    fcntl = None
+
+
+DEFAULT_CACHE_DIR = os.path.abspath(os.path.join(os.path.dirname(__file__), './report/cache'))
+DEFAULT_CACHE_MAX_BYTES = 512 * 1024 * 1024
+
+
+def content_hash(content: str) -> str:
+    return hashlib.sha256(content.encode('utf-8')).hexdigest()
+
+
+def f45_cache_key(f45: dict) -> str:
+    # Identity of one announcement, an '(Update)' is a different card with its own time
+    return f'f45|{f45["symbol"]}|{f45["iso_date"]}|{f45.get("headline", "")}'
+
+
+@contextmanager
+def index_lock(root: str):
+    # Exclusive lock across processes sharing the cache directory, where flock exists
+    if fcntl is None:
+        yield
+        return
+    with open(os.path.join(root, 'index.lock'), 'a') as f:
+        fcntl.flock(f, fcntl.LOCK_EX)
+        try:
+            yield
+        finally:
+            fcntl.flock(f, fcntl.LOCK_UN)
+
+
+class PageCache:
+    # Raw list and detail page content on disk, stored once per content hash and
+    # looked up by announcement identity, evicting least recently used content past max_bytes.
+    # Several processes can share one directory (queue workers, a scrape next to a backfill), save merges
+    # the entries this one added into the index on disk instead of overwriting it
+
+    def __init__(self, root: str = DEFAULT_CACHE_DIR, max_bytes: int = DEFAULT_CACHE_MAX_BYTES) -> None:
+        self.root = root
+        self.max_bytes = max_bytes
+        self.index_path = os.path.join(root, 'index.json')
+        self.lock = threading.RLock()
+        # Keys put since the last save
+        self.changed = set()
+        self.entries, self.objects = self.read_index()
+
+    def read_index(self) -> tuple:
+        if not os.path.exists(self.index_path):
+            return {}, {}
+        with open(self.index_path) as f:
+            index = json.load(f)
+        return index.get('entries', {}), index.get('objects', {})
+
+    def object_path(self, digest: str) -> str:
+        return os.path.join(self.root, 'objects', digest[:2], digest)
+
+    def put(self, key: str, content: str, kind: str, meta: dict = None) -> str:
+        digest = content_hash(content)
+        with self.lock:
+            path = self.object_path(digest)
+            # Another process sharing the directory may have evicted it since the index was read
+            if digest not in self.objects or not os.path.exists(path):
+                os.makedirs(os.path.dirname(path), exist_ok=True)
+                with open(path, 'w', encoding='utf-8') as f:
+                    f.write(content)
+                self.objects[digest] = {'size': os.path.getsize(path)}
+            self.objects[digest]['used_at'] = time.time()
+            self.entries[key] = {'hash': digest, 'kind': kind, 'meta': meta or {}}
+            self.changed.add(key)
+        return digest
+
+    def get(self, key: str):
+        with self.lock:
+            entry = self.entries.get(key)
+            if entry is None or entry['hash'] not in self.objects:
+                return None
+            self.objects[entry['hash']]['used_at'] = time.time()
+        try:
+            with open(self.object_path(entry['hash']), encoding='utf-8') as f:
+                return f.read()
+        except FileNotFoundError:
+            # Evicted by another process sharing the directory
+            return None
+
+    def keys(self, kind: str = None) -> list:
+        with self.lock:
+            return [key for key, entry in self.entries.items() if kind is None or entry['kind'] == kind]
+
+    def meta(self, key: str) -> dict:
+        return self.entries[key]['meta']
+
+    def size(self) -> int:
+        return sum(obj['size'] for obj in self.objects.values())
+
+    def evict(self) -> int:
+        # Drop unreferenced content first, then least recently used, until under max_bytes
+        with self.lock:
+            referenced = {entry['hash'] for entry in self.entries.values()}
+            order = sorted(self.objects, key=lambda digest: (digest in referenced, self.objects[digest].get('used_at', 0)))
+            total = self.size()
+            removed = set()
+            for digest in order:
+                if total <= self.max_bytes and digest in referenced:
+                    break
+                total -= self.objects[digest]['size']
+                removed.add(digest)
+                try:
+                    os.remove(self.object_path(digest))
+                except FileNotFoundError:
+                    pass
+
+            for digest in removed:
+                del self.objects[digest]
+            self.entries = {key: entry for key, entry in self.entries.items() if entry['hash'] not in removed}
+            return len(removed)
+
+    def merge_index(self) -> None:
+        # The index on disk plus the entries put here since the last save, keeping the latest use of every object
+        entries, objects = self.read_index()
+        for digest, obj in self.objects.items():
+            if digest in objects:
+                objects[digest]['used_at'] = max(objects[digest].get('used_at', 0), obj.get('used_at', 0))
+
+        for key in self.changed:
+            entry = self.entries.get(key)
+            if entry is None:
+                continue
+            digest = entry['hash']
+            if digest not in objects:
+                path = self.object_path(digest)
+                if not os.path.exists(path):
+                    continue
+                objects[digest] = {'size': os.path.getsize(path), 'used_at': self.objects.get(digest, {}).get('used_at', time.time())}
+            entries[key] = entry
+
+        self.entries = entries
+        self.objects = objects
+        self.changed = set()
+
+    def save(self) -> None:
+        with self.lock:
+            os.makedirs(self.root, exist_ok=True)
+            with index_lock(self.root):
+                self.merge_index()
+                self.evict()
+                tmp_path = f'{self.index_path}.tmp'
+                with open(tmp_path, 'w') as f:
+                    json.dump({'entries': self.entries, 'objects': self.objects}, f)
+                os.replace(tmp_path, self.index_path)
@@ -0,0 +1,238 @@
+
+import cProfile
+import contextvars
+import io
+import json
+import os
+import pstats
+import re
+import threading
+import time
+import tracemalloc
+from contextlib import contextmanager
+from datetime import datetime
+from functools import wraps
+
+from pymongo import monitoring
+
+
+RECORD_KEYS = ('f45_cleaned_data', 'f45_to_update', 'f45s')
+
+
+def count_records(data: dict) -> int:
+    # Size of the list the pipeline has got furthest with
+    for key in RECORD_KEYS:
+        if isinstance(data.get(key), list):
+            return len(data[key])
+    return 0
+
+
+# RunMetrics of the run the current thread or task belongs to. Command events fire in the thread that sent
+# the command, so runs side by side (backfill windows) each count their own. asyncio tasks and to_thread
+# copy it, plain threads start without one
+current_metrics = contextvars.ContextVar('current_metrics', default=None)
+
+# cProfile and tracemalloc are process wide, only one run at a time can profile
+profiling = threading.Lock()
+
+
+class DbCommandCounter(monitoring.CommandListener):
+    # Counts Mongo round trips of every client into the RunMetrics of the run that sent them
+
+    def started(self, event) -> None:
+        metrics = current_metrics.get()
+        if metrics is not None:
+            metrics.incr('db_round_trips')
+            metrics.incr(f'db_{event.command_name}')
+
+    def succeeded(self, event) -> None:
+        pass
+
+    def failed(self, event) -> None:
+        pass
+
+
+db_command_counter = DbCommandCounter()
+monitoring.register(db_command_counter)
+
+
+def count_webdriver_calls(webdriver):
+    # Every WebDriver command, including element.text, goes through command_executor.execute. Counted into
+    # the run active when the command is sent, a warm driver outlives the RunMetrics of many polls
+    execute = webdriver.command_executor.execute
+
+    def counted_execute(command, params=None):
+        metrics = current_metrics.get()
+        if metrics is not None:
+            metrics.incr('webdriver_calls')
+        return execute(command, params)
+
+    webdriver.command_executor.execute = counted_execute
+    return webdriver
+
+
+class RunMetrics:
+    # Stage timings, per-record step timings and counters of one pipeline run
+
+    def __init__(self, profile: bool = False) -> None:
+        self.profile = profile
+        self.lock = threading.Lock()
+        self.started_at = None
+        self.finished_at = None
+        self.status = None
+        self.stages = []
+        self.steps = {}
+        self.counters = {}
+        self.marks = {}
+        self.profiler = None
+        self.memory = None
+        self.token = None
+
+    def start(self) -> None:
+        self.started_at = time.time()
+        self._start = time.perf_counter()
+        self.token = current_metrics.set(self)
+        # The profile only covers the thread that started the run, stages run in other threads show up as waits
+        if self.profile and profiling.acquire(blocking=False):
+            tracemalloc.start()
+            self.profiler = cProfile.Profile()
+            self.profiler.enable()
+
+    def finish(self, result) -> None:
+        self.finished_at = time.time()
+        self.seconds = time.perf_counter() - self._start
+        self.status = 'ok' if result.is_right() else result.monoid[0]
+        if self.token is not None:
+            try:
+                current_metrics.reset(self.token)
+            except ValueError:
+                # Finished from another context than the one it started in
+                current_metrics.set(None)
+            self.token = None
+
+        if self.profiler is not None:
+            self.profiler.disable()
+            snapshot = tracemalloc.take_snapshot()
+            current, peak = tracemalloc.get_traced_memory()
+            tracemalloc.stop()
+            self.memory = {
+                'current_bytes': current,
+                'peak_bytes': peak,
+                'top_lines': [
+                    {'line': str(stat.traceback[0]), 'bytes': stat.size, 'count': stat.count}
+                    for stat in snapshot.statistics('lineno')[:15]
+                ],
+            }
+            profiling.release()
+
+    def incr(self, name: str, value: int = 1) -> None:
+        with self.lock:
+            self.counters[name] = self.counters.get(name, 0) + value
+
+    def update_counters(self, values: dict) -> None:
+        with self.lock:
+            self.counters.update(values)
+
+    def observe(self, name: str, seconds: float) -> None:
+        with self.lock:
+            step = self.steps.setdefault(name, {'count': 0, 'seconds': 0.0, 'max_seconds': 0.0})
+            step['count'] += 1
+            step['seconds'] += seconds
+            step['max_seconds'] = max(step['max_seconds'], seconds)
+
+    def mark(self, name: str) -> None:
+        # Seconds from the start of the run to the first time name happened
+        with self.lock:
+            if name not in self.marks and self.started_at is not None:
+                self.marks[name] = time.perf_counter() - self._start
+
+    @contextmanager
+    def timer(self, name: str):
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(name, time.perf_counter() - start)
+
+    def stage(self, func):
+        # Wraps a data -> Either stage so its time and record counts land in the report
+        @wraps(func)
+        def timed_stage(data: dict):
+            records_in = count_records(data)
+            start = time.perf_counter()
+            result = func(data)
+            self.add_stage(func.__name__, start, records_in, data, result)
+            return result
+        return timed_stage
+
+    def async_stage(self, func):
+        # stage() for the coroutine stages of AsyncScrapeSetF45
+        @wraps(func)
+        async def timed_stage(data: dict):
+            records_in = count_records(data)
+            start = time.perf_counter()
+            result = await func(data)
+            self.add_stage(func.__name__, start, records_in, data, result)
+            return result
+        return timed_stage
+
+    def add_stage(self, name: str, start: float, records_in: int, data: dict, result) -> None:
+        self.stages.append({
+            'stage': name,
+            'seconds': time.perf_counter() - start,
+            'records_in': records_in,
+            'records_out': count_records(data),
+            'ok': result.is_right(),
+        })
+
+    def report(self) -> dict:
+        report = {
+            'started_at': datetime.fromtimestamp(self.started_at).isoformat() if self.started_at else None,
+            'seconds': getattr(self, 'seconds', None),
+            'status': self.status,
+            'stages': self.stages,
+            'steps': self.steps,
+            'counters': self.counters,
+            'marks': self.marks,
+        }
+        if self.profiler is not None:
+            stream = io.StringIO()
+            pstats.Stats(self.profiler, stream=stream).sort_stats('cumulative').print_stats(30)
+            report['profile'] = stream.getvalue()
+            report['memory'] = self.memory
+        return report
+
+    def to_prometheus(self) -> str:
+        def name(value: str) -> str:
+            return re.sub(r'[^a-zA-Z0-9_]', '_', value)
+
+        lines = [
+            '# TYPE f45_run_seconds gauge',
+            f'f45_run_seconds {getattr(self, "seconds", 0.0)}',
+            '# TYPE f45_run_ok gauge',
+            f'f45_run_ok {1 if self.status == "ok" else 0}',
+            '# TYPE f45_stage_seconds gauge',
+        ]
+        lines += [f'f45_stage_seconds{{stage="{stage["stage"]}"}} {stage["seconds"]}' for stage in self.stages]
+        lines.append('# TYPE f45_stage_records_in gauge')
+        lines += [f'f45_stage_records_in{{stage="{stage["stage"]}"}} {stage["records_in"]}' for stage in self.stages]
+        lines.append('# TYPE f45_stage_records_out gauge')
+        lines += [f'f45_stage_records_out{{stage="{stage["stage"]}"}} {stage["records_out"]}' for stage in self.stages]
+        lines.append('# TYPE f45_step_seconds summary')
+        for step, values in self.steps.items():
+            lines.append(f'f45_step_seconds_sum{{step="{step}"}} {values["seconds"]}')
+            lines.append(f'f45_step_seconds_count{{step="{step}"}} {values["count"]}')
+        lines.append('# TYPE f45_mark_seconds gauge')
+        lines += [f'f45_mark_seconds{{mark="{mark}"}} {seconds}' for mark, seconds in self.marks.items()]
+        for counter, value in self.counters.items():
+            lines.append(f'# TYPE f45_{name(counter)}_total counter')
+            lines.append(f'f45_{name(counter)}_total {value}')
+        return '\n'.join(lines) + '\n'
+
+    def write(self, path: str, report_format: str = 'json') -> None:
+        os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        with open(path, 'w') as f:
+            if report_format == 'prometheus':
+                f.write(self.to_prometheus())
+            else:
+                json.dump(self.report(), f, ensure_ascii=False, indent=4)
@@ -2,33 +2,99 @@
 import json
 import time
 from datetime import datetime
-from pymonad.tools import curry
 from pymonad.either import Left, Right
 import sys
-import certifi
 import os
 import re
-from io import StringIO
-import pandas as pd
-
-from selenium.webdriver.common.by import By
-from selenium.webdriver.support.ui import WebDriverWait
-from selenium.webdriver.support import expected_conditions as EC
+from urllib.parse import quote_plus
 
+# Selenium, requests and the mongo.mongo / sel.sel siblings are imported where they are used,
+# so replaying or exporting never loads a browser client. cli.py keeps the entry point just as light
 sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '../')))
-from sel.sel import RemoteWebDriver
-from mongo.mongo import MongoDBManager
+from detail_pool import DetailPagePool
+from f45_store import find_latest, bulk_upsert_latest, bulk_touch_latest, bulk_upsert_versions, find_version_dates
+from run_metrics import RunMetrics, count_webdriver_calls
+from page_cache import PageCache, content_hash, f45_cache_key
+from history_store import HistoryStore
+from detail_pool import open_remote_web_driver
+from dead_letter import DeadLetterQueue, dead_letter_key
+from task_queue import TASKS_COLLECTION, F45TaskQueue
+from browser_profile import FAST_WINDOW_SIZE, open_fast_web_driver, timed_wait, class_text_present, app_ready_and_clickable
+from news_forms import F45_FORM, FormCollections, NewsForm
+
+# Text and detail link of every news card in one WebDriver round trip, with blank lines
+# dropped the way WebElement.text drops them
+CARD_QUOTE_NEWS_SCRIPT = '''
+return Array.from(document.getElementsByClassName(arguments[0])).map(function (card) {
+    var link = card.tagName === 'A' ? card : card.querySelector('a[href]');
+    var lines = card.innerText.split('\\n').map(function (line) { return line.trim(); });
+    return {text: lines.filter(function (line) { return line.length > 0; }).join('\\n'), url: link ? link.href : null};
+});
+'''
+
+DEFAULT_EXPORT_PATH = os.path.abspath(os.path.join(os.path.dirname(__file__), './report/f45_data.json'))
+
+
+def connect_mongo_manager(database: str, collection: str):
+    from mongo.mongo import MongoDBManager
+    return MongoDBManager(database, collection)
 
 class ScrapeSetF45:
     
-    def __init__(self) -> None:
-        pass
+    def __init__(self, detail_workers: int = 1, backend: str = 'selenium', max_pages: int = 1,
+                 report_path: str = None, report_format: str = 'json', profile: bool = False,
+                 stream: bool = False, stream_batch_size: int = 1, cache: PageCache = None,
+                 history: HistoryStore = None, base_url: str = 'https://www.set.or.th',
+                 mongo_factory=connect_mongo_manager, dead_letters: DeadLetterQueue = None, database: str = 'stockThai',
+                 browser_profile: str = 'default', form: NewsForm = F45_FORM) -> None:
+        # Number of WebDriver sessions used to fetch F45 detail pages in parallel
+        self.detail_workers = detail_workers
+        # 'http' fetches pages without a browser and falls back to 'selenium' when the list is unavailable
+        self.backend = backend
+        # Number of result pages of news cards to read
+        self.max_pages = max_pages
+        # Where main() writes its run report ('json' or 'prometheus'), profile adds cProfile and tracemalloc
+        self.report_path = report_path
+        self.report_format = report_format
+        self.profile = profile
+        self.metrics = RunMetrics(profile)
+        # Stream each announcement from fetch to DB, upserting every stream_batch_size records
+        self.stream = stream
+        self.stream_batch_size = max(1, stream_batch_size)
+        # Raw list and detail pages are kept here so they can be re-parsed without a browser
+        self.cache = cache
+        # Every run appends its new records to the partitioned history
+        self.history = history if history is not None else HistoryStore()
+        # Site and Mongo client to use, the benchmarks swap in a local stand-in for both
+        self.base_url = base_url.rstrip('/')
+        self.mongo_factory = mongo_factory
+        self.database = database
+        # 'fast' is a small headless eager-loading browser without images or fonts, waiting only on explicit conditions
+        self.browser_profile = browser_profile
+        # Announcements that fail a stage are set aside here and the rest of the run carries on
+        self.dead_letters = dead_letters
+        # Kind of news to search for, parse and store, F45 unless ScrapeSetNews runs several
+        self.form = form
+    
+    def dead_letter(self, data: dict, stage: str, f45: dict, error: str, text: str = None) -> None:
+        print(f'> {stage} failed for {f45.get("symbol") or f45.get("card_text")}: {error}')
+        if self.form is not F45_FORM:
+            f45 = dict(f45, form=self.form.name)
+        self.metrics.incr('records_failed')
+        self.metrics.incr(f'failed_{stage}')
+        data.setdefault('failed', []).append(dead_letter_key(f45))
+        data.setdefault('errors', {})[dead_letter_key(f45)] = f'{stage}: {error}'
+        if self.dead_letters is not None:
+            self.dead_letters.add(stage, f45, error, text)
     
     def set_url(self, data: dict)->[Left, Right]:    # type: ignore
         try:
-            print('Setting F45 URL')
-            data['url'] = 'https://www.set.or.th/en/market/news-and-alert/news?source=company&securityType=S&keyword=F45'
-            # data['url'] = 'https://www.set.or.th/en/market/news-and-alert/news?source=company&securityType=S&keyword=F45&fromDate=2024-07-01&toDate=2024-08-05'
+            print(f'Setting {self.form.name} URL')
+            data['url'] = f'{self.base_url}/en/market/news-and-alert/news?source=company&securityType=S&keyword={quote_plus(self.form.keyword)}'
+            
+            # Restrict the search to a date range, e.g. fromDate=2024-07-01&toDate=2024-08-05
+            if data.get('from_date') and data.get('to_date'):
+                data['url'] += f'&fromDate={data["from_date"]}&toDate={data["to_date"]}'
             return Right(data)
         
         except Exception as e:
@@ -40,6 +106,7 @@ class ScrapeSetF45:
             data['xpath'] = {
                 'headline_input_box' : '/html/body/div[1]/div/div/div[2]/div[2]/div[2]/div/div/div[1]/div[1]/div/div[3]/input',
                 'search_button' : '//button[text()="         Search       "]',
+                'next_page' : '//*[@aria-label="Go to next page"]',
             }
             return Right(data)
         
@@ -63,20 +130,31 @@ class ScrapeSetF45:
     def open_web_browser(self, data:dict)->[Left, Right]: # type: ignore
         try:
             print('Opening Web Browser')
-            webdriver = RemoteWebDriver()
-            webdriver.InitializeWebDriver()
-            
-            data['webdriver'] = webdriver.driver
+            # Another form of the same run may have opened it already
+            if data.get('webdriver') is None:
+                data['webdriver'] = self.new_web_driver()
             
             return Right(data)
         
         except Exception as e:
             return Left(f'Error in opening Web Browser: {str(e)}')
         
+    def new_web_driver(self):
+        if self.browser_profile == 'fast':
+            return count_webdriver_calls(open_fast_web_driver())
+        return count_webdriver_calls(open_remote_web_driver())
+    
+    def wait(self, webdriver, name: str, condition, timeout: float = 10):
+        return timed_wait(webdriver, condition, timeout, self.metrics, f'wait_{name}')
+    
     def maximize_window(self, data: dict)->[Left, Right]:    # type: ignore
         try:
             print('Maximizing Window')
             webdriver = data['webdriver']
+            if self.browser_profile == 'fast':
+                webdriver.set_window_size(*FAST_WINDOW_SIZE)
+                return Right(data)
+            
             webdriver.maximize_window()
             webdriver.set_window_size(1450, 3000)
             return Right(data)
@@ -90,7 +168,8 @@ class ScrapeSetF45:
             webdriver = data['webdriver']   
             url = data['url']
             print(f'> Going to {data["url"]}')
-            webdriver.implicitly_wait(5)
+            # Every lookup below has its own explicit wait, an implicit one only slows down the misses
+            webdriver.implicitly_wait(0 if self.browser_profile == 'fast' else 5)
             webdriver.get(url)
             return Right(data)
         
@@ -101,11 +180,13 @@ class ScrapeSetF45:
         try:
             print('Filling Headline Input Box')
             webdriver = data['webdriver']
-            key_to_send = 'F45'
+            from selenium.webdriver.common.by import By
+            from selenium.webdriver.support import expected_conditions as EC
+            key_to_send = self.form.keyword
             
             xpath_headline_input_box = data['xpath']['headline_input_box']
             
-            headline_input_box_element = WebDriverWait(webdriver, 10).until(
+            headline_input_box_element = self.wait(webdriver, 'headline_input_box',
                 EC.presence_of_element_located((By.XPATH, xpath_headline_input_box))
             )
             
@@ -119,12 +200,18 @@ class ScrapeSetF45:
         try:
             print('Clicking Search Button')
             webdriver = data['webdriver']
+            from selenium.webdriver.common.by import By
+            from selenium.webdriver.support import expected_conditions as EC
             css_search_button = '.btn.fs-24px.px-4.btn-primary'
             
-            search_button_element = WebDriverWait(webdriver, 10).until(
-                EC.presence_of_element_located((By.CSS_SELECTOR, css_search_button)))
-            
-            time.sleep(3)
+            if self.browser_profile == 'fast':
+                search_button_element = self.wait(webdriver, 'search_button', app_ready_and_clickable(css_search_button))
+            else:
+                search_button_element = self.wait(webdriver, 'search_button',
+                    EC.presence_of_element_located((By.CSS_SELECTOR, css_search_button)))
+                
+                with self.metrics.timer('sleep_search_button'):
+                    time.sleep(3)
             search_button_element.click()
             return Right(data)
 
@@ -134,23 +221,55 @@ class ScrapeSetF45:
     def get_card_quote_news_elements(self, data: dict)->[Left, Right]:    # type: ignore
         try:
             print('Getting Card Quote News Element')
+            from selenium.common.exceptions import TimeoutException
+            from selenium.webdriver.common.by import By
+            from selenium.webdriver.support import expected_conditions as EC
             webdriver = data['webdriver']
             data['elements'] = {}
             class_name_card_quote_news = data['class_name']['card_quote_news']
             
-            WebDriverWait(webdriver, 10).until(
-                EC.presence_of_element_located((By.CLASS_NAME, class_name_card_quote_news))
-            )
+            try:
+                self.wait(webdriver, 'card_quote_news',
+                    EC.presence_of_element_located((By.CLASS_NAME, class_name_card_quote_news))
+                )
+            except TimeoutException:
+                if not self.is_empty_news_list(data, bool(webdriver.find_elements(By.CLASS_NAME, data['class_name']['search_button']))):
+                    raise
+                print('> No Card Quote News in the date range')
             
-            card_quote_news_elements = webdriver.find_elements(By.CLASS_NAME, class_name_card_quote_news)
-            
-            data['elements']['card_quote_news'] = card_quote_news_elements
+            data['elements']['card_quote_news'] = self.read_card_quote_news(webdriver, class_name_card_quote_news)
             
             return Right(data)
         
         except Exception as e:
             return Left(f'Error in getting Card Quote News Element: {str(e)}')
 
+    def is_empty_news_list(self, data: dict, rendered: bool) -> bool:
+        # A date range can hold no announcement at all (holidays, a short last backfill window), which is a
+        # result as long as the list page itself rendered. Without a range the list is never empty
+        return rendered and bool(data.get('from_date') and data.get('to_date'))
+
+    def read_card_quote_news(self, webdriver, class_name: str) -> list:
+        # [{'text', 'url'}] for every card on the page
+        return webdriver.execute_script(CARD_QUOTE_NEWS_SCRIPT, class_name)
+
+    def parse_card_text(self, text: str) -> dict:
+        # Split the string by newline characters
+        parts:str = text.split('\n')
+        f45 = {}
+        f45['date'] = parts[0]
+        f45['time'] = parts[1]
+        f45['symbol'] = parts[2]
+        
+        i:int = 0 
+        if not re.match(r'^[A-Za-z0-9]+$', parts[3][0]):
+            i = 1
+        
+        f45['source'] = parts[3+i]    
+        f45['headline'] = parts[4 + i]
+        f45['card_text'] = text
+        return f45
+
     def extract_quote_news_elements(self, data: dict)->[Left, Right]:    # type: ignore
         try:
             print('Extracting Quote News Elements')
@@ -159,24 +278,16 @@ class ScrapeSetF45:
             
             
             for element in elements:
-                # Split the string by newline characters
-                parts:str = element.text.split('\n')
-                f45 = {}
-                f45['date'] = parts[0]
-                f45['time'] = parts[1]
-                f45['symbol'] = parts[2]
+                try:
+                    f45 = self.parse_card_text(element['text'])
+                except Exception as e:
+                    self.dead_letter(data, 'extract_quote_news_elements', {'card_text': element['text'], 'url': element['url']}, f'Unexpected card layout: {str(e)}')
+                    continue
                 
                 print(f'> Extracting Quote News Elements for {f45["symbol"]}')
                 
-                i:int = 0 
-                if not re.match(r'^[A-Za-z0-9]+$', parts[3][0]):
-                    i = 1
-                
-                f45['source'] = parts[3+i]    
-                f45['headline'] = parts[4 + i]
-                
-                # Add the element to the list of extracted elements
-                f45['element'] = element
+                # Detail pages are opened by URL, so no live element handle is kept
+                f45['url'] = element['url']
                 
                 # print(f'Date: {f45["date"]} , Time: {f45["time"]} , Symbol: {f45["symbol"]} , Source:{f45["source"]} , Headline: {f45["headline"]}')
                 data['f45s'].append(f45)
@@ -186,6 +297,117 @@ class ScrapeSetF45:
         except Exception as e:
             return Left(f'Error in extracting Quote News Elements: {str(e)}')
     
+    def is_next_page_enabled(self, button) -> bool:
+        from selenium.webdriver.common.by import By
+        if button.get_attribute('disabled') or button.get_attribute('aria-disabled') == 'true':
+            return False
+        parent_class = button.find_element(By.XPATH, '..').get_attribute('class') or ''
+        return 'disabled' not in parent_class.split()
+    
+    def is_first_card_changed(self, webdriver, class_name: str, first_text: str) -> bool:
+        cards = self.read_card_quote_news(webdriver, class_name)
+        return bool(cards) and cards[0]['text'] != first_text
+    
+    def get_next_card_quote_news_pages(self, data: dict)->[Left, Right]:    # type: ignore
+        try:
+            print('Getting Next Card Quote News Pages')
+            from selenium.webdriver.common.by import By
+            webdriver = data['webdriver']
+            xpath_next_page = data['xpath']['next_page']
+            class_name_card_quote_news = data['class_name']['card_quote_news']
+            f45s = data['f45s']
+            page = 1
+            
+            while page < self.max_pages and data['elements']['card_quote_news']:
+                buttons = webdriver.find_elements(By.XPATH, xpath_next_page)
+                if not buttons or not self.is_next_page_enabled(buttons[0]):
+                    break
+                
+                first_text = data['elements']['card_quote_news'][0]['text']
+                buttons[0].click()
+                self.wait(webdriver, 'next_page',
+                    lambda driver: self.is_first_card_changed(driver, class_name_card_quote_news, first_text)
+                )
+                page += 1
+                print(f'> Reading Card Quote News page {page}')
+                
+                result = (
+                    self.get_card_quote_news_elements(data)
+                    .then (self.extract_quote_news_elements)
+                )
+                if result.is_left():
+                    return result
+                f45s.extend(data['f45s'])
+            
+            data['f45s'] = f45s
+            return Right(data)
+        
+        except Exception as e:
+            return Left(f'Error in getting Next Card Quote News Pages: {str(e)}')
+    
+    def open_http_session(self, data: dict)->[Left, Right]:    # type: ignore
+        try:
+            print('Opening HTTP Session')
+            if data.get('http') is not None:
+                return Right(data)
+            from http_fetch import HttpF45Fetcher
+            data['http'] = HttpF45Fetcher(pool_size=max(self.detail_workers, 4))
+            return Right(data)
+        
+        except Exception as e:
+            return Left(f'Error in opening HTTP Session: {str(e)}')
+    
+    def http_get_card_quote_news(self, data: dict)->[Left, Right]:    # type: ignore
+        try:
+            print('Getting Card Quote News over HTTP')
+            http = data['http']
+            class_name_card_quote_news = data['class_name']['card_quote_news']
+            data['f45s'] = []
+            
+            # The search box is on every rendered list page, with or without cards, get_card_quote_news
+            # raises when a page without cards lacks it too
+            cards = http.get_card_quote_news(data['url'], class_name_card_quote_news, self.max_pages, data['class_name']['search_button'])
+            if not cards and not self.is_empty_news_list(data, True):
+                return Left(f'No {class_name_card_quote_news} found in {data["url"]}')
+            if not cards:
+                print('> No Card Quote News in the date range')
+            
+            for card in cards:
+                try:
+                    f45 = self.parse_card_text(card['text'])
+                except Exception as e:
+                    self.dead_letter(data, 'extract_quote_news_elements', {'card_text': card['text'], 'url': card['url']}, f'Unexpected card layout: {str(e)}')
+                    continue
+                print(f'> Extracting Quote News Elements for {f45["symbol"]}')
+                f45['url'] = card['url']
+                data['f45s'].append(f45)
+            
+            return Right(data)
+        
+        except Exception as e:
+            return Left(f'Error in getting Card Quote News over HTTP: {str(e)}')
+    
+    def convert_f45_date_time(self, f45: dict) -> str:
+        date = f45['date']
+        time = f45['time']
+        
+        # Check if the date is 'Today' and replace it with the current date
+        if 'Today' in date:
+            date = datetime.now().strftime("%d %b %Y")
+            
+        # Define the format of the input date and time strings
+        date_format = "%d %b %Y"
+        time_format = "%H:%M"
+        
+        # Parse the date and time strings into datetime objects
+        parsed_date = datetime.strptime(date, date_format)
+        parsed_time = datetime.strptime(time, time_format).time()
+        
+        # Combine the date and time into a single datetime object
+        combined_datetime = datetime.combine(parsed_date, parsed_time)
+        
+        return combined_datetime.isoformat()
+    
     def covert_date_time(self, data:dict)->[Left, Right]:    # type: ignore
         try:
             print('Converting Date Time')
@@ -194,27 +416,11 @@ class ScrapeSetF45:
             
             for f45 in f45s:
                 print(f'> Converting Date Time for {f45["symbol"]}')
-                
-                date = f45['date']
-                time = f45['time']
-                
-                # Check if the date is 'Today' and replace it with the current date
-                if 'Today' in date:
-                    date = datetime.now().strftime("%d %b %Y")
-                    
-                # Define the format of the input date and time strings
-                date_format = "%d %b %Y"
-                time_format = "%H:%M"
-                
-                # Parse the date and time strings into datetime objects
-                parsed_date = datetime.strptime(date, date_format)
-                parsed_time = datetime.strptime(time, time_format).time()
-                
-                # Combine the date and time into a single datetime object
-                combined_datetime = datetime.combine(parsed_date, parsed_time)
-                
-                f45['iso_date'] = combined_datetime.isoformat()
-                
+                try:
+                    f45['iso_date'] = self.convert_f45_date_time(f45)
+                except Exception as e:
+                    self.dead_letter(data, 'covert_date_time', f45, str(e))
+                    continue
                 data['f45s'].append(f45)
             
             return Right(data)
@@ -225,10 +431,16 @@ class ScrapeSetF45:
     def connect_mongo_db(self, data: dict)->[Left, Right]:    # type: ignore
         try:
             print('Connecting to MongoDB')
-            f45s = data['f45s']
-            mongo = MongoDBManager('stockThai','f45')
+            if data.get('mongo_client') is not None:
+                mongo = FormCollections(data['mongo_client'], self.database, self.form.collection)
+            else:
+                mongo = self.mongo_factory(self.database, self.form.collection)
             data['mongo'] = mongo
             
+            # Every quarter and amendment goes to the versions collection, over the same client
+            data['versions'] = mongo.client[self.database][self.form.versions_collection]
+            self.form.ensure_indexes(mongo.collection, data['versions'])
+            
             return Right(data)
 
         except Exception as e:
@@ -244,25 +456,107 @@ class ScrapeSetF45:
             mongo = data['mongo']
             collection = mongo.collection
             
+            # Only the latest F45 of a symbol can end up in the latest collection, a backfill keeps
+            # the rest for the versions collection
+            cards = len(f45s)
+            if self.form.latest_card_only and not data.get('backfill'):
+                f45s = self.latest_card_per_symbol(f45s)
+                self.metrics.incr('fetches_avoided', cards - len(f45s))
+            
+            latest = find_latest(collection, [f45['symbol'] for f45 in f45s])
+            last_updates = {symbol: doc.get('last_update') for symbol, doc in latest.items()}
+            versions_seen = set()
+            if data.get('backfill') and f45s:
+                dates = [f45['iso_date'] for f45 in f45s]
+                versions_seen = find_version_dates(data['versions'], [f45['symbol'] for f45 in f45s], min(dates), max(dates))
+            
             for f45 in f45s:
                 symbol = f45['symbol']
                 print(f'> Comparing Period for {symbol}')
                 
-                iso_date = f45['iso_date']
-                query = {'symbol': symbol}
-                f45_in_db = collection.find_one(query)
+                if symbol not in last_updates or f45['iso_date'] != last_updates[symbol]:
+                    # An F45 older than the stored one is only still missing from the versions collection,
+                    # update_db keeps it from replacing the latest one
+                    if data.get('backfill') and f45['iso_date'] < (last_updates.get(symbol) or ''):
+                        if (symbol, f45['iso_date']) in versions_seen:
+                            continue
 
-                if f45_in_db is None or iso_date != f45_in_db['last_update']:
+                    if latest.get(symbol, {}).get('content_hash'):
+                        f45['stored_hash'] = latest[symbol]['content_hash']
                     f45_to_update.append(f45)
                     # print(f'F45 to Update: {f45}')
             
             data['f45_to_update'] = f45_to_update
+            data['db_report'] = {'unchanged': len(f45s) - len(f45_to_update), 'duplicates': cards - len(f45s)}
             
             return Right(data)
         
         except Exception as e:
             return Left(f'Error in comparing Period: {str(e)}')
     
+    def latest_card_per_symbol(self, f45s: list) -> list:
+        # Newest card of every symbol, in list order; cards are newest first so on equal times the first wins
+        latest = {}
+        for f45 in f45s:
+            current = latest.get(f45['symbol'])
+            if current is None or f45['iso_date'] > current['iso_date']:
+                latest[f45['symbol']] = f45
+        kept = {id(f45) for f45 in latest.values()}
+        return [f45 for f45 in f45s if id(f45) in kept]
+    
+    def is_unchanged_f45(self, f45: dict, text: str) -> bool:
+        f45['content_hash'] = content_hash(text)
+        return f45['content_hash'] == f45.get('stored_hash')
+    
+    def skip_unchanged_f45s(self, data: dict)->[Left, Right]:    # type: ignore
+        try:
+            print('Skipping Unchanged F45s')
+            f45_to_update = data['f45_to_update']
+            data['f45_to_update'] = []
+            data['f45_unchanged'] = []
+            
+            for f45 in f45_to_update:
+                if self.is_unchanged_f45(f45, f45['text']):
+                    print(f'> Same F45 content as stored for {f45["symbol"]}')
+                    data['f45_unchanged'].append(f45)
+                else:
+                    data['f45_to_update'].append(f45)
+            
+            self.metrics.incr('parses_avoided', len(data['f45_unchanged']))
+            self.metrics.incr('writes_avoided', len(data['f45_unchanged']))
+            return Right(data)
+        
+        except Exception as e:
+            return Left(f'Error in skipping Unchanged F45s: {str(e)}')
+    
+    def connect_task_queue(self, data: dict)->[Left, Right]:    # type: ignore
+        try:
+            print('Connecting to Task Queue')
+            data['tasks'] = F45TaskQueue(data['mongo'].client[self.database][TASKS_COLLECTION])
+            data['tasks'].ensure_indexes()
+            return Right(data)
+        
+        except Exception as e:
+            return Left(f'Error in connecting to Task Queue: {str(e)}')
+    
+    def enqueue_f45_tasks(self, data: dict)->[Left, Right]:    # type: ignore
+        try:
+            print('Enqueuing F45 Tasks')
+            queued = data['tasks'].enqueue(data['f45_to_update'])
+            self.metrics.incr('tasks_enqueued', queued)
+            print(f'> Enqueued {queued} new F45 Tasks, {len(data["f45_to_update"]) - queued} already queued')
+            return Right(data)
+        
+        except Exception as e:
+            return Left(f'Error in enqueuing F45 Tasks: {str(e)}')
+    
+    def open_f45_page_by_url(self, webdriver, f45: dict, f45_text_classname: str) -> str:
+        if not f45.get('url'):
+            raise ValueError('No detail link on the news card')
+        
+        webdriver.get(f45['url'])
+        return self.wait(webdriver, 'f45_text', class_text_present(f45_text_classname))
+    
     def open_f45_page_get_text(self, data: dict)->[Left, Right]:    # type: ignore
         try:
             print('Opening F45 Page')
@@ -272,34 +566,145 @@ class ScrapeSetF45:
             f45_to_update = data['f45_to_update']
             data['f45_to_update'] = []
             
+            if data.get('http') is not None:
+                print(f'> Opening {len(f45_to_update)} F45 Pages over HTTP')
+                results = data['http'].get_f45_texts([f45['url'] for f45 in f45_to_update], f45_text_classname)
+                for f45, (text, error) in zip(f45_to_update, results):
+                    f45['text'] = text
+                    if error is not None:
+                        f45['error'] = error
+            
+            elif self.detail_workers <= 1 or not f45_to_update:
+                for f45 in f45_to_update:
+                    print(f'> Opening F45 Page for {f45["symbol"]}')
+                    try:
+                        with self.metrics.timer('fetch_f45_page'):
+                            f45['text'] = self.open_f45_page_by_url(webdriver, f45, f45_text_classname)
+                    except Exception as e:
+                        f45['error'] = str(e) or e.__class__.__name__
+            
+            else:
+                self.open_f45_pages_with_pool(webdriver, f45_to_update, f45_text_classname)
+            
             for f45 in f45_to_update:
-                print(f'> Opening F45 Page for {f45["symbol"]}')
-                element = f45['element']
-                element.click()
-                
-                webdriver.switch_to.window(webdriver.window_handles[1])
-                f45['text'] = WebDriverWait(webdriver, 10).until(
-                    EC.presence_of_element_located((By.CLASS_NAME, f45_text_classname))
-                ).text
-
+                if 'error' in f45:
+                    self.dead_letter(data, 'open_f45_page_get_text', f45, f45.pop('error'))
+                    continue
+                self.metrics.incr('text_bytes', len(f45['text'].encode('utf-8')))
                 data['f45_to_update'].append(f45)
-                webdriver.close()
-                webdriver.switch_to.window(webdriver.window_handles[0])
             
             return Right(data)
         
         except Exception as e:
             return Left(f'Error in opening F45 Page: {str(e)}')
     
-    def split_row_from_text(self, data: dict)->[Left, Right]:    # type: ignore
+    def open_f45_pages_with_pool(self, webdriver, f45_to_update: list, f45_text_classname: str) -> None:
+        print(f'> Opening {len(f45_to_update)} F45 Pages with {self.detail_workers} sessions')
+        with DetailPagePool(self.detail_workers, f45_text_classname, self.new_web_driver, metrics=self.metrics) as pool:
+            results = pool.fetch_all([f45.get('url') for f45 in f45_to_update])
+        
+        for f45, (text, error) in zip(f45_to_update, results):
+            f45['text'] = text
+            if error is not None:
+                f45['error'] = error
+    
+    def iter_f45_texts(self, data: dict):
+        # Yields (f45, text, error) for every announcement as soon as its page has been read
+        webdriver = data['webdriver']
+        f45_text_classname = data['class_name']['f45_text']
+        f45_to_update = data['f45_to_update']
+        
+        if data.get('http') is not None:
+            urls = [f45['url'] for f45 in f45_to_update]
+            for index, text, error in data['http'].iter_f45_texts(urls, f45_text_classname):
+                yield f45_to_update[index], text, error
+            return
+        
+        if self.detail_workers > 1 and f45_to_update:
+            with DetailPagePool(self.detail_workers, f45_text_classname, self.new_web_driver, metrics=self.metrics) as pool:
+                for index, text, error in pool.iter_fetch([f45.get('url') for f45 in f45_to_update]):
+                    yield f45_to_update[index], text, error
+            return
+        
+        for f45 in f45_to_update:
+            print(f'> Opening F45 Page for {f45["symbol"]}')
+            text, error = None, None
+            try:
+                with self.metrics.timer('fetch_f45_page'):
+                    text = self.open_f45_page_by_url(webdriver, f45, f45_text_classname)
+            except Exception as e:
+                error = str(e)
+            yield f45, text, error
+    
+    def stream_f45_to_db(self, data: dict)->[Left, Right]:    # type: ignore
+        # Parse, clean and upsert each announcement as its page arrives instead of stage by stage,
+        # so whatever was read before a failure is already saved
+        pages = None
         try:
-            print('Splitting Row from Text')
-            f45_to_update:list = data['f45_to_update']
-            data['f45_to_update'] = []
+            print('Streaming F45 Pages to DB')
+            collection = data['mongo'].collection
+            db_report = data.setdefault('db_report', {})
+            data['f45_cleaned_data'] = []
+            data['f45_unchanged'] = []
+            batch = []
+            unchanged = []
             
-            for f45 in f45_to_update:
-                print(f'> Splitting Row from Text for {f45["symbol"]}')
+            def flush() -> None:
+                if unchanged:
+                    db_report['touched'] = db_report.get('touched', 0) + bulk_touch_latest(collection, unchanged, newer_only=True)
+                    unchanged.clear()
+                if not batch:
+                    return
+                report = bulk_upsert_latest(collection, batch, newer_only=True, fields=self.form.fields)
+                report.update(bulk_upsert_versions(data['versions'], batch, self.form.version_key, self.form.fields))
+                self.metrics.mark('first_db_write')
+                for key, value in report.items():
+                    db_report[key] = db_report.get(key, 0) + value
+                print(f'> Updated DB for {", ".join(f45["symbol"] for f45 in batch)}')
+                batch.clear()
+            
+            pages = self.iter_f45_texts(data)
+            for f45, text, error in pages:
+                if error is not None:
+                    self.dead_letter(data, 'open_f45_page_get_text', f45, error)
+                    continue
                 
+                print(f'> Parsing F45 for {f45["symbol"]}')
+                self.metrics.incr('text_bytes', len(text.encode('utf-8')))
+                if self.cache is not None:
+                    self.cache_f45_page(f45, text)
+                if self.is_unchanged_f45(f45, text):
+                    print(f'> Same F45 content as stored for {f45["symbol"]}')
+                    self.metrics.incr('parses_avoided')
+                    self.metrics.incr('writes_avoided')
+                    data['f45_unchanged'].append(f45)
+                    unchanged.append(f45)
+                    continue
+                result = self.parse_f45(dict(f45, text=text))
+                if result.is_left():
+                    self.dead_letter(data, 'parse_f45', f45, result.monoid[0], text)
+                    continue
+                
+                batch.append(result.value)
+                data['f45_cleaned_data'].append(result.value)
+                if len(batch) >= self.stream_batch_size:
+                    flush()
+            
+            flush()
+            return Right(data)
+        
+        except Exception as e:
+            return Left(f'Error in streaming F45 Pages to DB: {str(e)}')
+        
+        finally:
+            if pages is not None:
+                pages.close()
+            if self.cache is not None:
+                self.cache.save()
+    
+    def split_row_from_f45(self, f45: dict)->[Left, Right]:    # type: ignore
+        try:
+            with self.metrics.timer('split_row_from_f45'):
                 f45_data = {}
                 row_quarter = None
                 row_year = None
@@ -332,27 +737,19 @@ class ScrapeSetF45:
                 f45_data['net_profit'] = row_net_profit
                 f45_data['eps'] = row_eps
                 
-                data['f45_to_update'].append(f45_data)
-                
-            return Right(data)
+            return Right(f45_data)
         
         except Exception as e:
             return Left(f'Error in splitting Row from Text: {str(e)}')
-        
-    def extract_numbers_from_rows(self, data:dict)->[Left, Right]:    # type: ignore
+    
+    def extract_numbers_from_f45(self, f45: dict)->[Left, Right]:    # type: ignore
         try:
             def convert_spaces(s: str) -> str:
             # Replace sequences of spaces longer than two with double spaces
                 return re.sub(r'\s{3,}', '  ', s)
-    
-            print('Extracting Numbers from Rows')
-            f45_to_update = data['f45_to_update']
-            data['f45_to_update'] = []
             
-            for f45 in f45_to_update:
+            with self.metrics.timer('extract_numbers_from_f45'):
                 f45_data = {}
-                print(f'> Extracting Numbers from Rows for {f45["symbol"]}')
-                
                 f45_data['symbol'] = f45['symbol']
                 f45_data['last_update'] = f45['last_update']
                 
@@ -371,21 +768,14 @@ class ScrapeSetF45:
                 f45_data['net_profit'] = f45_data['net_profit'][1]
                 f45_data['eps'] = f45_data['eps'][1]
                 
-                data['f45_to_update'].append(f45_data)
-            return Right(data)
+            return Right(f45_data)
         
         except Exception as e:
             return Left(f'Error in extracting Numbers from Row: {str(e)}')
-    
-    def clean_f45_data(self, data: dict)->[Left, Right]:    # type: ignore
+        
+    def clean_f45(self, f45: dict)->[Left, Right]:    # type: ignore
         try:
-            print('Cleaning F45 Data')
-            f45_to_update = data['f45_to_update']
-            data['f45_cleaned_data'] = []
-            
-            for f45 in f45_to_update:
-                print(f'> Cleaning F45 Data for {f45["symbol"]}')
-                
+            with self.metrics.timer('clean_f45'):
                 symbol = f45['symbol']
                 last_update = f45['last_update']
                 quarter = f45['quarter']
@@ -418,13 +808,112 @@ class ScrapeSetF45:
                     'eps': eps
                 }
                 
-                data['f45_cleaned_data'].append(cleaned_data)
-                
-            return Right(data)
+            return Right(cleaned_data)
         
         except Exception as e:
             return Left(f'Error in cleaning F45 Data: {str(e)}')
     
+    def cache_f45_page(self, f45: dict, text: str) -> None:
+        meta = {key: f45.get(key) for key in ('symbol', 'iso_date', 'headline', 'url')}
+        self.cache.put(f45_cache_key(f45), text, self.form.cache_kind, meta)
+    
+    def cache_list_page(self, data: dict)->[Left, Right]:    # type: ignore
+        try:
+            if self.cache is None:
+                return Right(data)
+            
+            print('Caching List Page')
+            cards = [{'text': f45['card_text'], 'url': f45.get('url')} for f45 in data['f45s']]
+            key = f'list|{data["url"]}|{datetime.now().isoformat(timespec="minutes")}'
+            self.cache.put(key, json.dumps(cards, ensure_ascii=False), 'list', {'url': data['url']})
+            self.cache.save()
+            return Right(data)
+        
+        except Exception as e:
+            return Left(f'Error in caching List Page: {str(e)}')
+    
+    def cache_f45_pages(self, data: dict)->[Left, Right]:    # type: ignore
+        try:
+            if self.cache is None:
+                return Right(data)
+            
+            print('Caching F45 Pages')
+            for f45 in data['f45_to_update']:
+                self.cache_f45_page(f45, f45['text'])
+            self.cache.save()
+            return Right(data)
+        
+        except Exception as e:
+            return Left(f'Error in caching F45 Pages: {str(e)}')
+    
+    def load_cached_f45_pages(self, data: dict)->[Left, Right]:    # type: ignore
+        try:
+            print('Loading Cached F45 Pages')
+            if self.cache is None:
+                return Left('No page cache to replay')
+            
+            data['f45_to_update'] = []
+            for key in self.cache.keys(self.form.cache_kind):
+                text = self.cache.get(key)
+                if text is None:
+                    continue
+                f45 = dict(self.cache.meta(key), text=text)
+                data['f45_to_update'].append(f45)
+            
+            # Oldest first, so the newest announcement of a symbol is exported last
+            data['f45_to_update'].sort(key=lambda f45: f45['iso_date'])
+            print(f'> Loaded {len(data["f45_to_update"])} F45 Pages')
+            return Right(data)
+        
+        except Exception as e:
+            return Left(f'Error in loading Cached F45 Pages: {str(e)}')
+    
+    def parse_f45_in_stages(self, f45: dict)->[Left, Right]:    # type: ignore
+        # Detail text of one announcement to its cleaned record, one stage at a time
+        return (
+            self.split_row_from_f45(f45)
+            .then (self.extract_numbers_from_f45)
+            .then (self.clean_f45)
+        )
+    
+    def parse_f45(self, f45: dict)->[Left, Right]:    # type: ignore
+        # Detail text of one announcement to its cleaned record in a single pass
+        try:
+            with self.metrics.timer('parse_f45'):
+                fields = self.form.parse(f45['text'])
+            
+            return Right(self.f45_record(f45, fields))
+        
+        except Exception as e:
+            return Left(f'Error in parsing F45 Text for {f45.get("symbol")}: {str(e)}')
+    
+    def f45_record(self, f45: dict, fields: dict) -> dict:
+        # Stored record of an announcement from its card and the fields its form parsed out of the text
+        record = {'symbol': f45['symbol'], 'last_update': f45['iso_date']}
+        record.update({field: f45.get(field) for field in self.form.card_fields})
+        record.update(fields)
+        record['content_hash'] = f45.get('content_hash') or content_hash(f45['text'])
+        return record
+    
+    def parse_f45_texts(self, data: dict)->[Left, Right]:    # type: ignore
+        try:
+            print('Parsing F45 Texts')
+            f45_to_update = data['f45_to_update']
+            data['f45_cleaned_data'] = []
+            
+            for f45 in f45_to_update:
+                print(f'> Parsing F45 Text for {f45["symbol"]}')
+                result = self.parse_f45(f45)
+                if result.is_left():
+                    self.dead_letter(data, 'parse_f45_texts', f45, result.monoid[0])
+                    continue
+                data['f45_cleaned_data'].append(result.value)
+            
+            return Right(data)
+        
+        except Exception as e:
+            return Left(f'Error in parsing F45 Texts: {str(e)}')
+    
     def update_db(self, data: dict)->[Left, Right]:    # type: ignore
         try:
             print('Updating DB')
@@ -432,19 +921,17 @@ class ScrapeSetF45:
             mongo = data['mongo']
             collection = mongo.collection
             
-            for f45 in f45_cleaned_data:
-                symbol = f45['symbol']
-                query = {'symbol': symbol}
-                update = {
-                    'symbol': symbol,
-                    'last_update': f45['last_update'],
-                    'quarter': f45['quarter'],
-                    'year': f45['year'],
-                    'net_profit': f45['net_profit'],
-                    'eps': f45['eps']
-                }
-                collection.update_one(query, {'$set': update}, upsert=True)
-                print(f'> Updated DB for {symbol}')
+            # Writes that can land out of order (backfill windows, queue workers) must not move a symbol back
+            newer_only = data.get('newer_only', False) or data.get('backfill', False)
+            report = bulk_upsert_latest(collection, f45_cleaned_data, newer_only=newer_only, fields=self.form.fields)
+            report.update(bulk_upsert_versions(data['versions'], f45_cleaned_data, self.form.version_key, self.form.fields))
+            report['touched'] = bulk_touch_latest(collection, data.get('f45_unchanged') or [], newer_only=newer_only)
+            data.setdefault('db_report', {}).update(report)
+            
+            print(f'> Updated DB: {report["matched"]} matched, {report["modified"]} modified, '
+                  f'{report["upserted"]} upserted, {report["skipped"]} skipped, '
+                  f'{data["db_report"].get("unchanged", 0)} unchanged, '
+                  f'{report["versions_upserted"]} new versions, {report["touched"]} touched')
             
             return Right(data)
         
@@ -456,6 +943,8 @@ class ScrapeSetF45:
             print('Closing MongoDB')
             mongo = data['mongo']
             mongo.client.close()
+            data['mongo'] = None
+            data['versions'] = None
             print('MongoDB Closed')
             return Right(data)
         
@@ -466,7 +955,12 @@ class ScrapeSetF45:
         try:
             print('Closing Web Browser')
             webdriver = data['webdriver']
-            webdriver.quit()
+            if webdriver is not None:
+                webdriver.quit()
+                data['webdriver'] = None
+            if data.get('http') is not None:
+                data['http'].close()
+                data['http'] = None
             print('Web Browser Closed')
             return Right(data)
         
@@ -476,56 +970,131 @@ class ScrapeSetF45:
     def export_data_to_json(self, data: dict)->[Left, Right]:    # type: ignore
         try:
             print('Exporting Data to JSON')
-            json_filename:str = 'f45_data.json'
             f45_cleaned_data = data['f45_cleaned_data']
+            file_path = data.get('export_path') or DEFAULT_EXPORT_PATH
             
-            folder_path = os.path.abspath(os.path.join(os.path.dirname(__file__), './report'))
-            file_path = os.path.join(folder_path, json_filename)  # Create the file path
-            
-            
-            if f45_cleaned_data == []:
-                if file_path in os.listdir(folder_path):
-                    os.remove(file_path) 
-                return Left('No data to export')
-            
-            
+            # A query that matches nothing is still an answer, written as an empty list
             with open(file_path, 'w') as f:
                 json.dump(f45_cleaned_data, f, ensure_ascii=False, indent=4)
-            with open('f45_data.json', 'w') as file:
-                file.write(f45_cleaned_data)
             
             return Right(data)
         
         except Exception as e:
             return Left(f'Error in exporting Data to JSON: {str(e)}')
     
-    def main(self):
+    def append_history(self, data: dict)->[Left, Right]:    # type: ignore
+        try:
+            print('Appending F45 History')
+            if not self.form.history:
+                return Right(data)
+            appended = self.history.append(data['f45_cleaned_data'])
+            self.metrics.incr('history_appended', appended)
+            print(f'> Appended {appended} F45s to {self.history.root}')
+            return Right(data)
+        
+        except Exception as e:
+            return Left(f'Error in appending F45 History: {str(e)}')
+    
+    def get_f45s_with_selenium(self, data: dict)->[Left, Right]:    # type: ignore
+        timed = self.metrics.stage
+        return (
+            timed(self.open_web_browser)(data)
+            .then (timed(self.maximize_window))
+            .then (timed(self.go_url))
+            # .then (timed(self.fill_headline_input_box))
+            .then (timed(self.click_search_button))
+            .then (timed(self.get_card_quote_news_elements))
+            .then (timed(self.extract_quote_news_elements))
+            .then (timed(self.get_next_card_quote_news_pages))
+            .then (timed(self.cache_list_page))
+        )
+    
+    def get_f45s_with_http(self, data: dict)->[Left, Right]:    # type: ignore
+        timed = self.metrics.stage
+        result = (
+            timed(self.open_http_session)(data)
+            .then (timed(self.http_get_card_quote_news))
+            .then (timed(self.cache_list_page))
+        )
+        if result.is_left():
+            # The HTTP backend could not read the list, start again with the browser
+            print(f'> Falling back to Selenium: {result.monoid[0]}')
+            if data.get('http') is not None:
+                data['http'].close()
+                data['http'] = None
+            return self.get_f45s_with_selenium(data)
+        
+        return result
+    
+    def count_records(self, data: dict, result) -> None:
+        # Records saved by a run that got as far as the DB, and records set aside on the way
+        succeeded = len(data.get('f45_cleaned_data') or []) if result.is_right() else 0
+        self.metrics.counters['records_succeeded'] = succeeded
+        self.metrics.counters.setdefault('records_failed', 0)
+        print(f'{succeeded} F45s saved, {self.metrics.counters["records_failed"]} failed'
+              + (f' (see {self.dead_letters.path})' if self.metrics.counters['records_failed'] and self.dead_letters is not None else ''))
+    
+    def release_resources(self, data: dict) -> None:
+        # Close whatever a failed run left open
+        if data.get('webdriver') is not None or data.get('http') is not None:
+            self.close_web_browser(data)
+        if data.get('mongo') is not None:
+            self.close_mongo_db(data)
+    
+    def main(self, from_date: str = None, to_date: str = None, backfill: bool = False):
         data = {}
         data['webdriver'] = None
+        data['from_date'] = from_date
+        data['to_date'] = to_date
+        data['backfill'] = backfill
+        get_f45s = self.get_f45s_with_http if self.backend == 'http' else self.get_f45s_with_selenium
+        self.metrics = RunMetrics(self.profile)
+        self.metrics.start()
+        timed = self.metrics.stage
 
         result = (
-            self.set_url(data)
-            .then (self.set_xpath)
-            .then (self.set_class_name)
-            .then (self.open_web_browser)
-            .then (self.maximize_window)
-            .then (self.go_url)
-            # .then (self.fill_headline_input_box)
-            .then (self.click_search_button)
-            .then (self.get_card_quote_news_elements)
-            .then (self.extract_quote_news_elements)
-            .then (self.covert_date_time)
-            .then (self.connect_mongo_db)
-            .then (self.compare_period_in_db)
-            .then (self.open_f45_page_get_text)
-            .then (self.close_web_browser)
-            .then (self.split_row_from_text)
-            .then (self.extract_numbers_from_rows)
-            .then (self.clean_f45_data)
-            .then (self.update_db)
-            .then (self.close_mongo_db)
-            .then (self.export_data_to_json)
+            timed(self.set_url)(data)
+            .then (timed(self.set_xpath))
+            .then (timed(self.set_class_name))
+            .then (get_f45s)
+            .then (timed(self.covert_date_time))
+            .then (timed(self.connect_mongo_db))
+            .then (timed(self.compare_period_in_db))
         )
+        
+        if self.stream:
+            result = (
+                result
+                .then (timed(self.stream_f45_to_db))
+                .then (timed(self.close_web_browser))
+            )
+        else:
+            result = (
+                result
+                .then (timed(self.open_f45_page_get_text))
+                .then (timed(self.cache_f45_pages))
+                .then (timed(self.close_web_browser))
+                .then (timed(self.skip_unchanged_f45s))
+                .then (timed(self.parse_f45_texts))
+                .then (timed(self.update_db))
+            )
+        
+        result = (
+            result
+            .then (timed(self.close_mongo_db))
+            .then (timed(self.append_history))
+        )
+        
+        if result.is_left():
+            print(result.monoid[0])
+            self.release_resources(data)
+        
+        self.count_records(data, result)
+        self.metrics.update_counters({f'db_{key}': value for key, value in data.get('db_report', {}).items()})
+        self.metrics.finish(result)
+        if self.report_path:
+            self.metrics.write(self.report_path, self.report_format)
+            print(f'Run report written to {self.report_path}')
 
         if result.monoid[1] == True:
             # return result.value['webdriver']
@@ -534,8 +1103,220 @@ class ScrapeSetF45:
             # print(result)
             return False
 
+    def produce(self, from_date: str = None, to_date: str = None):
+        # List stage only: queue an F45 task for every announcement that needs fetching, workers do the rest
+        data = {}
+        data['webdriver'] = None
+        data['from_date'] = from_date
+        data['to_date'] = to_date
+        get_f45s = self.get_f45s_with_http if self.backend == 'http' else self.get_f45s_with_selenium
+        self.metrics = RunMetrics(self.profile)
+        self.metrics.start()
+        timed = self.metrics.stage
+        
+        result = (
+            timed(self.set_url)(data)
+            .then (timed(self.set_xpath))
+            .then (timed(self.set_class_name))
+            .then (get_f45s)
+            .then (timed(self.close_web_browser))
+            .then (timed(self.covert_date_time))
+            .then (timed(self.connect_mongo_db))
+            .then (timed(self.compare_period_in_db))
+            .then (timed(self.connect_task_queue))
+            .then (timed(self.enqueue_f45_tasks))
+            .then (timed(self.close_mongo_db))
+        )
+        
+        if result.is_left():
+            print(result.monoid[0])
+            self.release_resources(data)
+        
+        self.metrics.finish(result)
+        if self.report_path:
+            self.metrics.write(self.report_path, self.report_format)
+            print(f'Run report written to {self.report_path}')
+        
+        return result.is_right()
 
-if __name__ == '__main__':
-    ScrapeSetF45().main()
+    def replay(self):
+        # Parse and export every cached F45 page again, no browser or Mongo involved
+        data = {}
+        self.metrics = RunMetrics(self.profile)
+        self.metrics.start()
+        timed = self.metrics.stage
+        
+        result = (
+            timed(self.load_cached_f45_pages)(data)
+            .then (timed(self.parse_f45_texts))
+            .then (timed(self.export_data_to_json))
+        )
+        
+        if result.is_left():
+            print(result.monoid[0])
+        
+        self.metrics.finish(result)
+        if self.report_path:
+            self.metrics.write(self.report_path, self.report_format)
+            print(f'Run report written to {self.report_path}')
+        
+        return result.is_right()
+
+    def load_history_records(self, data: dict)->[Left, Right]:    # type: ignore
+        try:
+            print('Loading History Records')
+            records = self.history.read(data.get('year'), data.get('quarter'), data.get('symbols'))
+            if not data.get('all_versions'):
+                # Latest filing of every symbol, the way the f45 collection keeps them
+                latest = {}
+                for record in records:
+                    current = latest.get(record['symbol'])
+                    if current is None or record['last_update'] >= current['last_update']:
+                        latest[record['symbol']] = record
+                records = list(latest.values())
+            
+            data['f45_cleaned_data'] = sorted(records, key=lambda record: (record['symbol'], record['last_update']))
+            print(f'> Loaded {len(data["f45_cleaned_data"])} F45s from {self.history.root}')
+            return Right(data)
+        
+        except Exception as e:
+            return Left(f'Error in loading History Records: {str(e)}')
+    
+    def export(self, year: int = None, quarter: int = None, symbols: list = None, all_versions: bool = False,
+               export_path: str = None):
+        # Write stored F45s to JSON from the history store, no browser, page cache or Mongo involved
+        data = {'year': year, 'quarter': quarter, 'symbols': symbols, 'all_versions': all_versions, 'export_path': export_path}
+        self.metrics = RunMetrics(self.profile)
+        self.metrics.start()
+        timed = self.metrics.stage
+        
+        result = (
+            timed(self.load_history_records)(data)
+            .then (timed(self.export_data_to_json))
+        )
+        
+        if result.is_left():
+            print(result.monoid[0])
+        else:
+            print(f'{len(data["f45_cleaned_data"])} F45s exported to {export_path or DEFAULT_EXPORT_PATH}')
+        
+        self.metrics.finish(result)
+        if self.report_path:
+            self.metrics.write(self.report_path, self.report_format)
+            print(f'Run report written to {self.report_path}')
+        
+        return result.is_right()
+
+    def load_dead_letters(self, data: dict)->[Left, Right]:    # type: ignore
+        try:
+            print('Loading Dead Letters')
+            if self.dead_letters is None:
+                return Left('No dead-letter queue to retry')
+            
+            # Each form retries only its own announcements
+            data['dead_letters'] = [entry for entry in self.dead_letters.read() if entry['f45'].get('form', F45_FORM.name) == self.form.name]
+            data['f45s'] = [dict(entry['f45'], text=entry.get('text')) for entry in data['dead_letters']]
+            print(f'> Loaded {len(data["f45s"])} Dead Letters from {self.dead_letters.path}')
+            return Right(data)
+        
+        except Exception as e:
+            return Left(f'Error in loading Dead Letters: {str(e)}')
+    
+    def rebuild_dead_letter_cards(self, data: dict)->[Left, Right]:    # type: ignore
+        try:
+            print('Rebuilding Dead Letter Cards')
+            f45s = data['f45s']
+            data['f45s'] = []
+            
+            for f45 in f45s:
+                if f45.get('iso_date'):
+                    data['f45s'].append(f45)
+                    continue
+                
+                # The card itself failed, read it again from its raw text
+                try:
+                    f45 = dict(self.parse_card_text(f45['card_text']), url=f45.get('url'), text=f45.get('text'))
+                    f45['iso_date'] = self.convert_f45_date_time(f45)
+                except Exception as e:
+                    self.dead_letter(data, 'rebuild_dead_letter_cards', f45, str(e))
+                    continue
+                print(f'> Rebuilt Card for {f45["symbol"]}')
+                data['f45s'].append(f45)
+            
+            return Right(data)
+        
+        except Exception as e:
+            return Left(f'Error in rebuilding Dead Letter Cards: {str(e)}')
+    
+    def get_dead_letter_texts(self, data: dict)->[Left, Right]:    # type: ignore
+        # Announcements that failed before their page was read are fetched again, the rest are re-parsed as they are
+        with_text = [f45 for f45 in data['f45s'] if f45.get('text') is not None]
+        data['f45_to_update'] = [f45 for f45 in data['f45s'] if f45.get('text') is None]
+        if not data['f45_to_update']:
+            data['f45_to_update'] = with_text
+            return Right(data)
+        
+        result = (
+            self.open_http_session(data)
+            .then (self.open_f45_page_get_text)
+            .then (self.cache_f45_pages)
+            .then (self.close_web_browser)
+        )
+        if result.is_right():
+            data['f45_to_update'] = with_text + data['f45_to_update']
+        return result
     
-    
\ No newline at end of file
+    def resolve_dead_letters(self, data: dict)->[Left, Right]:    # type: ignore
+        try:
+            print('Resolving Dead Letters')
+            retried = {entry['key'] for entry in data['dead_letters']}
+            resolved = retried - set(data.get('failed', []))
+            remaining = [entry for entry in self.dead_letters.read() if entry['key'] not in resolved]
+            self.dead_letters.replace(remaining)
+            print(f'> {len(resolved)} Dead Letters resolved, {len(remaining)} left')
+            return Right(data)
+        
+        except Exception as e:
+            return Left(f'Error in resolving Dead Letters: {str(e)}')
+    
+    def retry(self):
+        # Reprocess only the announcements in the dead-letter queue and drop the ones that now go through
+        data = {}
+        data['webdriver'] = None
+        # Retried F45s can be older than what is stored, so the latest collection is only moved forward
+        data['backfill'] = True
+        self.metrics = RunMetrics(self.profile)
+        self.metrics.start()
+        timed = self.metrics.stage
+        
+        result = (
+            timed(self.set_class_name)(data)
+            .then (timed(self.load_dead_letters))
+            .then (timed(self.rebuild_dead_letter_cards))
+            .then (timed(self.get_dead_letter_texts))
+            .then (timed(self.parse_f45_texts))
+            .then (timed(self.connect_mongo_db))
+            .then (timed(self.update_db))
+            .then (timed(self.close_mongo_db))
+            .then (timed(self.append_history))
+            .then (timed(self.resolve_dead_letters))
+        )
+        
+        if result.is_left():
+            print(result.monoid[0])
+            self.release_resources(data)
+        
+        self.count_records(data, result)
+        self.metrics.update_counters({f'db_{key}': value for key, value in data.get('db_report', {}).items()})
+        self.metrics.finish(result)
+        if self.report_path:
+            self.metrics.write(self.report_path, self.report_format)
+            print(f'Run report written to {self.report_path}')
+        
+        return result.is_right()
+
+
+
+if __name__ == '__main__':
+    from cli import main
+    main()
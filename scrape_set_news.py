@@ -0,0 +1,118 @@
+from pymonad.either import Left, Right
+
+from scrape_set_f45 import ScrapeSetF45
+from run_metrics import RunMetrics
+from news_forms import get_form
+
+
+class ScrapeSetNews:
+    # Several kinds of company news in one run. The forms share one browser or HTTP session and one
+    # Mongo client, each one searching its own keyword and parsing and storing with its own NewsForm.
+    # Only the session is shared: the site search takes one keyword at a time, so every form still runs its
+    # own search and paginates its own result list, N forms cost N list scrapes
+
+    def __init__(self, forms: list, **options) -> None:
+        self.scrapers = [ScrapeSetF45(form=get_form(form) if isinstance(form, str) else form, **options) for form in forms]
+        # The first scraper opens and closes what the forms share
+        self.scraper = self.scrapers[0]
+
+    def open_session(self, data: dict)->[Left, Right]:    # type: ignore
+        scraper = self.scraper
+        timed = scraper.metrics.stage
+        return (
+            timed(scraper.set_xpath)(data)
+            .then (timed(scraper.set_class_name))
+            .then (timed(scraper.connect_mongo_db))
+            .then (timed(self.share_mongo_client))
+        )
+
+    def share_mongo_client(self, data: dict)->[Left, Right]:    # type: ignore
+        try:
+            data['mongo_client'] = data['mongo'].client
+            return Right(data)
+
+        except Exception as e:
+            return Left(f'Error in sharing Mongo Client: {str(e)}')
+
+    def form_data(self, data: dict) -> dict:
+        # Per form state over the shared handles, the list and parse stages overwrite everything else
+        keys = ('webdriver', 'http', 'mongo_client', 'xpath', 'class_name', 'from_date', 'to_date', 'backfill')
+        return {key: data.get(key) for key in keys}
+
+    def scrape_form(self, scraper: ScrapeSetF45, data: dict)->[Left, Right]:    # type: ignore
+        timed = scraper.metrics.stage
+        get_news = scraper.get_f45s_with_http if scraper.backend == 'http' else scraper.get_f45s_with_selenium
+        result = (
+            timed(scraper.set_url)(data)
+            .then (get_news)
+            .then (timed(scraper.covert_date_time))
+            .then (timed(scraper.connect_mongo_db))
+            .then (timed(scraper.compare_period_in_db))
+        )
+
+        if scraper.stream:
+            result = result.then (timed(scraper.stream_f45_to_db))
+        else:
+            result = (
+                result
+                .then (timed(scraper.open_f45_page_get_text))
+                .then (timed(scraper.cache_f45_pages))
+                .then (timed(scraper.skip_unchanged_f45s))
+                .then (timed(scraper.parse_f45_texts))
+                .then (timed(scraper.update_db))
+            )
+
+        return result.then (timed(scraper.append_history))
+
+    def main(self, from_date: str = None, to_date: str = None, backfill: bool = False):
+        data = {}
+        data['webdriver'] = None
+        data['from_date'] = from_date
+        data['to_date'] = to_date
+        data['backfill'] = backfill
+        metrics = RunMetrics(self.scraper.profile)
+        for scraper in self.scrapers:
+            scraper.metrics = metrics
+        metrics.start()
+
+        result = self.open_session(data)
+        failed_forms = []
+        saved = 0
+        if result.is_right():
+            for scraper in self.scrapers:
+                print(f'Scraping {scraper.form.name}')
+                form_data = self.form_data(data)
+                form_result = self.scrape_form(scraper, form_data)
+
+                # The browser or HTTP session may have been opened, or replaced by the Selenium fallback
+                data['webdriver'] = form_data.get('webdriver')
+                data['http'] = form_data.get('http')
+
+                # One form failing leaves the others to run
+                if form_result.is_left():
+                    print(f'> {scraper.form.name} failed: {form_result.monoid[0]}')
+                    failed_forms.append(scraper.form.name)
+                    continue
+                saved += len(form_data.get('f45_cleaned_data') or [])
+                metrics.update_counters({f'{scraper.form.collection}_db_{key}': value for key, value in form_data.get('db_report', {}).items()})
+                print(f'> {len(form_data.get("f45_cleaned_data") or [])} {scraper.form.name} saved')
+
+            if len(failed_forms) == len(self.scrapers):
+                result = Left(f'Every form failed: {", ".join(failed_forms)}')
+        else:
+            print(result.monoid[0])
+
+        self.scraper.release_resources(data)
+        data['mongo_client'] = None
+
+        metrics.counters['records_succeeded'] = saved
+        metrics.counters.setdefault('records_failed', 0)
+        metrics.counters['forms_failed'] = len(failed_forms)
+        print(f'{saved} records saved over {len(self.scrapers)} forms, {metrics.counters["records_failed"]} failed'
+              + (f', forms failed: {", ".join(failed_forms)}' if failed_forms else ''))
+        metrics.finish(result)
+        if self.scraper.report_path:
+            metrics.write(self.scraper.report_path, self.scraper.report_format)
+            print(f'Run report written to {self.scraper.report_path}')
+
+        return result.is_right() and not failed_forms
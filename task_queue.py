@@ -0,0 +1,139 @@
+
+import os
+import socket
+import uuid
+from datetime import datetime, timedelta, timezone
+
+from pymongo import ASCENDING, ReturnDocument, UpdateOne
+
+from dead_letter import ANNOUNCEMENT_FIELDS, dead_letter_key
+
+
+TASKS_COLLECTION = 'f45_tasks'
+QUEUED, LEASED, DONE, DEAD = 'queued', 'leased', 'done', 'dead'
+DONE_TTL_SECONDS = 7 * 24 * 3600
+# The announcement plus the content hash stored when it was queued, so a worker can skip an unchanged page
+TASK_FIELDS = ANNOUNCEMENT_FIELDS + ('stored_hash',)
+
+
+def default_worker_id() -> str:
+    return f'{socket.gethostname()}-{os.getpid()}'
+
+
+def utc_now() -> datetime:
+    return datetime.now(timezone.utc)
+
+
+class F45TaskQueue:
+    # Fetch-and-parse tasks in Mongo, one per announcement. A claim leases a task until
+    # available_at, a worker that dies simply lets its lease run out and the task is claimed again
+
+    def __init__(self, collection, lease_seconds: float = 300, max_attempts: int = 5, retry_delay: float = 30) -> None:
+        self.collection = collection
+        self.lease_seconds = lease_seconds
+        self.max_attempts = max_attempts
+        self.retry_delay = retry_delay
+
+    def ensure_indexes(self) -> None:
+        self.collection.create_index([('key', ASCENDING)], name='key_1', unique=True)
+        # claim looks for the claimable task with the oldest available_at
+        self.collection.create_index([('status', ASCENDING), ('available_at', ASCENDING)], name='status_1_available_at_1')
+        # Finished tasks are only kept long enough to stop the producer queueing them again
+        self.collection.create_index([('done_at', ASCENDING)], name='done_at_1', expireAfterSeconds=DONE_TTL_SECONDS)
+
+    def enqueue(self, f45s: list) -> int:
+        # Queues announcements not queued before, returns how many were new
+        if not f45s:
+            return 0
+        now = utc_now()
+        operations = [
+            UpdateOne(
+                {'key': dead_letter_key(f45)},
+                {'$setOnInsert': {
+                    'f45': {field: f45[field] for field in TASK_FIELDS if f45.get(field) is not None},
+                    'status': QUEUED,
+                    'available_at': now,
+                    'attempts': 0,
+                    'created_at': now,
+                }},
+                upsert=True,
+            )
+            for f45 in f45s
+        ]
+        return self.collection.bulk_write(operations, ordered=False).upserted_count
+
+    def bury_expired(self, now: datetime) -> int:
+        # A task whose lease ran out max_attempts times keeps killing its worker, stop handing it out
+        result = self.collection.update_many(
+            {'status': LEASED, 'available_at': {'$lte': now}, 'attempts': {'$gte': self.max_attempts}},
+            {'$set': {'status': DEAD, 'error': f'Lease expired on all {self.max_attempts} attempts'}, '$unset': {'lease': ''}},
+        )
+        return result.modified_count
+
+    def claim(self, worker_id: str):
+        # Leases the oldest queued task, or one whose lease has run out, None when there is nothing to do
+        now = utc_now()
+        self.bury_expired(now)
+        return self.collection.find_one_and_update(
+            {'status': {'$in': [QUEUED, LEASED]}, 'available_at': {'$lte': now}, 'attempts': {'$lt': self.max_attempts}},
+            {
+                '$set': {
+                    'status': LEASED,
+                    'worker': worker_id,
+                    'lease': uuid.uuid4().hex,
+                    'leased_at': now,
+                    'available_at': now + timedelta(seconds=self.lease_seconds),
+                },
+                '$inc': {'attempts': 1},
+            },
+            sort=[('available_at', ASCENDING)],
+            return_document=ReturnDocument.AFTER,
+        )
+
+    def claim_many(self, worker_id: str, count: int) -> list:
+        tasks = []
+        while len(tasks) < count:
+            task = self.claim(worker_id)
+            if task is None:
+                break
+            tasks.append(task)
+        return tasks
+
+    def complete(self, task: dict) -> bool:
+        # False when the lease was lost to another worker, whose result then counts instead
+        result = self.collection.update_one(
+            {'_id': task['_id'], 'lease': task['lease']},
+            {'$set': {'status': DONE, 'done_at': utc_now()}, '$unset': {'lease': ''}},
+        )
+        return result.matched_count == 1
+
+    def fail(self, task: dict, error: str) -> bool:
+        # Back to the queue after retry_delay, or dead once max_attempts is used up
+        dead = task['attempts'] >= self.max_attempts
+        result = self.collection.update_one(
+            {'_id': task['_id'], 'lease': task['lease']},
+            {'$set': {
+                'status': DEAD if dead else QUEUED,
+                'error': error,
+                'available_at': utc_now() + timedelta(seconds=self.retry_delay),
+            }, '$unset': {'lease': ''}},
+        )
+        return result.matched_count == 1
+
+    def release(self, task: dict, refund: bool = True) -> bool:
+        # Gives a task back, refunding the attempt when the worker is only stopping. A task of a failed
+        # batch keeps its attempt, so one that keeps breaking its batch ends up dead instead of looping
+        if refund:
+            update = {'$set': {'status': QUEUED, 'available_at': utc_now()}, '$inc': {'attempts': -1}, '$unset': {'lease': ''}}
+        else:
+            dead = task['attempts'] >= self.max_attempts
+            update = {'$set': {
+                'status': DEAD if dead else QUEUED,
+                'error': 'Batch failed',
+                'available_at': utc_now() + timedelta(seconds=self.retry_delay),
+            }, '$unset': {'lease': ''}}
+        result = self.collection.update_one({'_id': task['_id'], 'lease': task['lease']}, update)
+        return result.matched_count == 1
+
+    def counts(self) -> dict:
+        return {status: self.collection.count_documents({'status': status}) for status in (QUEUED, LEASED, DONE, DEAD)}
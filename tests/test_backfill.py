@@ -0,0 +1,68 @@
+import os
+import sys
+
+import pytest
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '../')))
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '../bench')))
+from backfill import BackfillCheckpoint, run_backfill, split_date_range
+from history_store import HistoryStore
+
+pytest.importorskip('requests')
+from fixture_server import FixtureSite
+from mongo_stub import InMemoryMongo
+from scrape_set_f45 import ScrapeSetF45
+
+
+@pytest.fixture
+def empty_site():
+    with FixtureSite([]) as site:
+        yield site
+
+
+def test_empty_window_is_checkpointed(empty_site, tmp_path):
+    InMemoryMongo.reset()
+    checkpoint_path = str(tmp_path / 'checkpoint.json')
+
+    def new_scraper():
+        return ScrapeSetF45(backend='http', base_url=empty_site.base_url, mongo_factory=InMemoryMongo,
+                            history=HistoryStore(str(tmp_path / 'history')))
+
+    summary = run_backfill('2024-12-30', '2025-01-01', new_scraper, window_days=3, checkpoint_path=checkpoint_path)
+    assert summary['completed'] == 1 and summary['failed'] == 0
+    assert empty_site.requests['list'] == 1
+
+    summary = run_backfill('2024-12-30', '2025-01-01', new_scraper, window_days=3, checkpoint_path=checkpoint_path)
+    assert summary['skipped'] == 1
+
+
+def test_empty_list_without_a_date_range_fails(empty_site, tmp_path):
+    # The live list always has news, no card without a range means the page did not load as expected
+    scraper = ScrapeSetF45(backend='http', base_url=empty_site.base_url, history=HistoryStore(str(tmp_path / 'history')))
+    data = {}
+    result = (
+        scraper.set_url(data)
+        .then (scraper.set_class_name)
+        .then (scraper.open_http_session)
+        .then (scraper.http_get_card_quote_news)
+    )
+    data['http'].close()
+    assert result.is_left()
+
+
+def test_windows_cover_the_range_inclusively():
+    assert split_date_range('2024-01-30', '2024-02-05', 3) == [
+        ('2024-01-30', '2024-02-01'), ('2024-02-02', '2024-02-04'), ('2024-02-05', '2024-02-05')]
+    assert split_date_range('2024-02-05', '2024-02-05', 30) == [('2024-02-05', '2024-02-05')]
+    with pytest.raises(ValueError):
+        split_date_range('2024-02-06', '2024-02-05', 30)
+
+
+def test_checkpoint_survives_a_restart(tmp_path):
+    path = str(tmp_path / 'backfill' / 'checkpoint.json')
+    checkpoint = BackfillCheckpoint(path)
+    checkpoint.mark_done(('2024-01-01', '2024-01-30'))
+    assert not checkpoint.is_done(('2024-01-31', '2024-02-29'))
+    resumed = BackfillCheckpoint(path)
+    assert resumed.is_done(['2024-01-01', '2024-01-30'])
+    assert not os.path.exists(f'{path}.tmp')
@@ -0,0 +1,17 @@
+import json
+import os
+import sys
+
+import pytest
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '../')))
+import cli
+
+
+def test_export_of_nothing_writes_an_empty_list(tmp_path):
+    output = tmp_path / 'mine.json'
+    output.write_text('[{"symbol": "SYM1"}]')
+    with pytest.raises(SystemExit) as exit_info:
+        cli.main(['--report', '', '--history-dir', str(tmp_path / 'history'), 'export', '--year', '2030', '--output', str(output)])
+    assert exit_info.value.code == 0
+    assert json.loads(output.read_text()) == []
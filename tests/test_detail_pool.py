@@ -0,0 +1,77 @@
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '../')))
+from detail_pool import DetailPagePool
+from scrape_set_f45 import ScrapeSetF45
+
+
+class FakeDriver:
+    # Stands in for a WebDriver session, the pool only calls get and quit on it
+
+    opened = 0
+
+    def __init__(self) -> None:
+        FakeDriver.opened += 1
+        self.url = None
+        self.quit_called = False
+
+    def get(self, url: str) -> None:
+        self.url = url
+
+    def quit(self) -> None:
+        self.quit_called = True
+
+
+def new_pool(size: int) -> DetailPagePool:
+    FakeDriver.opened = 0
+    pool = DetailPagePool(size, 'raw-html-new', driver_factory=FakeDriver)
+    pool.fetch_text = lambda driver, url: f'text of {url}'
+    return pool
+
+
+def test_no_sessions_for_no_pages():
+    with new_pool(4) as pool:
+        assert pool.fetch_all([]) == []
+    assert FakeDriver.opened == 0
+
+
+def test_no_more_sessions_than_pages():
+    with new_pool(4) as pool:
+        assert pool.fetch_all(['a', 'b']) == [('text of a', None), ('text of b', None)]
+        assert len(pool.drivers) == 2
+    assert FakeDriver.opened == 2
+    assert pool.drivers == []
+
+
+def test_results_keep_the_order_of_the_urls():
+    with new_pool(3) as pool:
+        # Earlier pages take longer, so they arrive last
+        def fetch_text(driver, url):
+            time.sleep(0.01 * (5 - int(url)))
+            return f'text of {url}'
+        pool.fetch_text = fetch_text
+        urls = [str(index) for index in range(5)]
+        assert pool.fetch_all(urls) == [(f'text of {url}', None) for url in urls]
+
+
+def test_errors_land_on_their_own_records(monkeypatch):
+    fetch_text = DetailPagePool.fetch_text
+
+    def fake_fetch_text(pool, driver, url):
+        if url == 'slow':
+            raise TimeoutError('F45 text did not load')
+        return fetch_text(pool, driver, url) if not url else f'text of {url}'
+
+    monkeypatch.setattr(DetailPagePool, 'fetch_text', fake_fetch_text)
+    scraper = ScrapeSetF45(detail_workers=2)
+    scraper.new_web_driver = FakeDriver
+    f45s = [{'symbol': 'SYM1', 'url': 'a'}, {'symbol': 'SYM2', 'url': 'slow'}, {'symbol': 'SYM3'}, {'symbol': 'SYM4', 'url': 'b'}]
+    scraper.open_f45_pages_with_pool(None, f45s, 'raw-html-new')
+    assert [(f45['symbol'], f45['text'], f45.get('error')) for f45 in f45s] == [
+        ('SYM1', 'text of a', None),
+        ('SYM2', None, 'F45 text did not load'),
+        ('SYM3', None, 'No detail link on the news card'),
+        ('SYM4', 'text of b', None),
+    ]
@@ -0,0 +1,42 @@
+import os
+import sys
+
+import pytest
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '../')))
+from f45_parser import parse_f45_text
+
+
+# Detail texts in the row shapes of real F45s: the period row, the Year header, the profit and EPS rows
+# with the current period in the second column
+QUARTER_TEXT = '''Summary Financial Information
+Company Name        SYM1
+Quarter 2
+                    Year          2024          2023
+Net Profit (loss)          1,234,567.89          1,000,000.00
+EPS (baht)          0.45          0.40
+Type of report      Unqualified Opinion'''
+
+YEARLY_UPDATE_TEXT = '''Summary Financial Information
+Company Name        SYM2
+For 12 Months
+                    Year          2023          2022
+Net Profit (loss)          (52,300.10) (Update)          12,000.00
+EPS (baht)          (0.12) (Update)          0.03'''
+
+NO_EPS_TEXT = '''Quarter 1
+                    Year          2024          2023
+Net Profit (loss)          100.00          90.00'''
+
+
+def test_parse_quarter():
+    assert parse_f45_text(QUARTER_TEXT) == {'quarter': 2, 'year': 2024, 'net_profit': 1234567.89, 'eps': 0.45}
+
+
+def test_parse_yearly_update_with_losses():
+    assert parse_f45_text(YEARLY_UPDATE_TEXT) == {'quarter': 4, 'year': 2023, 'net_profit': -52300.10, 'eps': -0.12}
+
+
+def test_parse_missing_row():
+    with pytest.raises(ValueError, match='No EPS row'):
+        parse_f45_text(NO_EPS_TEXT)
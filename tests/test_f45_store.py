@@ -0,0 +1,55 @@
+import os
+import sys
+
+import pytest
+from pymongo.errors import DuplicateKeyError
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '../')))
+from f45_store import bulk_upsert_latest, ensure_latest_indexes
+
+mongomock = pytest.importorskip('mongomock')
+
+
+@pytest.fixture
+def db():
+    return mongomock.MongoClient().stockThai
+
+
+def record(symbol: str, last_update: str, eps: float) -> dict:
+    return {'symbol': symbol, 'last_update': last_update, 'quarter': 1, 'year': 2024, 'net_profit': 1.0, 'eps': eps, 'content_hash': eps}
+
+
+def test_upsert_latest_replaces_older_records(db):
+    bulk_upsert_latest(db.f45, [record('SYM1', '2024-08-14T16:55:00', 0.2)])
+    report = bulk_upsert_latest(db.f45, [record('SYM1', '2024-05-10T09:00:00', 0.1)])
+    assert report['matched'] == 1
+    assert db.f45.find_one({'symbol': 'SYM1'})['eps'] == 0.1
+
+
+def test_upsert_latest_newer_only_keeps_newer_records(db):
+    bulk_upsert_latest(db.f45, [record('SYM1', '2024-08-14T16:55:00', 0.2)], newer_only=True)
+    bulk_upsert_latest(db.f45, [record('SYM1', '2024-05-10T09:00:00', 0.1), record('SYM2', '2024-05-10T09:00:00', 0.3)], newer_only=True)
+    assert db.f45.find_one({'symbol': 'SYM1'}, {'_id': 0}) == record('SYM1', '2024-08-14T16:55:00', 0.2)
+    assert db.f45.find_one({'symbol': 'SYM2'})['eps'] == 0.3
+
+    bulk_upsert_latest(db.f45, [record('SYM1', '2024-11-12T17:00:00', 0.5)], newer_only=True)
+    assert db.f45.find_one({'symbol': 'SYM1'})['eps'] == 0.5
+
+
+def test_upsert_latest_keeps_newest_of_a_batch(db):
+    report = bulk_upsert_latest(db.f45, [record('SYM1', '2024-08-14T16:55:00', 0.2), record('SYM1', '2024-05-10T09:00:00', 0.1)])
+    assert report['skipped'] == 1
+    assert db.f45.find_one({'symbol': 'SYM1'})['eps'] == 0.2
+
+
+def test_latest_index_is_unique_after_removing_duplicates(db):
+    db.f45.create_index('symbol', name='symbol_1')
+    db.f45.insert_many([record('SYM1', '2024-05-10T09:00:00', 0.1), record('SYM1', '2024-08-14T16:55:00', 0.2), record('SYM2', '2024-05-10T09:00:00', 0.3)])
+    ensure_latest_indexes(db.f45)
+    assert db.f45.index_information()['symbol_1']['unique']
+    assert sorted((doc['symbol'], doc['eps']) for doc in db.f45.find()) == [('SYM1', 0.2), ('SYM2', 0.3)]
+
+    ensure_latest_indexes(db.f45)
+    with pytest.raises(DuplicateKeyError):
+        db.f45.insert_one(record('SYM2', '2024-11-12T17:00:00', 0.4))
+
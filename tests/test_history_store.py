@@ -0,0 +1,30 @@
+import os
+import sys
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '../')))
+from history_store import HistoryStore
+
+
+def record(symbol: str, last_update: str, year: int = 2024, quarter: int = 2, net_profit: float = 1.0) -> dict:
+    return {'symbol': symbol, 'last_update': last_update, 'quarter': quarter, 'year': year, 'net_profit': net_profit, 'eps': 0.1}
+
+
+def test_append_skips_records_already_in_the_partition(tmp_path):
+    store = HistoryStore(str(tmp_path))
+    assert store.append([record('SYM1', '2024-08-14T16:55:00'), record('SYM2', '2024-08-14T16:50:00')]) == 2
+    # Same identity, a newer last_update and another quarter are all told apart by the record key
+    assert store.append([record('SYM1', '2024-08-14T16:55:00'), record('SYM1', '2024-08-15T09:00:00'),
+                         record('SYM1', '2024-05-14T16:55:00', quarter=1)]) == 2
+    assert store.append([record('SYM2', '2024-08-14T16:50:00')]) == 0
+    assert len(store.read()) == 4
+    assert len(store.part_files(2024, 2)) == 2
+    assert [item['last_update'] for item in store.read(2024, 1)] == ['2024-05-14T16:55:00']
+
+
+def test_symbol_filter_matches_whole_symbols(tmp_path):
+    store = HistoryStore(str(tmp_path))
+    store.append([record('SYM', '2024-08-14T16:55:00'), record('SYM1', '2024-08-14T16:50:00'),
+                  record('ABC', '2024-08-14T16:45:00', year=2023)])
+    assert [item['symbol'] for item in store.read(symbols=['SYM'])] == ['SYM']
+    assert sorted(item['symbol'] for item in store.read(symbols=['SYM1', 'ABC'])) == ['ABC', 'SYM1']
+    assert store.read(year=2024, symbols=['ABC']) == []
@@ -0,0 +1,45 @@
+import os
+import sys
+
+import pytest
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '../')))
+pytest.importorskip('requests')
+from http_fetch import find_next_page_url, parse_class_texts
+
+
+def test_block_tags_become_lines():
+    html = '<div class="card"><a href="/news?id=1"><div>14 Aug 2024</div><div>16:55</div><div>SYM1</div></a></div>'
+    assert parse_class_texts(html, 'card') == [{'text': '14 Aug 2024\n16:55\nSYM1', 'href': '/news?id=1'}]
+
+
+def test_nested_same_tag_closes_at_its_own_end():
+    html = '<div class="card"><div>a</div><div><div>b</div></div></div><div>outside</div>'
+    assert parse_class_texts(html, 'card') == [{'text': 'a\nb', 'href': None}]
+
+
+def test_unclosed_tags_inside_the_element():
+    html = '<div class="c"><p>a<p>b</div><ul class="c"><li>x<li>y</ul><div>outside</div>'
+    assert [result['text'] for result in parse_class_texts(html, 'c')] == ['a\nb', 'x\ny']
+
+
+def test_scripts_are_skipped():
+    html = '<div class="c">a<script>var b = 1;</script><style>.c {}</style>c</div>'
+    assert parse_class_texts(html, 'c')[0]['text'] == 'ac'
+
+
+def test_preserve_whitespace_keeps_columns():
+    html = '<div class="raw-html-new"><pre>Net Profit (loss)          1,234.00\nEPS (baht)          0.45</pre></div>'
+    text = parse_class_texts(html, 'raw-html-new', preserve_whitespace=True)[0]['text']
+    assert text == 'Net Profit (loss)          1,234.00\nEPS (baht)          0.45'
+
+
+def test_void_element_with_the_class():
+    assert parse_class_texts('<img class="c" src="a.png"><div class="c">x</div>', 'c') == [
+        {'text': '', 'href': None}, {'text': 'x', 'href': None}]
+
+
+def test_next_page_url():
+    html = '<ul><li><a aria-label="Go to next page" href="?page=2">&gt;</a></li></ul>'
+    assert find_next_page_url(html, 'http://site/news?page=1') == 'http://site/news?page=2'
+    assert find_next_page_url('<a aria-label="Go to next page" aria-disabled="true">&gt;</a>', 'http://site/news') is None
@@ -0,0 +1,32 @@
+import os
+import sys
+from types import SimpleNamespace
+
+import pytest
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '../')))
+from news_forms import F45_FORM, raw_text_form
+from scrape_set_f45 import ScrapeSetF45
+
+mongomock = pytest.importorskip('mongomock')
+
+
+def card(symbol: str, iso_date: str, headline: str) -> dict:
+    return {'symbol': symbol, 'iso_date': iso_date, 'headline': headline}
+
+
+def cards_to_fetch(form, cards: list) -> list:
+    db = mongomock.MongoClient().stockThai
+    data = {'f45s': cards, 'mongo': SimpleNamespace(collection=db[form.collection]), 'versions': db[form.versions_collection]}
+    assert ScrapeSetF45(form=form).compare_period_in_db(data).is_right()
+    return [(f45['symbol'], f45['headline']) for f45 in data['f45_to_update']]
+
+
+def test_f45_fetches_only_the_latest_card_of_a_symbol():
+    cards = [card('SYM1', '2024-08-14T16:55:00', 'Q2 (F45) amended'), card('SYM1', '2024-08-14T09:00:00', 'Q2 (F45)')]
+    assert cards_to_fetch(F45_FORM, cards) == [('SYM1', 'Q2 (F45) amended')]
+
+
+def test_other_news_keeps_every_notice_of_a_symbol():
+    cards = [card('SYM1', '2024-08-14T16:55:00', 'XD dividend'), card('SYM1', '2024-08-14T09:00:00', 'XD interim dividend')]
+    assert cards_to_fetch(raw_text_form('XD'), cards) == [('SYM1', 'XD dividend'), ('SYM1', 'XD interim dividend')]
@@ -0,0 +1,29 @@
+import os
+import sys
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '../')))
+from page_cache import PageCache
+
+
+def test_processes_sharing_a_directory_keep_each_others_entries(tmp_path):
+    first = PageCache(str(tmp_path))
+    second = PageCache(str(tmp_path))
+    first.put('a', 'text of a', 'text')
+    second.put('b', 'text of b', 'text')
+    first.save()
+    second.save()
+    assert (second.get('a'), second.get('b')) == ('text of a', 'text of b')
+    assert sorted(PageCache(str(tmp_path)).keys()) == ['a', 'b']
+
+
+def test_eviction_drops_unreferenced_then_least_recently_used(tmp_path):
+    cache = PageCache(str(tmp_path), max_bytes=20)
+    for index, key in enumerate(['old', 'new', 'replaced']):
+        digest = cache.put(key, f'{key} page'.ljust(10), 'text')
+        cache.objects[digest]['used_at'] = index
+    # The first version of 'replaced' is left unreferenced, it goes first however recently it was used
+    cache.put('replaced', 'second version', 'text')
+    assert cache.evict() == 3
+    assert sorted(cache.keys()) == ['replaced']
+    assert cache.get('old') is None
+    assert sum(len(files) for _, _, files in os.walk(tmp_path / 'objects')) == 1
@@ -0,0 +1,69 @@
+import os
+import sys
+import threading
+from types import SimpleNamespace
+
+import pytest
+from pymonad.either import Right
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '../')))
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '../bench')))
+from run_metrics import RunMetrics, count_webdriver_calls, current_metrics, db_command_counter
+
+
+class FakeExecutor:
+
+    def execute(self, command, params=None):
+        return {'value': None}
+
+
+def run(commands: int) -> dict:
+    metrics = RunMetrics()
+    metrics.start()
+    for _ in range(commands):
+        db_command_counter.started(SimpleNamespace(command_name='find'))
+    metrics.finish(Right(None))
+    return metrics.counters
+
+
+def test_runs_side_by_side_count_their_own_db_commands():
+    counters = {}
+    threads = [threading.Thread(target=lambda n=n: counters.update({n: run(n)})) for n in (3, 5)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    assert counters == {3: {'db_round_trips': 3, 'db_find': 3}, 5: {'db_round_trips': 5, 'db_find': 5}}
+    assert current_metrics.get() is None
+
+
+def test_a_warm_driver_counts_into_each_poll():
+    driver = count_webdriver_calls(SimpleNamespace(command_executor=FakeExecutor()))
+    polls = []
+    for calls in (2, 1):
+        metrics = RunMetrics()
+        metrics.start()
+        for _ in range(calls):
+            driver.command_executor.execute('getTitle')
+        metrics.finish(Right(None))
+        polls.append(metrics.counters.get('webdriver_calls'))
+    assert polls == [2, 1]
+
+
+def test_a_warm_http_session_counts_into_each_poll():
+    pytest.importorskip('requests')
+    from fixture_server import FixtureSite, load_fixtures
+    from http_fetch import HttpF45Fetcher
+
+    with FixtureSite(load_fixtures(2, corpus_path=None)) as site:
+        http = HttpF45Fetcher(pool_size=2)
+        polls = []
+        for pages in (2, 1):
+            metrics = RunMetrics()
+            metrics.start()
+            urls = [f'{site.base_url}/en/market/news-and-alert/newsdetails?id={index}' for index in range(pages)]
+            assert all(error is None for _, error in http.get_f45_texts(urls, 'raw-html-new'))
+            metrics.finish(Right(None))
+            polls.append(metrics.counters.get('http_requests'))
+        http.close()
+    assert polls == [2, 1]
@@ -0,0 +1,86 @@
+import os
+import sys
+
+import pytest
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '../')))
+from task_queue import DEAD, DONE, LEASED, QUEUED, F45TaskQueue
+
+mongomock = pytest.importorskip('mongomock')
+
+
+@pytest.fixture
+def db():
+    return mongomock.MongoClient().stockThai
+
+
+def announcement(symbol: str) -> dict:
+    return {'symbol': symbol, 'iso_date': '2024-08-14T16:55:00', 'headline': 'Financial Performance Quarter 2 (F45)',
+            'url': f'https://www.set.or.th/news?symbol={symbol}', 'stored_hash': 'abc'}
+
+
+def test_queue_enqueues_each_announcement_once(db):
+    tasks = F45TaskQueue(db.f45_tasks)
+    assert tasks.enqueue([announcement('SYM1'), announcement('SYM2')]) == 2
+    assert tasks.enqueue([announcement('SYM1')]) == 0
+    assert tasks.counts() == {QUEUED: 2, LEASED: 0, DONE: 0, DEAD: 0}
+
+
+def test_queue_claim_and_complete(db):
+    tasks = F45TaskQueue(db.f45_tasks)
+    tasks.enqueue([announcement('SYM1')])
+    task = tasks.claim('worker-1')
+    assert task['status'] == LEASED and task['attempts'] == 1
+    assert task['f45']['stored_hash'] == 'abc'
+    assert tasks.claim('worker-2') is None
+
+    assert tasks.complete(task)
+    assert tasks.counts()[DONE] == 1
+
+
+def test_queue_complete_after_lease_lost(db):
+    tasks = F45TaskQueue(db.f45_tasks, lease_seconds=0)
+    tasks.enqueue([announcement('SYM1')])
+    stale = tasks.claim('worker-1')
+    fresh = tasks.claim('worker-2')
+    assert fresh['worker'] == 'worker-2'
+    assert not tasks.complete(stale)
+    assert tasks.complete(fresh)
+
+
+def test_queue_fail_retries_then_dead(db):
+    tasks = F45TaskQueue(db.f45_tasks, max_attempts=2, retry_delay=0)
+    tasks.enqueue([announcement('SYM1')])
+    assert tasks.fail(tasks.claim('worker-1'), 'parse error')
+    assert tasks.counts()[QUEUED] == 1
+
+    assert tasks.fail(tasks.claim('worker-1'), 'parse error')
+    assert tasks.counts()[DEAD] == 1
+    assert tasks.claim('worker-1') is None
+
+
+def test_queue_buries_task_whose_lease_keeps_running_out(db):
+    tasks = F45TaskQueue(db.f45_tasks, lease_seconds=0, max_attempts=2)
+    tasks.enqueue([announcement('SYM1')])
+    tasks.claim('worker-1')
+    tasks.claim('worker-2')
+    assert tasks.claim('worker-3') is None
+    assert tasks.counts()[DEAD] == 1
+
+
+def test_queue_release_refunds_a_stopping_worker(db):
+    tasks = F45TaskQueue(db.f45_tasks, max_attempts=2)
+    tasks.enqueue([announcement('SYM1')])
+    assert tasks.release(tasks.claim('worker-1'))
+    assert tasks.counts()[QUEUED] == 1
+    assert tasks.claim('worker-1')['attempts'] == 1
+
+
+def test_queue_release_of_a_failed_batch_uses_up_attempts(db):
+    tasks = F45TaskQueue(db.f45_tasks, max_attempts=2, retry_delay=0)
+    tasks.enqueue([announcement('SYM1')])
+    assert tasks.release(tasks.claim('worker-1'), refund=False)
+    assert tasks.counts()[QUEUED] == 1
+
+    assert tasks.release(tasks.claim('worker-1'), refund=False)
+    assert tasks.counts()[DEAD] == 1
@@ -0,0 +1,41 @@
+import os
+import sys
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '../')))
+from scrape_set_f45 import ScrapeSetF45
+from watch_f45 import WatchSetF45
+
+
+def card(symbol: str, date: str, time: str, headline: str = 'Financial Performance Quarter 2 (F45)') -> dict:
+    return {'text': f'{date}\n{time}\n{symbol}\n{symbol}\n{headline}', 'url': f'http://site/news?symbol={symbol}'}
+
+
+def new_cards(watch: WatchSetF45, cards: list) -> list:
+    data = {'elements': {'card_quote_news': cards}}
+    assert watch.extract_new_quote_news_elements(data).is_right()
+    return data['f45s']
+
+
+def test_cards_sharing_the_high_water_minute_are_read_once():
+    watch = WatchSetF45(ScrapeSetF45())
+    first = new_cards(watch, [card('SYM1', '14 Aug 2024', '16:55'), card('SYM2', '14 Aug 2024', '16:50')])
+    assert [f45['symbol'] for f45 in first] == ['SYM1', 'SYM2']
+    watch.advance_high_water_mark(first)
+    assert watch.high_water_mark == '2024-08-14T16:55:00'
+
+    # A card published later in the same minute is new, the one already read is not and older ones stop the scan
+    cards = [card('SYM3', '14 Aug 2024', '16:55'), card('SYM1', '14 Aug 2024', '16:55'),
+             card('SYM2', '14 Aug 2024', '16:50'), card('SYM4', '14 Aug 2024', '16:59')]
+    assert [f45['symbol'] for f45 in new_cards(watch, cards)] == ['SYM3']
+
+
+def test_the_mark_stays_until_a_poll_succeeds():
+    watch = WatchSetF45(ScrapeSetF45())
+    cards = [card('SYM1', '14 Aug 2024', '16:55')]
+    # A failed poll never advances the mark, so its cards are read again by the next one
+    assert [f45['symbol'] for f45 in new_cards(watch, cards)] == ['SYM1']
+    assert watch.high_water_mark is None
+    f45s = new_cards(watch, cards)
+    assert [f45['symbol'] for f45 in f45s] == ['SYM1']
+    watch.advance_high_water_mark(f45s)
+    assert new_cards(watch, cards) == []
@@ -0,0 +1,213 @@
+
+import signal
+import time
+
+from pymonad.either import Left, Right
+
+from scrape_set_f45 import ScrapeSetF45
+from run_metrics import RunMetrics
+
+
+class WatchSetF45:
+    # Keeps one browser and one Mongo client warm and polls the news list, only reading
+    # cards newer than the high-water mark and only fetching announcements not seen before
+
+    def __init__(self, scraper: ScrapeSetF45, interval: float = 30, max_backoff: float = 300) -> None:
+        self.scraper = scraper
+        self.interval = interval
+        self.max_backoff = max_backoff
+        self.high_water_mark = None
+        self.seen_at_high_water_mark = set()
+        self.stopping = False
+
+    def card_key(self, f45: dict) -> str:
+        return f'{f45["symbol"]}|{f45["iso_date"]}|{f45["headline"]}'
+
+    def open_session(self, data: dict)->[Left, Right]:    # type: ignore
+        scraper = self.scraper
+        return (
+            scraper.set_url(data)
+            .then (scraper.set_xpath)
+            .then (scraper.set_class_name)
+            .then (scraper.connect_mongo_db)
+            .then (self.load_high_water_mark)
+        )
+
+    def load_high_water_mark(self, data: dict)->[Left, Right]:    # type: ignore
+        try:
+            print('Loading High-Water Mark')
+            if self.high_water_mark is None:
+                latest = data['mongo'].collection.find_one({}, {'_id': 0, 'last_update': 1}, sort=[('last_update', -1)])
+                self.high_water_mark = latest['last_update'] if latest else None
+            print(f'> High-Water Mark is {self.high_water_mark}')
+            return Right(data)
+        
+        except Exception as e:
+            return Left(f'Error in loading High-Water Mark: {str(e)}')
+
+    def open_browser(self, data: dict)->[Left, Right]:    # type: ignore
+        if data.get('webdriver') is not None:
+            return Right(data)
+        return (
+            self.scraper.open_web_browser(data)
+            .then (self.scraper.maximize_window)
+        )
+
+    def is_browser_alive(self, data: dict) -> bool:
+        try:
+            data['webdriver'].current_url
+            return True
+        except Exception:
+            return False
+
+    def restart_browser(self, data: dict) -> None:
+        print('Restarting Web Browser')
+        try:
+            data['webdriver'].quit()
+        except Exception:
+            pass
+        data['webdriver'] = None
+
+    def extract_new_quote_news_elements(self, data: dict)->[Left, Right]:    # type: ignore
+        try:
+            print('Extracting New Quote News Elements')
+            scraper = self.scraper
+            data['f45s'] = []
+            
+            # Cards are newest first, stop at the first one older than the high-water mark
+            for element in data['elements']['card_quote_news']:
+                try:
+                    f45 = scraper.parse_card_text(element['text'])
+                    f45['iso_date'] = scraper.convert_f45_date_time(f45)
+                except Exception as e:
+                    scraper.dead_letter(data, 'extract_new_quote_news_elements', {'card_text': element['text'], 'url': element['url']}, str(e))
+                    continue
+                
+                if self.high_water_mark is not None:
+                    if f45['iso_date'] < self.high_water_mark:
+                        break
+                    # Several cards can share the high-water minute, skip only the ones already read
+                    if f45['iso_date'] == self.high_water_mark and self.card_key(f45) in self.seen_at_high_water_mark:
+                        continue
+                
+                print(f'> New Quote News Element for {f45["symbol"]}')
+                f45['url'] = element['url']
+                data['f45s'].append(f45)
+            
+            return Right(data)
+        
+        except Exception as e:
+            return Left(f'Error in extracting New Quote News Elements: {str(e)}')
+
+    def advance_high_water_mark(self, f45s: list) -> None:
+        for f45 in f45s:
+            if self.high_water_mark is None or f45['iso_date'] > self.high_water_mark:
+                self.high_water_mark = f45['iso_date']
+                self.seen_at_high_water_mark = set()
+            if f45['iso_date'] == self.high_water_mark:
+                self.seen_at_high_water_mark.add(self.card_key(f45))
+
+    def update_db(self, data: dict)->[Left, Right]:    # type: ignore
+        # A record the DB rejects must not fail every poll and hold the high-water mark for good. A failed
+        # batch is written again one record at a time and only the rejected records are dead-lettered,
+        # when none of them goes in the DB itself is the problem and the poll fails as before
+        scraper = self.scraper
+        result = scraper.update_db(data)
+        if result.is_right():
+            return result
+
+        print('Updating DB one F45 at a time')
+        f45s = {(f45['symbol'], f45['iso_date']): f45 for f45 in data['f45_to_update']}
+        db_report = data.setdefault('db_report', {})
+        saved = []
+        rejected = []
+        for record in data['f45_cleaned_data']:
+            single = dict(data, f45_cleaned_data=[record], f45_unchanged=[], db_report={})
+            written = scraper.update_db(single)
+            if written.is_left():
+                rejected.append((record, written.monoid[0]))
+                continue
+            saved.append(record)
+            for key, value in single['db_report'].items():
+                db_report[key] = db_report.get(key, 0) + value
+
+        if not saved and data['f45_cleaned_data']:
+            return result
+        for record, error in rejected:
+            f45 = f45s.get((record['symbol'], record['last_update']), {'symbol': record['symbol'], 'iso_date': record['last_update']})
+            scraper.dead_letter(data, 'update_db', f45, error, f45.get('text'))
+        data['f45_cleaned_data'] = saved
+        # The unchanged F45s are only touched
+        touched = dict(data, f45_cleaned_data=[], db_report={})
+        result = scraper.update_db(touched)
+        db_report['touched'] = touched['db_report'].get('touched', 0)
+        return result.then(lambda _: Right(data))
+
+    def poll(self, data: dict)->[Left, Right]:    # type: ignore
+        scraper = self.scraper
+        timed = scraper.metrics.stage
+        return (
+            timed(self.open_browser)(data)
+            .then (timed(scraper.go_url))
+            .then (timed(scraper.click_search_button))
+            .then (timed(scraper.get_card_quote_news_elements))
+            .then (timed(self.extract_new_quote_news_elements))
+            .then (timed(scraper.compare_period_in_db))
+            .then (timed(scraper.open_f45_page_get_text))
+            .then (timed(scraper.cache_f45_pages))
+            .then (timed(scraper.skip_unchanged_f45s))
+            .then (timed(scraper.parse_f45_texts))
+            .then (timed(self.update_db))
+            .then (timed(scraper.append_history))
+        )
+
+    def stop(self, *args) -> None:
+        print('Stopping watch after the current poll')
+        self.stopping = True
+
+    def run(self, max_polls: int = None) -> None:
+        signal.signal(signal.SIGINT, self.stop)
+        signal.signal(signal.SIGTERM, self.stop)
+        scraper = self.scraper
+        data = {'webdriver': None}
+        
+        result = self.open_session(data)
+        if result.is_left():
+            print(result.monoid[0])
+            return
+        
+        polls = 0
+        failures = 0
+        try:
+            while not self.stopping and (max_polls is None or polls < max_polls):
+                started = time.monotonic()
+                scraper.metrics = RunMetrics(scraper.profile)
+                scraper.metrics.start()
+                
+                data['failed'] = []
+                data['errors'] = {}
+                result = self.poll(data)
+                scraper.metrics.finish(result)
+                polls += 1
+                
+                if result.is_right():
+                    failures = 0
+                    self.advance_high_water_mark(data['f45s'])
+                    print(f'Poll {polls}: {len(data["f45s"])} new cards, {len(data["f45_cleaned_data"])} F45s saved, {len(data["failed"])} failed '
+                          f'in {time.monotonic() - started:.2f}s, high-water mark {self.high_water_mark}')
+                else:
+                    failures += 1
+                    print(f'Poll {polls} failed: {result.monoid[0]}')
+                    if data.get('webdriver') is not None and not self.is_browser_alive(data):
+                        self.restart_browser(data)
+                
+                if scraper.report_path:
+                    scraper.metrics.write(scraper.report_path, scraper.report_format)
+                
+                # Back off while polls keep failing, the site or the browser may be down
+                delay = self.interval if not failures else min(self.interval * 2 ** failures, self.max_backoff)
+                while not self.stopping and time.monotonic() - started < delay:
+                    time.sleep(min(1.0, delay))
+        
+        finally:
+            scraper.release_resources(data)
@@ -0,0 +1,182 @@
+import signal
+import time
+
+from pymonad.either import Left, Right
+
+from scrape_set_f45 import ScrapeSetF45
+from run_metrics import RunMetrics
+from task_queue import TASKS_COLLECTION, F45TaskQueue, default_worker_id
+
+
+class WorkerSetF45:
+    # Claims F45 tasks queued by ScrapeSetF45.produce, fetches, parses and upserts them. Any number
+    # of workers on any number of machines can share one queue, keeping their browser and Mongo client warm
+
+    def __init__(self, scraper: ScrapeSetF45, worker_id: str = None, batch_size: int = 10, lease_seconds: float = 300,
+                 max_attempts: int = 5, idle_sleep: float = 5, max_backoff: float = 300) -> None:
+        self.scraper = scraper
+        self.worker_id = worker_id or default_worker_id()
+        self.batch_size = max(1, batch_size)
+        self.lease_seconds = lease_seconds
+        self.max_attempts = max_attempts
+        self.idle_sleep = idle_sleep
+        self.max_backoff = max_backoff
+        self.stopping = False
+
+    def open_session(self, data: dict)->[Left, Right]:    # type: ignore
+        scraper = self.scraper
+        # Tasks finish in any order, across workers and produce runs, so an older filing must never
+        # replace a newer one in the latest collection
+        data['newer_only'] = True
+        return (
+            scraper.set_class_name(data)
+            .then (scraper.connect_mongo_db)
+            .then (self.connect_task_queue)
+            .then (self.open_fetcher)
+        )
+
+    def connect_task_queue(self, data: dict)->[Left, Right]:    # type: ignore
+        try:
+            print('Connecting to Task Queue')
+            data['tasks'] = F45TaskQueue(
+                data['mongo'].client[self.scraper.database][TASKS_COLLECTION],
+                lease_seconds=self.lease_seconds,
+                max_attempts=self.max_attempts,
+            )
+            data['tasks'].ensure_indexes()
+            print(f'> Worker {self.worker_id}, {data["tasks"].counts()}')
+            return Right(data)
+
+        except Exception as e:
+            return Left(f'Error in connecting to Task Queue: {str(e)}')
+
+    def open_fetcher(self, data: dict)->[Left, Right]:    # type: ignore
+        scraper = self.scraper
+        if data.get('http') is not None or data.get('webdriver') is not None:
+            return Right(data)
+        if scraper.backend == 'http':
+            return scraper.open_http_session(data)
+        return (
+            scraper.open_web_browser(data)
+            .then (scraper.maximize_window)
+        )
+
+    def claim_f45_tasks(self, data: dict)->[Left, Right]:    # type: ignore
+        try:
+            print('Claiming F45 Tasks')
+            data['claimed'] = data['tasks'].claim_many(self.worker_id, self.batch_size)
+            data['f45_to_update'] = [dict(task['f45']) for task in data['claimed']]
+            print(f'> Claimed {len(data["claimed"])} F45 Tasks')
+            return Right(data)
+
+        except Exception as e:
+            return Left(f'Error in claiming F45 Tasks: {str(e)}')
+
+    def finish_f45_tasks(self, data: dict)->[Left, Right]:    # type: ignore
+        try:
+            print('Finishing F45 Tasks')
+            tasks = data['tasks']
+            errors = data.get('errors', {})
+            lost = 0
+            for task in data['claimed']:
+                if task['key'] in errors:
+                    lost += not tasks.fail(task, errors[task['key']])
+                else:
+                    lost += not tasks.complete(task)
+
+            # A lost lease means the task ran past lease_seconds and another worker has it now
+            self.scraper.metrics.incr('tasks_done', len(data['claimed']) - len(errors))
+            self.scraper.metrics.incr('tasks_lease_lost', lost)
+            data['claimed'] = []
+            return Right(data)
+
+        except Exception as e:
+            return Left(f'Error in finishing F45 Tasks: {str(e)}')
+
+    def release_f45_tasks(self, data: dict, refund: bool = True) -> None:
+        # Hand back what a batch claimed, so it is picked up again without waiting for the lease.
+        # A failed batch is charged the attempt, a stopping worker is not
+        for task in data.get('claimed') or []:
+            try:
+                data['tasks'].release(task, refund)
+            except Exception:
+                pass
+        data['claimed'] = []
+
+    def work(self, data: dict)->[Left, Right]:    # type: ignore
+        scraper = self.scraper
+        timed = scraper.metrics.stage
+        return (
+            timed(self.open_fetcher)(data)
+            .then (timed(scraper.open_f45_page_get_text))
+            .then (timed(scraper.cache_f45_pages))
+            .then (timed(scraper.skip_unchanged_f45s))
+            .then (timed(scraper.parse_f45_texts))
+            .then (timed(scraper.update_db))
+            .then (timed(scraper.append_history))
+            .then (timed(self.finish_f45_tasks))
+        )
+
+    def stop(self, *args) -> None:
+        print('Stopping worker after the current batch')
+        self.stopping = True
+
+    def run(self, exit_when_empty: bool = False) -> None:
+        signal.signal(signal.SIGINT, self.stop)
+        signal.signal(signal.SIGTERM, self.stop)
+        scraper = self.scraper
+        data = {'webdriver': None}
+
+        result = self.open_session(data)
+        if result.is_left():
+            print(result.monoid[0])
+            scraper.release_resources(data)
+            return
+
+        batches = 0
+        failures = 0
+        try:
+            while not self.stopping:
+                started = time.monotonic()
+                data['failed'] = []
+                data['errors'] = {}
+                result = self.claim_f45_tasks(data)
+                if result.is_right() and not data['claimed']:
+                    if exit_when_empty:
+                        break
+                    time.sleep(self.idle_sleep)
+                    continue
+
+                claimed = len(data['claimed'])
+                scraper.metrics = RunMetrics(scraper.profile)
+                scraper.metrics.start()
+                result = result.then(self.work)
+                scraper.metrics.finish(result)
+                batches += 1
+
+                if result.is_right():
+                    failures = 0
+                    print(f'Batch {batches}: {claimed} F45s fetched, {len(data["f45_cleaned_data"])} saved, '
+                          f'{len(data.get("f45_unchanged") or [])} unchanged, {len(data["failed"])} failed in {time.monotonic() - started:.2f}s')
+                else:
+                    failures += 1
+                    print(f'Batch {batches} failed: {result.monoid[0]}')
+                    self.release_f45_tasks(data, refund=False)
+                    if data.get('webdriver') is not None:
+                        try:
+                            data['webdriver'].current_url
+                        except Exception:
+                            scraper.close_web_browser(data)
+
+                if scraper.report_path:
+                    scraper.metrics.write(scraper.report_path, scraper.report_format)
+
+                # Back off while batches keep failing, Mongo or the site may be down
+                if failures:
+                    delay = min(self.idle_sleep * 2 ** failures, self.max_backoff)
+                    while not self.stopping and time.monotonic() - started < delay:
+                        time.sleep(min(1.0, delay))
+
+        finally:
+            self.release_f45_tasks(data)
+            scraper.release_resources(data)